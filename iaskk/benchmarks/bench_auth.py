@@ -0,0 +1,67 @@
+"""
+Per-request authentication cost: ECDSA verify on every submission vs a
+session MAC with a sampled ECDSA signature every --interval submissions.
+
+Both paths authenticate the same canonical JSON messages that
+/api/submit-data checks; session setup (one ECDH + HKDF) is reported
+separately.
+
+    python benchmarks/bench_auth.py --requests 2000 --interval 100
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "server"))
+from auth import DeviceAuthenticator
+from client.main import IoTDevice
+from sessions import SessionManager, SESSION_INVALID, SESSION_SIGNATURE_REQUIRED
+from test_devices import generate_realistic_data
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--interval", type=int, default=100, help="sampled ECDSA signature every N requests")
+    args = parser.parse_args()
+
+    device = IoTDevice("bench_sensor", verbose=False)
+    authenticator = DeviceAuthenticator()
+    authenticator.register_device(device.device_id, device.get_public_key_bytes())
+    sessions = SessionManager(ttl=3600, signature_interval=args.interval)
+
+    start = time.perf_counter()
+    device.start_session(sessions.establish(device.device_id, authenticator.get_public_key(device.device_id)))
+    setup_time = time.perf_counter() - start
+
+    messages = [json.dumps(generate_realistic_data(device.device_id), sort_keys=True).encode()
+                for _ in range(args.requests)]
+    signatures = [device.sign_message(m.decode()) for m in messages]
+    macs = [device.session_mac(m) for m in messages]
+
+    start = time.perf_counter()
+    for message, signature in zip(messages, signatures):
+        assert authenticator.verify_signature(device.device_id, message, signature)
+    ecdsa_time = (time.perf_counter() - start) / args.requests
+
+    start = time.perf_counter()
+    for message, signature, mac in zip(messages, signatures, macs):
+        status = sessions.authenticate(device.session_id, device.device_id, message, mac)
+        assert status != SESSION_INVALID
+        if status == SESSION_SIGNATURE_REQUIRED:
+            assert authenticator.verify_signature(device.device_id, message, signature)
+            sessions.signature_verified(device.session_id)
+    session_time = (time.perf_counter() - start) / args.requests
+
+    print(f"{args.requests} submissions, ECDSA sampled every {args.interval}")
+    print(f"  session setup (ECDH + HKDF): {setup_time * 1e6:.1f} us once per session")
+    print(f"  {'auth':<16} {'per request':>12}")
+    print(f"  {'ecdsa':<16} {ecdsa_time * 1e6:>9.1f} us")
+    print(f"  {'session hmac':<16} {session_time * 1e6:>9.1f} us")
+    print(f"  sessions are {ecdsa_time / session_time:.1f}x cheaper per request")
+
+if __name__ == "__main__":
+    main()
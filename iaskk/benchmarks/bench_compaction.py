@@ -0,0 +1,75 @@
+"""
+Resident memory of an in-memory chain before and after compaction.
+
+Builds a chain of --blocks blocks of --transactions realistic readings
+(difficulty 1, so building is quick), measures the Python heap it holds,
+compacts all but the newest --keep blocks into a temporary archive and
+measures again. With tracing stopped it then times random reads of
+archived blocks and a full validation with and without the signed
+checkpoint.
+
+    python benchmarks/bench_compaction.py --blocks 2000 --transactions 100
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "server"))
+from blockchain import Blockchain
+from validation import ChainValidator
+from test_devices import generate_realistic_data
+
+def heap_mb() -> float:
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0] / 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--blocks", type=int, default=2000)
+    parser.add_argument("--transactions", type=int, default=100, help="transactions per block")
+    parser.add_argument("--keep", type=int, default=100, help="newest blocks left uncompacted")
+    parser.add_argument("--reads", type=int, default=2000, help="random archived block reads")
+    args = parser.parse_args()
+
+    tracemalloc.start()
+    with tempfile.TemporaryDirectory() as archive_dir:
+        blockchain = Blockchain(difficulty=1, archive_dir=archive_dir)
+        devices = [f"bench_sensor_{i}" for i in range(50)]
+        for _ in range(args.blocks):
+            blockchain.add_transactions([
+                (device_id, "network", generate_realistic_data(device_id))
+                for device_id in random.choices(devices, k=args.transactions)
+            ])
+            blockchain.create_block()
+        before = heap_mb()
+
+        report = blockchain.compact(keep_recent=args.keep)
+        after = heap_mb()
+        tracemalloc.stop()
+
+        full = ChainValidator(blockchain).validate(full=True)["elapsed"]
+        checkpointed = blockchain.validate_chain(full=True)["elapsed"]
+        indices = [random.randrange(report["archived_upto"] + 1) for _ in range(args.reads)]
+        started = time.perf_counter()
+        for index in indices:
+            blockchain.chain[index].transactions
+        read_us = (time.perf_counter() - started) / args.reads * 1e6
+
+        print(f"{args.blocks} blocks x {args.transactions} transactions, "
+              f"{report['archived_blocks']} compacted into {report['segments']} segments")
+        print(f"  heap before      {before:>9.1f} MB")
+        print(f"  heap after       {after:>9.1f} MB  ({after / before:.0%})")
+        print(f"  archive on disk  {report['archive_bytes'] / 1e6:>9.1f} MB")
+        print(f"  archived read    {read_us:>9.0f} us/block (random, {args.reads} reads)")
+        print(f"  full validation  {full:>9.2f}s -> {checkpointed:.2f}s from the checkpoint")
+        blockchain.archive.close()
+
+if __name__ == "__main__":
+    main()
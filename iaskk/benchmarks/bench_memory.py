@@ -0,0 +1,113 @@
+"""
+Memory held by a chain of --transactions realistic readings, per layout.
+
+"dict" rebuilds the previous layout: a plain Block object per block with
+its transactions as nested dicts. "compact" uses the current slotted Block
+and Transaction objects, which keep each reading as its canonical JSON.
+Each layout is built in its own process from the same seeded data, and
+the Python heap it holds is measured with tracemalloc. The time to build
+the block hash encoding and the /api/chain JSON for every block is
+reported too.
+
+    python benchmarks/bench_memory.py --transactions 1000000 --block-size 500
+"""
+import argparse
+import gc
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "server"))
+from blockchain import Block
+from merkle import MerkleTree
+from mining import serialize_for_hashing
+from test_devices import generate_realistic_data
+from transactions import Transaction
+
+class DictBlock:
+    """Block as it was before __slots__ and Transaction: an instance dict and dict transactions"""
+
+    def __init__(self, index, transactions, timestamp, previous_hash):
+        self.index = index
+        self.transactions = transactions
+        self.timestamp = timestamp
+        self.previous_hash = previous_hash
+        self.nonce = 0
+        self.merkle_tree = MerkleTree.from_transactions(transactions)
+        self.merkle_root = self.merkle_tree.root
+        self.hash = "0" * 64
+
+    def to_json(self):
+        return json.dumps({
+            "index": self.index,
+            "timestamp": self.timestamp,
+            "transactions": self.transactions,
+            "hash": self.hash,
+            "previous_hash": self.previous_hash,
+            "merkle_root": self.merkle_root
+        }).encode()
+
+def build_chain(layout: str, transactions: int, block_size: int) -> list:
+    random.seed(1)
+    devices = [f"bench_sensor_{i}" for i in range(1000)]
+    chain = []
+    for index in range(transactions // block_size):
+        timestamp = time.time()
+        if layout == "dict":
+            block_transactions = [
+                {"sender": device_id, "recipient": "network", "timestamp": timestamp,
+                 "data": generate_realistic_data(device_id)}
+                for device_id in random.choices(devices, k=block_size)
+            ]
+            chain.append(DictBlock(index, block_transactions, timestamp, "0" * 64))
+        else:
+            block_transactions = [
+                Transaction(device_id, "network", timestamp, generate_realistic_data(device_id))
+                for device_id in random.choices(devices, k=block_size)
+            ]
+            chain.append(Block(index, block_transactions, timestamp, "0" * 64))
+    return chain
+
+def measure(layout: str, transactions: int, block_size: int, results) -> None:
+    tracemalloc.start()
+    chain = build_chain(layout, transactions, block_size)
+    gc.collect()
+    heap = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    started = time.perf_counter()
+    for block in chain:
+        serialize_for_hashing(block.index, block.transactions, block.timestamp,
+                              block.previous_hash, block.merkle_root)
+    hashing = time.perf_counter() - started
+    started = time.perf_counter()
+    for block in chain:
+        block.to_json()
+    chain_json = time.perf_counter() - started
+    results.put((layout, heap, hashing, chain_json))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--transactions", type=int, default=1000000)
+    parser.add_argument("--block-size", type=int, default=500)
+    args = parser.parse_args()
+
+    results = multiprocessing.Queue()
+    print(f"{args.transactions} transactions in blocks of {args.block_size}")
+    print(f"  {'layout':<8} {'heap MB':>9} {'bytes/tx':>9} {'hash encode':>12} {'chain JSON':>11}")
+    for layout in ("dict", "compact"):
+        process = multiprocessing.Process(target=measure, args=(layout, args.transactions, args.block_size, results))
+        process.start()
+        layout, heap, hashing, chain_json = results.get()
+        process.join()
+        print(f"  {layout:<8} {heap / 1e6:>9.1f} {heap / args.transactions:>9.0f} "
+              f"{hashing:>11.2f}s {chain_json:>10.2f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Microbenchmark for the proof-of-work search.
+
+Compares the original loop (Block.calculate_hash for every nonce) with the
+incremental MiningEngine on a full block, and checks both produce the same hash.
+
+    python benchmarks/bench_mining.py --transactions 10 --hashes 200000
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "server"))
+from blockchain import Block
+from mining import MiningEngine, serialize_for_hashing, search_nonce_range
+from test_devices import generate_realistic_data
+
+def make_block(num_transactions: int) -> Block:
+    transactions = [
+        {
+            "sender": f"test_sensor_{i}",
+            "recipient": "network",
+            "timestamp": time.time(),
+            "data": generate_realistic_data(f"test_sensor_{i}")
+        }
+        for i in range(num_transactions)
+    ]
+    return Block(1, transactions, time.time(), "0" * 64)
+
+def bench_naive(block: Block, hashes: int) -> float:
+    start = time.perf_counter()
+    for nonce in range(hashes):
+        block.nonce = nonce
+        block.calculate_hash()
+    return hashes / (time.perf_counter() - start)
+
+def bench_incremental(block: Block, hashes: int) -> float:
+    start = time.perf_counter()
+    prefix, suffix = serialize_for_hashing(block.index, block.transactions, block.timestamp,
+                                           block.previous_hash, block.merkle_root)
+    # Difficulty 64 is never met, so the whole range is hashed
+    search_nonce_range(prefix, suffix, 64, 0, hashes)
+    return hashes / (time.perf_counter() - start)
+
+def bench_mine(block: Block, difficulty: int, workers: int) -> float:
+    engine = MiningEngine(difficulty, workers=workers)
+    block.nonce = 0
+    start = time.perf_counter()
+    engine.mine(block)
+    elapsed = time.perf_counter() - start
+    engine.shutdown()
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--transactions", type=int, default=10)
+    parser.add_argument("--hashes", type=int, default=200000)
+    parser.add_argument("--difficulty", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    block = make_block(args.transactions)
+
+    # Sanity check: incremental hashing must reproduce calculate_hash exactly
+    prefix, suffix = serialize_for_hashing(block.index, block.transactions, block.timestamp,
+                                           block.previous_hash, block.merkle_root)
+    for nonce in (0, 7, 12345):
+        block.nonce = nonce
+        assert search_nonce_range(prefix, suffix, 0, nonce, nonce + 1)[1] == block.calculate_hash()
+
+    naive = bench_naive(block, args.hashes)
+    incremental = bench_incremental(block, args.hashes)
+    print(f"Block with {args.transactions} transactions, {args.hashes} hashes")
+    print(f"  calculate_hash loop : {naive:12,.0f} H/s")
+    print(f"  incremental engine  : {incremental:12,.0f} H/s  ({incremental / naive:.1f}x)")
+
+    serial = bench_mine(block, args.difficulty, 1)
+    serial_nonce = block.nonce
+    assert block.hash == block.calculate_hash()
+    print(f"Mining at difficulty {args.difficulty}: nonce {serial_nonce}")
+    print(f"  1 process           : {serial:.3f}s")
+    if args.workers > 1:
+        parallel = bench_mine(block, args.difficulty, args.workers)
+        assert block.nonce == serial_nonce
+        print(f"  {args.workers} processes         : {parallel:.3f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Device registry persistence at fleet scale.
+
+Fills a FileDeviceRegistry and a SQLiteDeviceRegistry with --devices
+devices (random 65-byte points; the registries do not parse keys) in
+batches of --batch, then reopens each as a restarted server would and
+times the open, the first lookup and --lookups random lookups. The time
+to generate --keygen real secp256k1 keypairs serially and on the
+provisioning process pool is reported too.
+
+    python benchmarks/bench_registry.py --devices 1000000 --keygen 5000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "server"))
+from registry import FileDeviceRegistry, SQLiteDeviceRegistry
+from provision import _generate_keypair, generate_keypairs
+
+def fill(registry, devices, batch: int) -> float:
+    started = time.perf_counter()
+    for start in range(0, len(devices), batch):
+        registry.add_many(devices[start:start + batch])
+    return time.perf_counter() - started
+
+def reopen(open_registry, device_ids, lookups: int):
+    started = time.perf_counter()
+    registry = open_registry()
+    registry.get(device_ids[0])
+    opened = time.perf_counter() - started
+    sample = random.choices(device_ids, k=lookups)
+    started = time.perf_counter()
+    for device_id in sample:
+        registry.get(device_id)
+    lookup_us = (time.perf_counter() - started) / lookups * 1e6
+    return registry, opened, lookup_us
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=1000000)
+    parser.add_argument("--batch", type=int, default=10000, help="devices per add_many call")
+    parser.add_argument("--lookups", type=int, default=100000)
+    parser.add_argument("--keygen", type=int, default=5000, help="keypairs to generate")
+    parser.add_argument("--key-workers", type=int, default=None)
+    args = parser.parse_args()
+
+    devices = [(f"bench_sensor_{i}", b"\x04" + os.urandom(64)) for i in range(args.devices)]
+    device_ids = [device_id for device_id, _ in devices]
+    print(f"{args.devices} devices, added in batches of {args.batch}")
+    print(f"  {'registry':<8} {'fill':>8} {'on disk MB':>11} {'open':>9} {'lookup':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "devices.reg")
+        registry = FileDeviceRegistry(path, compact_after=args.devices)
+        filled = fill(registry, devices, args.batch)
+        registry.close()
+        size = os.path.getsize(path) + os.path.getsize(f"{path}.log")
+        registry, opened, lookup_us = reopen(lambda: FileDeviceRegistry(path, compact_after=args.devices + 1),
+                                             device_ids, args.lookups)
+        registry.close()
+        print(f"  {'file':<8} {filled:>7.2f}s {size / 1e6:>11.1f} {opened * 1e3:>7.1f}ms {lookup_us:>8.1f}us")
+
+        url = f"sqlite:///{os.path.join(directory, 'devices.db')}"
+        filled = fill(SQLiteDeviceRegistry(url), devices, args.batch)
+        size = sum(os.path.getsize(os.path.join(directory, name))
+                   for name in os.listdir(directory) if name.startswith("devices.db"))
+        _, opened, lookup_us = reopen(lambda: SQLiteDeviceRegistry(url), device_ids, args.lookups)
+        print(f"  {'sqlite':<8} {filled:>7.2f}s {size / 1e6:>11.1f} {opened * 1e3:>7.1f}ms {lookup_us:>8.1f}us")
+
+    started = time.perf_counter()
+    for i in range(args.keygen):
+        _generate_keypair(i)
+    serial = time.perf_counter() - started
+    started = time.perf_counter()
+    generate_keypairs(args.keygen, args.key_workers)
+    pooled = time.perf_counter() - started
+    print(f"{args.keygen} keypairs: {serial:.2f}s serially, {pooled:.2f}s on the process pool "
+          f"({args.keygen / pooled:.0f}/s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Cost of rejecting replayed submissions.
+
+Fills a ReplayFilter sized for --capacity readings with that many
+distinct signed-message keys, then measures the time of a duplicate
+check (seen) and an insert (add) against one ECDSA verification, and the
+false-positive rate on --probes keys that were never added.
+
+    python benchmarks/bench_replay.py --capacity 1000000 --probes 200000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "server"))
+from auth import DeviceAuthenticator
+from client.main import IoTDevice
+from replay import ReplayFilter
+from test_devices import generate_realistic_data
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--capacity", type=int, default=1000000)
+    parser.add_argument("--error-rate", type=float, default=1e-6)
+    parser.add_argument("--probes", type=int, default=200000, help="keys never added, checked for false positives")
+    parser.add_argument("--verifies", type=int, default=500)
+    args = parser.parse_args()
+
+    replay_filter = ReplayFilter(window=3600, capacity=args.capacity, error_rate=args.error_rate)
+    message = json.dumps(generate_realistic_data("bench_sensor_0"), sort_keys=True)
+    keys = [ReplayFilter.key(f"bench_sensor_{i % 1000}", {}, f"{i}:{message}") for i in range(args.capacity)]
+    started = time.perf_counter()
+    for key in keys:
+        replay_filter.add(key)
+    add_us = (time.perf_counter() - started) / args.capacity * 1e6
+
+    started = time.perf_counter()
+    duplicates = sum(replay_filter.seen(key) for key in keys[:args.probes])
+    seen_us = (time.perf_counter() - started) / min(args.probes, args.capacity) * 1e6
+    false_positives = sum(replay_filter.seen(ReplayFilter.key("bench_sensor_new", {}, f"{i}:{message}"))
+                          for i in range(args.probes))
+
+    device = IoTDevice("bench_sensor_0", verbose=False)
+    authenticator = DeviceAuthenticator()
+    authenticator.register_device(device.device_id, device.get_public_key_bytes())
+    signature = device.sign_message(message)
+    started = time.perf_counter()
+    for _ in range(args.verifies):
+        authenticator.verify_signature(device.device_id, message, signature)
+    verify_us = (time.perf_counter() - started) / args.verifies * 1e6
+
+    memory = sum(len(bloom) for bloom in replay_filter._filters)
+    print(f"ReplayFilter for {args.capacity} readings per window at error rate {args.error_rate:g}: "
+          f"{replay_filter.hashes} hashes, {memory / 1e6:.1f} MB")
+    print(f"  add              {add_us:>8.1f} us")
+    print(f"  duplicate check  {seen_us:>8.1f} us  ({duplicates} of {min(args.probes, args.capacity)} caught)")
+    print(f"  ECDSA verify     {verify_us:>8.1f} us")
+    print(f"  false positives  {false_positives} of {args.probes} new readings")
+
+if __name__ == "__main__":
+    main()
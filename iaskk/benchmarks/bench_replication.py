@@ -0,0 +1,139 @@
+"""
+Replication between several local gateway nodes.
+
+Starts --nodes servers on consecutive ports, each in its own temporary
+directory (own blockchain.db and archive) and listing all the others with
+--peer. Devices are registered on the first node only; each device then
+posts signed readings to a node of its own for --duration seconds, so
+every node mines its own blocks. Afterwards the script waits for all nodes
+to report the same tip and checks that every accepted reading is in the
+converged chain exactly once.
+
+    python benchmarks/bench_replication.py --nodes 3 --devices 6 --duration 10
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+from client.main import IoTDevice
+from test_devices import generate_realistic_data
+
+def wait_for_server(url: str, timeout: float = 30) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            requests.get(f"{url}/api/peer/status", timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server at {url} did not come up")
+
+def chain_readings(url: str) -> Counter:
+    """Count every reading in a node's chain by its (sender, sequence) tag"""
+    readings = Counter()
+    from_index = 0
+    while from_index is not None:
+        page = requests.get(f"{url}/api/chain", params={"from_index": from_index, "limit": 500}, timeout=10).json()
+        for block in page["chain"]:
+            for tx in block["transactions"]:
+                readings[(tx["sender"], tx["data"]["sequence"])] += 1
+        from_index = page["next_from_index"]
+    return readings
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", type=int, default=3)
+    parser.add_argument("--devices", type=int, default=6)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--port", type=int, default=5060, help="port of the first node")
+    parser.add_argument("--timeout", type=float, default=120, help="seconds to wait for convergence")
+    args = parser.parse_args()
+
+    urls = [f"http://127.0.0.1:{args.port + i}" for i in range(args.nodes)]
+    servers = []
+    with tempfile.TemporaryDirectory() as workdir:
+        try:
+            for i, url in enumerate(urls):
+                node_dir = os.path.join(workdir, f"node{i}")
+                os.makedirs(node_dir)
+                command = [sys.executable, os.path.join(ROOT, "server", "main.py"),
+                           "--mode", "queued", "--port", str(args.port + i),
+                           "--peer-token", "bench-replication"]
+                for peer in urls:
+                    if peer != url:
+                        command += ["--peer", peer]
+                servers.append(subprocess.Popen(command, cwd=node_dir,
+                                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+            for url in urls:
+                wait_for_server(url)
+
+            devices = []
+            for i in range(args.devices):
+                device = IoTDevice(f"replica_sensor_{i}", server_url=urls[i % args.nodes], verbose=False)
+                requests.post(f"{urls[0]}/api/register", json={
+                    "device_id": device.device_id,
+                    "public_key": device.get_public_key_bytes().hex()
+                }, timeout=10)
+                devices.append(device)
+            time.sleep(1)  # let the registrations reach the other nodes
+
+            session = requests.Session()
+            accepted = set()
+            rejected = 0
+            sequence = 0
+            deadline = time.time() + args.duration
+            while time.time() < deadline:
+                for device in devices:
+                    data = generate_realistic_data(device.device_id)
+                    data["sequence"] = sequence
+                    response = session.post(f"{device.server_url}/api/submit-data", json={
+                        "device_id": device.device_id,
+                        "data": data,
+                        "signature": device.sign_message(json.dumps(data, sort_keys=True)).hex()
+                    }, timeout=10)
+                    if response.status_code in (200, 202):
+                        accepted.add((device.device_id, sequence))
+                    else:
+                        rejected += 1
+                sequence += 1
+            submitted_at = time.time()
+
+            # Converged once every node has the same tip and all accepted readings are mined
+            while True:
+                statuses = [requests.get(f"{url}/api/peer/status", timeout=10).json() for url in urls]
+                tips = {status["tip"] for status in statuses}
+                if len(tips) == 1 and all(status["replication"]["outgoing"] == 0 for status in statuses):
+                    readings = chain_readings(urls[0])
+                    if accepted <= set(readings):
+                        break
+                if time.time() - submitted_at > args.timeout:
+                    raise RuntimeError(f"Nodes did not converge within {args.timeout:.0f}s: {len(tips)} tips")
+                time.sleep(0.5)
+            converged = time.time() - submitted_at
+
+            duplicates = sum(count - 1 for count in readings.values() if count > 1)
+            print(f"{args.nodes} nodes, {args.devices} devices, {len(accepted)} readings accepted "
+                  f"({rejected} rejected) in {args.duration:.0f}s")
+            print(f"  converged {converged:.1f}s after the last submission at length {statuses[0]['length']}")
+            print(f"  readings in chain: {sum(readings.values())}, missing: {len(accepted - set(readings))}, "
+                  f"duplicated: {duplicates}")
+            for url, status in zip(urls, statuses):
+                replication = status["replication"]
+                print(f"  {url}: synced {replication['synced_blocks']} blocks, {replication['reorgs']} reorgs "
+                      f"({replication['orphaned_blocks']} orphaned), {replication['peer_errors']} peer errors")
+        finally:
+            for server in servers:
+                server.terminate()
+                server.wait()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Signature verification throughput with and without the parsed public-key cache.
+
+Registers a fleet of devices, then verifies one signed reading per device in
+round-robin order on a single core.
+
+    python benchmarks/bench_verify.py --devices 10000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, "server"))
+from auth import DeviceAuthenticator
+
+def make_fleet(num_devices: int):
+    fleet = []
+    for i in range(num_devices):
+        private_key = ec.generate_private_key(ec.SECP256K1())
+        public_key_bytes = private_key.public_key().public_bytes(
+            encoding=Encoding.X962,
+            format=PublicFormat.UncompressedPoint
+        )
+        message = json.dumps({"temperature": 21.5, "humidity": 48.2, "sequence": i}, sort_keys=True)
+        signature = private_key.sign(message.encode(), ec.ECDSA(hashes.SHA256()))
+        fleet.append((f"sensor_{i}", public_key_bytes, message, signature))
+    return fleet
+
+def bench(fleet, key_cache_size: int, rounds: int) -> float:
+    authenticator = DeviceAuthenticator(key_cache_size=key_cache_size)
+    for device_id, public_key_bytes, _, _ in fleet:
+        authenticator.register_device(device_id, public_key_bytes)
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for device_id, _, message, signature in fleet:
+            assert authenticator.verify_signature(device_id, message, signature)
+    return rounds * len(fleet) / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=10000)
+    parser.add_argument("--rounds", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"Generating {args.devices} device keys...")
+    fleet = make_fleet(args.devices)
+
+    uncached = bench(fleet, 0, args.rounds)
+    cached = bench(fleet, args.devices, args.rounds)
+    print(f"Verifications per second per core ({args.devices} devices):")
+    print(f"  re-parse every request : {uncached:10,.0f}")
+    print(f"  cached key objects     : {cached:10,.0f}  ({cached / uncached:.2f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+JSON vs MessagePack submissions: bytes on the wire and server parse+verify time.
+
+The JSON path mirrors /api/submit-data today (parse, hex-decode the DER
+signature, re-canonicalize with sort_keys, verify). The binary path decodes
+the envelope, converts the raw r||s signature and verifies the payload bytes.
+
+    python benchmarks/bench_wire.py --readings 2000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "server"))
+from auth import DeviceAuthenticator
+from client.main import IoTDevice
+from test_devices import generate_realistic_data
+from wire import decode_msgpack_submission
+
+def json_body(device: IoTDevice, data: dict) -> bytes:
+    signature = device.sign_message(json.dumps(data, sort_keys=True))
+    return json.dumps({
+        "device_id": device.device_id,
+        "data": data,
+        "signature": signature.hex()
+    }).encode()
+
+def verify_json(authenticator: DeviceAuthenticator, body: bytes) -> bool:
+    submission = json.loads(body)
+    signature = bytes.fromhex(submission["signature"])
+    message = json.dumps(submission["data"], sort_keys=True)
+    return authenticator.verify_signature(submission["device_id"], message, signature)
+
+def verify_msgpack(authenticator: DeviceAuthenticator, body: bytes) -> bool:
+    submission = decode_msgpack_submission(body)
+    return authenticator.verify_signature(submission["device_id"], submission["message"], submission["signature"])
+
+def bench(authenticator: DeviceAuthenticator, bodies, verify) -> float:
+    start = time.perf_counter()
+    for body in bodies:
+        assert verify(authenticator, body)
+    return (time.perf_counter() - start) / len(bodies)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readings", type=int, default=2000)
+    args = parser.parse_args()
+
+    device = IoTDevice("bench_sensor", verbose=False)
+    authenticator = DeviceAuthenticator()
+    authenticator.register_device(device.device_id, device.get_public_key_bytes())
+
+    readings = [generate_realistic_data(device.device_id) for _ in range(args.readings)]
+    json_bodies = [json_body(device, data) for data in readings]
+    msgpack_bodies = [device.encode_submission(data) for data in readings]
+
+    json_size = sum(map(len, json_bodies)) / len(json_bodies)
+    msgpack_size = sum(map(len, msgpack_bodies)) / len(msgpack_bodies)
+    json_time = bench(authenticator, json_bodies, verify_json)
+    msgpack_time = bench(authenticator, msgpack_bodies, verify_msgpack)
+
+    print(f"{args.readings} realistic readings")
+    print(f"  {'format':<10} {'bytes/req':>10} {'parse+verify':>14}")
+    print(f"  {'json':<10} {json_size:>10.0f} {json_time * 1e6:>11.1f} us")
+    print(f"  {'msgpack':<10} {msgpack_size:>10.0f} {msgpack_time * 1e6:>11.1f} us")
+    print(f"  msgpack is {100 * (1 - msgpack_size / json_size):.0f}% smaller, "
+          f"{json_time / msgpack_time:.2f}x faster to parse and verify")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+/api/submit-data throughput against a multi-worker server, per worker count.
+
+For each --workers value a fresh server is started in a temporary directory
+(its own blockchain.db) with `server/main.py --workers N`, devices are
+registered, and --clients load processes post pre-signed readings over
+keep-alive connections for --duration seconds. Every request is a full
+ECDSA verify on the server, so throughput is bounded by CPU and should grow
+with the worker count up to the number of cores (leave some for the load
+processes).
+
+    python benchmarks/bench_workers.py --workers 1,2,4 --clients 8 --duration 10
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+from client.main import IoTDevice
+from test_devices import generate_realistic_data
+
+def wait_for_server(url: str, timeout: float = 30) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            requests.get(f"{url}/api/chain", params={"limit": 1}, timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server at {url} did not come up")
+
+def load_process(url: str, device_id: str, private_key_bytes: bytes, duration: float, results) -> None:
+    device = IoTDevice.from_private_key_bytes(device_id, private_key_bytes, server_url=url, verbose=False)
+    bodies = []
+    for _ in range(50):
+        data = generate_realistic_data(device_id)
+        bodies.append({
+            "device_id": device_id,
+            "data": data,
+            "signature": device.sign_message(json.dumps(data, sort_keys=True)).hex()
+        })
+
+    session = requests.Session()
+    ok = errors = 0
+    deadline = time.time() + duration
+    while time.time() < deadline:
+        response = session.post(f"{url}/api/submit-data", json=bodies[(ok + errors) % len(bodies)], timeout=10)
+        if response.status_code == 200:
+            ok += 1
+        else:
+            errors += 1
+    results.put((ok, errors))
+
+def run(workers: int, clients: int, duration: float, port: int) -> tuple:
+    url = f"http://127.0.0.1:{port}"
+    with tempfile.TemporaryDirectory() as workdir:
+        server = subprocess.Popen(
+            [sys.executable, os.path.join(ROOT, "server", "main.py"),
+             "--workers", str(workers), "--port", str(port)],
+            cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            wait_for_server(url)
+            devices = []
+            for i in range(clients):
+                key = IoTDevice.generate_private_key_bytes()
+                device = IoTDevice.from_private_key_bytes(f"bench_worker_sensor_{i}", key, verbose=False)
+                requests.post(f"{url}/api/register", json={
+                    "device_id": device.device_id,
+                    "public_key": device.get_public_key_bytes().hex()
+                }, timeout=10)
+                devices.append((device.device_id, key))
+
+            results = multiprocessing.Queue()
+            processes = [
+                multiprocessing.Process(target=load_process, args=(url, device_id, key, duration, results))
+                for device_id, key in devices
+            ]
+            for process in processes:
+                process.start()
+            totals = [results.get() for _ in processes]
+            for process in processes:
+                process.join()
+        finally:
+            server.terminate()
+            server.wait()
+    return sum(ok for ok, _ in totals), sum(errors for _, errors in totals)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated worker counts")
+    parser.add_argument("--clients", type=int, default=8, help="load processes")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--port", type=int, default=5055)
+    args = parser.parse_args()
+
+    print(f"{args.clients} load processes, {args.duration:.0f}s per run, {os.cpu_count()} cores")
+    print(f"  {'workers':>7} {'req/s':>9} {'errors':>7} {'speedup':>8}")
+    baseline = None
+    for workers in [int(n) for n in args.workers.split(",")]:
+        ok, errors = run(workers, args.clients, args.duration, args.port)
+        throughput = ok / args.duration
+        baseline = baseline or throughput
+        print(f"  {workers:>7} {throughput:>9.0f} {errors:>7} {throughput / baseline:>7.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Load test: /api/submit-data latency while a block is being mined.
+
+Fills the pending pool, starts Blockchain.create_block in a background thread
+at a raised difficulty, and fires signed submissions at the Flask app through
+its test client for as long as the block is being mined. Runs in-process, no
+server or network needed.
+
+    python benchmarks/load_submit_during_mining.py --difficulty 5 --clients 4
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "server"))
+import config
+
+# main opens its ledger when imported; keep it away from the real one
+WORKDIR = tempfile.TemporaryDirectory(prefix="load_submit_")
+config.DATABASE_URL = f"sqlite:///{os.path.join(WORKDIR.name, 'blockchain.db')}"
+config.ARCHIVE_DIR = os.path.join(WORKDIR.name, "archive")
+config.REGISTRY_PATH = None
+import main as server
+from client.main import IoTDevice
+from test_devices import generate_realistic_data
+
+def percentile(samples, pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def submit_loop(device: IoTDevice, stop: threading.Event, latencies: list, errors: list):
+    client = server.app.test_client()
+    while not stop.is_set():
+        data = generate_realistic_data(device.device_id)
+        signature = device.sign_message(json.dumps(data, sort_keys=True))
+        start = time.perf_counter()
+        response = client.post("/api/submit-data", json={
+            "device_id": device.device_id,
+            "data": data,
+            "signature": signature.hex()
+        })
+        latencies.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            errors.append(response.status_code)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--difficulty", type=int, default=5)
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--backlog", type=int, default=50, help="Transactions pending before mining starts")
+    args = parser.parse_args()
+
+    blockchain = server.blockchain
+    blockchain.difficulty = blockchain.miner.difficulty = args.difficulty
+
+    devices = []
+    client = server.app.test_client()
+    for i in range(args.clients):
+        device = IoTDevice(f"load_sensor_{i}")
+        client.post("/api/register", json={
+            "device_id": device.device_id,
+            "public_key": device.get_public_key_bytes().hex()
+        })
+        devices.append(device)
+
+    for i in range(args.backlog):
+        blockchain.add_transaction(f"load_sensor_{i % args.clients}", "network",
+                                   generate_realistic_data(f"load_sensor_{i % args.clients}"))
+
+    stop = threading.Event()
+    latencies, errors = [], []
+    workers = [threading.Thread(target=submit_loop, args=(d, stop, latencies, errors), daemon=True)
+               for d in devices]
+
+    mining_started = time.perf_counter()
+    miner = threading.Thread(target=blockchain.create_block, daemon=True)
+    miner.start()
+    for worker in workers:
+        worker.start()
+    miner.join()
+    mining_time = time.perf_counter() - mining_started
+    stop.set()
+    for worker in workers:
+        worker.join()
+
+    print(f"Mined block #{blockchain.get_latest_block().index} "
+          f"({args.backlog} tx, difficulty {args.difficulty}) in {mining_time:.2f}s")
+    if not latencies:
+        print("No submissions completed while mining")
+        return
+    print(f"submit-data during mining: {len(latencies)} requests, {len(errors)} errors")
+    print(f"  p50 {percentile(latencies, 50) * 1000:8.2f} ms")
+    print(f"  p99 {percentile(latencies, 99) * 1000:8.2f} ms")
+    print(f"  max {max(latencies) * 1000:8.2f} ms")
+
+if __name__ == "__main__":
+    main()
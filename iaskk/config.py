@@ -6,19 +6,73 @@ Configuration settings for the IoT Security Framework
 SERVER_HOST = "127.0.0.1"  # Listen on localhost for testing
 SERVER_PORT = 5000
 SERVER_DEBUG = True
+SERVER_MODE = "development"  # "queued" hands submissions to background workers (still the Werkzeug server)
+SERVER_WORKERS = 0  # API worker processes sharing state through DATABASE_URL; 0 serves everything from one process
+CHAIN_POLL_INTERVAL = 1  # Seconds between API workers' checks for blocks from the miner
+PEERS = []  # Base URLs of other gateway nodes to replicate with, e.g. "http://127.0.0.1:5001"
+PEER_TOKEN = None  # Shared secret peers send with pushed transactions and devices; required whenever PEERS is set
+PEER_SYNC_INTERVAL = 5  # Seconds between checks of the peers' chains
+PEER_BATCH_BLOCKS = 100  # Blocks (or block hashes) fetched per request when catching up
+PEER_TIMEOUT = 5  # Seconds before a request to a peer is abandoned
+INGESTION_QUEUE_SIZE = 10000  # Queued submissions before /api/submit-data returns 429
+INGESTION_WORKERS = 2  # Threads that verify and append queued submissions
+BROADCAST_TICK = 0.25  # Seconds between coalesced dashboard frames
+BROADCAST_DEVICE_BACKLOG = 20  # Readings per device kept for a frame, older ones are merged away
+BROADCAST_MAX_DEVICES = 500  # Devices included in one aggregate frame
+METRICS_ENABLED = True  # Record latency histograms and counters for /metrics
+PROFILER_ENABLED = False  # Serve /debug/profile, which samples stacks for flamegraphs
+ROLLUP_RETENTION = {"1m": 120, "1h": 48, "1d": 30}  # Buckets kept per metric rollup resolution
+ROLLUP_MAX_FIELDS = 32  # Reading fields rolled up per device (and for the fleet)
+ROLLUP_MAX_SERIES = 10000  # Rolled-up (device, field) series in total, about 8 KB each
+CHAIN_PAGE_SIZE = 50  # Blocks returned per /api/chain page by default
+MAX_CHAIN_PAGE_SIZE = 500
+READINGS_PAGE_SIZE = 100  # Readings returned per /api/devices/<id>/readings page by default
+MAX_READINGS_PAGE_SIZE = 1000
 
 # Security Configuration
 ECC_CURVE = 'secp256k1'
 HASH_ALGORITHM = 'sha256'
-BLOCK_SIZE = 10  # Number of transactions per block
+KEY_CACHE_SIZE = 100000  # Parsed device public keys kept in memory
+VERIFY_WORKERS = 4  # Processes used to verify /api/submit-batch signatures
+MAX_BATCH_SIZE = 500  # Readings accepted per /api/submit-batch request
+MAX_REGISTER_BATCH = 10000  # Devices accepted per /api/register-batch request
+REGISTRY_PATH = "devices.reg"  # Device registry of a single-process server (clusters move it into DATABASE_URL); None keeps registrations in memory only
+REGISTRY_COMPACT_AFTER = 10000  # Journaled registrations before the registry file is rewritten
+CHALLENGE_TTL = 60  # Seconds a challenge from /api/authenticate can be answered
+MAX_CHALLENGES = 100000  # Outstanding challenges kept before the oldest are dropped
+CHALLENGE_SHARDS = 16  # Independently locked partitions of the in-memory challenge store
+CHALLENGE_STORE_URL = "memory"  # Or a sqlite:/// URL to share challenges between server processes
+SESSION_TTL = 900  # Seconds a session key from /api/verify stays valid
+SESSION_SIGNATURE_INTERVAL = 100  # Every Nth session submission must also carry an ECDSA signature
+REPLAY_WINDOW = 600  # Seconds an accepted reading is remembered to reject retries and replays; None disables
+REPLAY_CAPACITY = 1000000  # Readings per window the in-process replay filter is sized for; --workers share a table in DATABASE_URL instead
+REPLAY_ERROR_RATE = 1e-6  # Chance a genuine reading is mistaken for a repeat
+BLOCK_SIZE = 10  # Pending transactions that seal a block without waiting for BLOCK_MAX_LATENCY
 
 # IoT Client Configuration
 IOT_DATA_INTERVAL = 5  # seconds between data transmissions
 SERVER_URL = "http://127.0.0.1:5000"  # Local testing URL
+WIRE_FORMAT = "json"  # "msgpack" sends compact binary submissions with raw 64-byte signatures
+CLIENT_BUFFERED = False  # Queue readings locally and upload them in batches
+CLIENT_BATCH_SIZE = 50  # Readings per batch upload
+CLIENT_FLUSH_INTERVAL = 10  # Max seconds a reading waits before a flush
+CLIENT_BUFFER_SIZE = 1000  # Readings held in memory before spilling to disk
+CLIENT_SPILL_PATH = "client_buffer.jsonl"
+CLIENT_MAX_SPILL = 100000  # Readings kept on disk before new ones are dropped
+CLIENT_DEAD_LETTER_PATH = "client_rejected.jsonl"  # Readings the server refused, kept for inspection instead of retried
 
 # Blockchain Configuration
 DIFFICULTY = 4  # Number of leading zeros required for proof of work
-MAX_TRANSACTIONS_PER_BLOCK = 10
+MAX_TRANSACTIONS_PER_BLOCK = 500  # Larger backlogs are split over several blocks
+BLOCK_MAX_LATENCY = 10  # Seconds a pending transaction waits at most before its block is sealed
+BLOCK_MIN_INTERVAL = 0.5  # Shortest pause between the block scheduler's pool checks
+MINING_WORKERS = 1  # Processes used for the proof-of-work nonce search
+VALIDATION_WORKERS = 4  # Processes used for full chain audits
 
 # Database Configuration (using SQLite for simplicity)
-DATABASE_URL = "sqlite:///blockchain.db" 
\ No newline at end of file
+DATABASE_URL = "sqlite:///blockchain.db"
+RESIDENT_BLOCKS = 16  # Recent blocks whose transactions stay in memory
+ARCHIVE_DIR = "archive"  # Compressed segments and signed checkpoints of compacted blocks; None disables compaction
+ARCHIVE_KEEP_BLOCKS = 1000  # Newest blocks that are never compacted
+ARCHIVE_SEGMENT_BLOCKS = 1000  # Blocks per archive segment file
+COMPACTION_INTERVAL = 300  # Seconds between compaction runs 
\ No newline at end of file
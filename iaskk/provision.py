@@ -0,0 +1,165 @@
+"""
+Bulk device provisioning.
+
+Generates secp256k1 keypairs for --devices new devices on a process pool,
+writes their private keys to --keys (one JSON object per line, readable
+only by the owner) and registers the public keys with the server through
+/api/register-batch, MAX_REGISTER_BATCH devices per request.
+
+    python provision.py --devices 10000 --prefix sensor --keys fleet_keys.jsonl
+
+With --import, the devices in an existing keys file are registered
+instead, e.g. to enrol a fleet with a new gateway. A device can be loaded
+from the file with IoTDevice.from_private_key_bytes(device_id,
+bytes.fromhex(private_key)).
+
+With --export, every device registered with the local gateway is written
+to a file of {"device_id", "public_key"} lines. It reads --registry and
+--database as they are, so the server may keep running.
+--import accepts such a file as well, to enrol the fleet elsewhere.
+
+    python provision.py --export fleet_public.jsonl
+    python provision.py --server http://other-gateway:5000 --import fleet_public.jsonl
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple
+
+import requests
+from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat, load_der_private_key
+
+from client.main import IoTDevice
+from config import SERVER_URL, MAX_REGISTER_BATCH, REGISTRY_PATH, DATABASE_URL
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "server"))
+from registry import FileDeviceRegistry, SQLiteDeviceRegistry
+from storage import sqlite_path
+
+def _generate_keypair(_) -> Tuple[bytes, bytes]:
+    private_key_bytes = IoTDevice.generate_private_key_bytes()
+    return private_key_bytes, _public_key_bytes(private_key_bytes)
+
+def _public_key_bytes(private_key_bytes: bytes) -> bytes:
+    return load_der_private_key(private_key_bytes, password=None).public_key().public_bytes(
+        Encoding.X962, PublicFormat.UncompressedPoint
+    )
+
+def generate_keypairs(num_devices: int, workers: int = None) -> List[Tuple[bytes, bytes]]:
+    """(private key as PKCS#8 DER, raw public key) for num_devices new devices"""
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_generate_keypair, range(num_devices),
+                                 chunksize=max(1, num_devices // (workers * 4))))
+
+def derive_public_keys(private_keys: List[bytes], workers: int = None) -> List[bytes]:
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_public_key_bytes, private_keys,
+                                 chunksize=max(1, len(private_keys) // (workers * 4))))
+
+def write_keys(path: str, devices: List[Tuple[str, bytes]]) -> None:
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "w") as f:
+        for device_id, private_key_bytes in devices:
+            f.write(json.dumps({"device_id": device_id, "private_key": private_key_bytes.hex()}) + "\n")
+
+def read_entries(path: str) -> List[dict]:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def export_registry(path: str, registry_path: str, database_url: str) -> int:
+    """Write every registered (device_id, public_key) to path; returns the number written.
+
+    A node keeps its devices in registry_path when it runs as one process
+    and in database_url as a cluster, so both are read.
+    """
+    devices = {}
+    if registry_path:
+        registry = FileDeviceRegistry(registry_path, read_only=True)
+        devices.update(registry.items())
+        registry.close()
+    if database_url and os.path.exists(sqlite_path(database_url)):
+        for device_id, public_key_bytes in SQLiteDeviceRegistry(database_url).items():
+            devices.setdefault(device_id, public_key_bytes)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+    with os.fdopen(fd, "w") as f:
+        for device_id in sorted(devices):
+            f.write(json.dumps({"device_id": device_id, "public_key": devices[device_id].hex()}) + "\n")
+    return len(devices)
+
+def register(server_url: str, devices: List[Tuple[str, bytes]], batch_size: int) -> Tuple[int, List[dict]]:
+    """Register (device_id, public_key) pairs; returns the number added and the failures"""
+    session = requests.Session()
+    registered = 0
+    failures = []
+    for start in range(0, len(devices), batch_size):
+        batch = devices[start:start + batch_size]
+        response = session.post(f"{server_url}/api/register-batch", json={
+            "devices": [{"device_id": device_id, "public_key": public_key.hex()} for device_id, public_key in batch]
+        }, timeout=120)
+        response.raise_for_status()
+        body = response.json()
+        registered += body["registered"]
+        failures.extend({"device_id": device_id, **result}
+                        for (device_id, _), result in zip(batch, body["results"])
+                        if result["status"] != "success")
+    return registered, failures
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--server", default=SERVER_URL)
+    parser.add_argument("--devices", type=int, default=100, help="Devices to generate")
+    parser.add_argument("--prefix", default="sensor", help="Device id prefix")
+    parser.add_argument("--first", type=int, default=1, help="Number of the first generated device")
+    parser.add_argument("--keys", default="device_keys.jsonl", help="Private keys file to write")
+    parser.add_argument("--import", dest="import_path",
+                        help="Register the devices in this keys or exported public keys file instead")
+    parser.add_argument("--export", dest="export_path", help="Write the locally registered devices to this file")
+    parser.add_argument("--registry", default=REGISTRY_PATH, help="Registry file read by --export")
+    parser.add_argument("--database", default=DATABASE_URL, help="Database read by --export")
+    parser.add_argument("--key-workers", type=int, default=None, help="Processes for key generation")
+    parser.add_argument("--batch", type=int, default=MAX_REGISTER_BATCH, help="Devices per request")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    if args.export_path:
+        if os.path.exists(args.export_path):
+            sys.exit(f"{args.export_path} already exists; choose another --export file")
+        exported = export_registry(args.export_path, args.registry, args.database)
+        print(f"Exported {exported} devices to {args.export_path} in {time.perf_counter() - started:.1f}s")
+        return
+
+    if args.import_path:
+        entries = read_entries(args.import_path)
+        if entries and "public_key" in entries[0]:
+            devices = [(entry["device_id"], bytes.fromhex(entry["public_key"])) for entry in entries]
+        else:
+            private_keys = [(entry["device_id"], bytes.fromhex(entry["private_key"])) for entry in entries]
+            public_keys = derive_public_keys([key for _, key in private_keys], args.key_workers)
+            devices = [(device_id, public_key) for (device_id, _), public_key in zip(private_keys, public_keys)]
+        print(f"Loaded {len(devices)} device keys from {args.import_path} "
+              f"in {time.perf_counter() - started:.1f}s")
+    else:
+        if os.path.exists(args.keys):
+            sys.exit(f"{args.keys} already exists; choose another --keys file")
+        keypairs = generate_keypairs(args.devices, args.key_workers)
+        device_ids = [f"{args.prefix}_{i}" for i in range(args.first, args.first + args.devices)]
+        write_keys(args.keys, [(device_id, private_key) for device_id, (private_key, _) in zip(device_ids, keypairs)])
+        devices = [(device_id, public_key) for device_id, (_, public_key) in zip(device_ids, keypairs)]
+        print(f"Generated {len(devices)} device keys in {time.perf_counter() - started:.1f}s "
+              f"and wrote them to {args.keys}")
+
+    started = time.perf_counter()
+    registered, failures = register(args.server, devices, args.batch)
+    print(f"Registered {registered} devices with {args.server} in {time.perf_counter() - started:.1f}s")
+    for failure in failures[:10]:
+        print(f"  {failure['device_id']}: {failure['error']}")
+    if len(failures) > 10:
+        print(f"  ... and {len(failures) - 10} more failures")
+
+if __name__ == "__main__":
+    main()
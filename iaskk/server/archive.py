@@ -0,0 +1,207 @@
+import bisect
+import glob
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+
+from transactions import Transaction, transactions_json
+
+SEGMENT_MAGIC = b"IOTSEG1\0"
+# Per block: offset and length of its compressed transaction list
+SEGMENT_ENTRY = struct.Struct("<QI")
+# Last bytes of a segment: first block index, block count, magic
+SEGMENT_TRAILER = struct.Struct("<QQ8s")
+# Signed checkpoints kept on disk; older ones are deleted
+CHECKPOINTS_KEPT = 3
+
+def _canonical(payload: Dict) -> bytes:
+    return json.dumps(payload, sort_keys=True, separators=(",", ":")).encode()
+
+def load_checkpoint_key(path: str) -> ec.EllipticCurvePrivateKey:
+    """Read the checkpoint signing key, creating it on first use"""
+    try:
+        with open(path, "rb") as f:
+            return serialization.load_pem_private_key(f.read(), password=None)
+    except FileNotFoundError:
+        pass
+    key = ec.generate_private_key(ec.SECP256K1())
+    pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                            serialization.NoEncryption())
+    tmp = f"{path}.{os.getpid()}.tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(pem)
+    try:
+        # Another process may create the key at the same time; the first link wins
+        os.link(tmp, path)
+    except FileExistsError:
+        with open(path, "rb") as f:
+            key = serialization.load_pem_private_key(f.read(), password=None)
+    finally:
+        os.remove(tmp)
+    return key
+
+class Segment:
+    """A read-only, memory-mapped segment file covering consecutive blocks"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.first, self.count, magic = SEGMENT_TRAILER.unpack_from(self.data, len(self.data) - SEGMENT_TRAILER.size)
+        if magic != SEGMENT_MAGIC or self.data[:len(SEGMENT_MAGIC)] != SEGMENT_MAGIC:
+            raise ValueError(f"{path} is not a segment file")
+        self.entries_at = len(self.data) - SEGMENT_TRAILER.size - self.count * SEGMENT_ENTRY.size
+
+    @property
+    def last(self) -> int:
+        return self.first + self.count - 1
+
+    def read(self, index: int) -> List[Transaction]:
+        offset, length = SEGMENT_ENTRY.unpack_from(self.data, self.entries_at + (index - self.first) * SEGMENT_ENTRY.size)
+        return [Transaction.from_dict(tx) for tx in json.loads(zlib.decompress(self.data[offset:offset + length]))]
+
+    def close(self) -> None:
+        self.data.close()
+
+class ChainArchive:
+    """Compacted blocks' transactions in compressed segment files, plus signed checkpoints.
+
+    Each segment holds the zlib-compressed transaction lists of a run of
+    consecutive blocks and an offset table, and is memory-mapped for reads,
+    so a block is decompressed only when it is asked for (recent reads are
+    kept in a small cache). Segments are written to a temporary file and
+    renamed into place, so readers in other processes never see a partial
+    one; a miss makes the reader rescan the directory.
+
+    A checkpoint records the hash and Merkle root of the last compacted
+    block and is signed with a secp256k1 key kept next to the archive.
+    """
+
+    def __init__(self, directory: str, key_path: Optional[str] = None, cache_blocks: int = 64):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.key = load_checkpoint_key(key_path or os.path.join(directory, "checkpoint_key.pem"))
+        self.segments: List[Segment] = []
+        self._firsts: List[int] = []
+        self.lock = threading.Lock()
+        self.load_transactions = lru_cache(maxsize=cache_blocks)(self._read)
+        self._scan()
+
+    @property
+    def next_index(self) -> int:
+        """Index of the first block not yet archived"""
+        return self.segments[-1].last + 1 if self.segments else 0
+
+    def _scan(self) -> None:
+        with self.lock:
+            known = {segment.path for segment in self.segments}
+            for path in sorted(glob.glob(os.path.join(self.directory, "segment-*.seg"))):
+                if path not in known:
+                    self.segments.append(Segment(path))
+            self.segments.sort(key=lambda segment: segment.first)
+            self._firsts = [segment.first for segment in self.segments]
+
+    def _find(self, index: int) -> Optional[Segment]:
+        i = bisect.bisect_right(self._firsts, index) - 1
+        if i >= 0 and index <= self.segments[i].last:
+            return self.segments[i]
+        return None
+
+    def _read(self, index: int) -> List[Transaction]:
+        segment = self._find(index)
+        if segment is None:
+            # Possibly written by another process since the last scan
+            self._scan()
+            segment = self._find(index)
+            if segment is None:
+                raise KeyError(f"Block {index} is not archived")
+        return segment.read(index)
+
+    def write_segment(self, first: int, transaction_lists: List[List[Transaction]]) -> Segment:
+        """Archive the transactions of blocks first, first + 1, ... in one segment"""
+        last = first + len(transaction_lists) - 1
+        path = os.path.join(self.directory, f"segment-{first:010d}-{last:010d}.seg")
+        tmp = f"{path}.tmp"
+        entries = []
+        with open(tmp, "wb") as f:
+            f.write(SEGMENT_MAGIC)
+            offset = len(SEGMENT_MAGIC)
+            for transactions in transaction_lists:
+                frame = zlib.compress(transactions_json(transactions))
+                f.write(frame)
+                entries.append(SEGMENT_ENTRY.pack(offset, len(frame)))
+                offset += len(frame)
+            f.write(b"".join(entries))
+            f.write(SEGMENT_TRAILER.pack(first, len(transaction_lists), SEGMENT_MAGIC))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        self._scan()
+        return self._find(first)
+
+    def size(self) -> int:
+        """Bytes on disk used by segments"""
+        return sum(len(segment.data) for segment in self.segments)
+
+    def sign_checkpoint(self, block, archived_upto: int) -> Dict:
+        """Sign and store a checkpoint for block; returns it"""
+        checkpoint = {
+            "index": block.index,
+            "hash": block.hash,
+            "merkle_root": block.merkle_root,
+            "timestamp": block.timestamp,
+            "archived_upto": archived_upto,
+            "created": time.time()
+        }
+        checkpoint["signature"] = self.key.sign(_canonical(checkpoint), ec.ECDSA(hashes.SHA256())).hex()
+        path = os.path.join(self.directory, f"checkpoint-{block.index:010d}.json")
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(checkpoint, f)
+        os.replace(f"{path}.tmp", path)
+        for old in sorted(glob.glob(os.path.join(self.directory, "checkpoint-*.json")))[:-CHECKPOINTS_KEPT]:
+            os.remove(old)
+        return checkpoint
+
+    def verify_checkpoint(self, checkpoint: Dict) -> bool:
+        payload = {k: v for k, v in checkpoint.items() if k != "signature"}
+        try:
+            self.key.public_key().verify(bytes.fromhex(checkpoint["signature"]), _canonical(payload),
+                                         ec.ECDSA(hashes.SHA256()))
+            return True
+        except (InvalidSignature, ValueError, KeyError):
+            return False
+
+    def latest_checkpoint(self) -> Optional[Dict]:
+        """The newest checkpoint whose signature verifies, if any"""
+        for path in sorted(glob.glob(os.path.join(self.directory, "checkpoint-*.json")), reverse=True):
+            try:
+                with open(path) as f:
+                    checkpoint = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if self.verify_checkpoint(checkpoint):
+                return checkpoint
+        return None
+
+    def public_key_hex(self) -> str:
+        return self.key.public_key().public_bytes(
+            serialization.Encoding.X962, serialization.PublicFormat.UncompressedPoint
+        ).hex()
+
+    def close(self) -> None:
+        with self.lock:
+            for segment in self.segments:
+                segment.close()
+            self.segments = []
+            self._firsts = []
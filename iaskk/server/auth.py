@@ -1,44 +1,171 @@
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.asymmetric.utils import encode_dss_signature
 from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
 from cryptography.exceptions import InvalidSignature
 import base64
 import json
-from typing import Dict, Optional
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import List, Optional, Tuple, Union
 import os
+import threading
+from registry import DeviceRegistry
+from instrumentation import metrics
+
+# Batches smaller than this are verified inline; the pool round trip costs more
+MIN_POOL_BATCH = 16
+# Bytes in each of r and s for secp256k1
+SIGNATURE_COMPONENT_SIZE = 32
+
+VERIFY_SECONDS = metrics.histogram("iot_signature_verify_seconds", "ECDSA verification time per signature")
+VERIFY_BATCH_SECONDS = metrics.histogram("iot_signature_batch_verify_seconds",
+                                         "Time to verify one batch of signatures")
+VERIFY_FAILURES = metrics.counter("iot_signature_failures_total", "Signatures that failed verification")
+
+@lru_cache(maxsize=4096)
+def _load_public_key(public_key_bytes: bytes) -> ec.EllipticCurvePublicKey:
+    return ec.EllipticCurvePublicKey.from_encoded_point(ec.SECP256K1(), public_key_bytes)
+
+def _as_bytes(message: Union[str, bytes]) -> bytes:
+    return message if isinstance(message, bytes) else message.encode()
+
+def raw_signature_to_der(signature: bytes) -> bytes:
+    """Convert a fixed 64-byte r||s signature to the DER form cryptography verifies.
+
+    Raises ValueError if the signature is not 64 bytes.
+    """
+    if len(signature) != 2 * SIGNATURE_COMPONENT_SIZE:
+        raise ValueError("Raw signature must be 64 bytes")
+    r = int.from_bytes(signature[:SIGNATURE_COMPONENT_SIZE], "big")
+    s = int.from_bytes(signature[SIGNATURE_COMPONENT_SIZE:], "big")
+    return encode_dss_signature(r, s)
+
+def verify_encoded(public_key_bytes: bytes, message: bytes, signature: bytes) -> bool:
+    """Verify a signature against a raw public key (runs in the verification pool)"""
+    try:
+        _load_public_key(public_key_bytes).verify(signature, message, ec.ECDSA(hashes.SHA256()))
+        return True
+    except (InvalidSignature, ValueError):
+        return False
 
 class DeviceAuthenticator:
-    def __init__(self):
-        self.registered_devices: Dict[str, bytes] = {}
+    def __init__(self, key_cache_size: int = 100000, verify_workers: int = 1, registry=None):
+        # A DeviceRegistry, or a SQLiteDeviceRegistry shared between server processes
+        self.registered_devices = registry if registry is not None else DeviceRegistry()
+        # Parsed public keys, most recently used last. Devices that fall out of
+        # the cache are re-parsed from registered_devices on their next request.
+        self.key_cache_size = key_cache_size
+        self._key_cache: "OrderedDict[str, ec.EllipticCurvePublicKey]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.verify_workers = max(1, verify_workers)
+        self._verify_pool: Optional[ProcessPoolExecutor] = None
         
     def register_device(self, device_id: str, public_key_bytes: bytes) -> bool:
-        """Register a new device with its public key"""
+        """Register a new device with its public key.
+
+        Raises ValueError if the bytes are not a valid secp256k1 point.
+        """
         if device_id in self.registered_devices:
             return False
         
-        self.registered_devices[device_id] = public_key_bytes
+        public_key = ec.EllipticCurvePublicKey.from_encoded_point(ec.SECP256K1(), public_key_bytes)
+        if not self.registered_devices.add(device_id, public_key_bytes):
+            return False
+        self._cache_public_key(device_id, public_key)
         return True
+
+    def register_devices(self, devices: List[Tuple[str, bytes]]) -> List[Optional[bool]]:
+        """Register several devices with one registry write.
+
+        Returns, per device, whether it was added, or None if its key is not
+        a valid secp256k1 point. Keys are not cached until first used.
+        """
+        results: List[Optional[bool]] = [None] * len(devices)
+        valid = []
+        for i, (device_id, public_key_bytes) in enumerate(devices):
+            try:
+                _load_public_key(public_key_bytes)
+            except ValueError:
+                continue
+            valid.append(i)
+        added = self.registered_devices.add_many([devices[i] for i in valid])
+        for i, was_added in zip(valid, added):
+            results[i] = was_added
+        return results
+
+    def _cache_public_key(self, device_id: str, public_key: ec.EllipticCurvePublicKey) -> None:
+        if self.key_cache_size <= 0:
+            return
+        with self._cache_lock:
+            self._key_cache[device_id] = public_key
+            self._key_cache.move_to_end(device_id)
+            while len(self._key_cache) > self.key_cache_size:
+                self._key_cache.popitem(last=False)
+
+    def get_public_key(self, device_id: str) -> Optional[ec.EllipticCurvePublicKey]:
+        """Get the parsed public key for a registered device"""
+        with self._cache_lock:
+            public_key = self._key_cache.get(device_id)
+            if public_key is not None:
+                self._key_cache.move_to_end(device_id)
+                return public_key
+
+        public_key_bytes = self.registered_devices.get(device_id)
+        if public_key_bytes is None:
+            return None
+        public_key = ec.EllipticCurvePublicKey.from_encoded_point(ec.SECP256K1(), public_key_bytes)
+        self._cache_public_key(device_id, public_key)
+        return public_key
     
-    def verify_signature(self, device_id: str, message: str, signature: bytes) -> bool:
+    def verify_signature(self, device_id: str, message: Union[str, bytes], signature: bytes) -> bool:
         """Verify a message signature from a device"""
-        if device_id not in self.registered_devices:
+        public_key = self.get_public_key(device_id)
+        if public_key is None:
             return False
             
         try:
-            public_key = ec.EllipticCurvePublicKey.from_encoded_point(
-                ec.SECP256K1(),
-                self.registered_devices[device_id]
-            )
-            
-            public_key.verify(
-                signature,
-                message.encode(),
-                ec.ECDSA(hashes.SHA256())
-            )
+            with VERIFY_SECONDS.time():
+                public_key.verify(
+                    signature,
+                    _as_bytes(message),
+                    ec.ECDSA(hashes.SHA256())
+                )
             return True
         except (InvalidSignature, ValueError):
+            VERIFY_FAILURES.inc()
             return False
 
+    def verify_batch(self, items: List[Tuple[str, Union[str, bytes], bytes]]) -> List[bool]:
+        """Verify (device_id, message, signature) items, in parallel when a pool is configured"""
+        with VERIFY_BATCH_SECONDS.time():
+            if self.verify_workers == 1 or len(items) < MIN_POOL_BATCH:
+                return [self.verify_signature(device_id, message, signature)
+                        for device_id, message, signature in items]
+            return self._verify_in_pool(items)
+
+    def _verify_in_pool(self, items: List[Tuple[str, Union[str, bytes], bytes]]) -> List[bool]:
+        results = [False] * len(items)
+        known = []
+        for i, (device_id, message, signature) in enumerate(items):
+            public_key_bytes = self.registered_devices.get(device_id)
+            if public_key_bytes is not None:
+                known.append((i, public_key_bytes, _as_bytes(message), signature))
+        if self._verify_pool is None:
+            self._verify_pool = ProcessPoolExecutor(max_workers=self.verify_workers)
+        verified = self._verify_pool.map(
+            verify_encoded,
+            [public_key for _, public_key, _, _ in known],
+            [message for _, _, message, _ in known],
+            [signature for _, _, _, signature in known],
+            chunksize=max(1, len(known) // (self.verify_workers * 4))
+        )
+        for (i, _, _, _), ok in zip(known, verified):
+            results[i] = ok
+        VERIFY_FAILURES.inc(results.count(False))
+        return results
+
     def get_device_public_key(self, device_id: str) -> Optional[bytes]:
         """Get the public key for a registered device"""
         return self.registered_devices.get(device_id)
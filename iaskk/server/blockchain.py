@@ -1,130 +1,513 @@
 import hashlib
 import json
+import os
 import time
-from typing import List, Dict
+from typing import Callable, FrozenSet, List, Dict, Optional, Set, Tuple
 import threading
+from mining import MiningEngine, serialize_for_hashing, difficulty_target
+from storage import BlockStore, ReadingKey
+from archive import ChainArchive
+from merkle import MerkleTree
+from validation import ChainValidator
+from instrumentation import metrics
+from transactions import Transaction, transactions_json
+
+LOCK_WAIT_SECONDS = metrics.histogram("iot_pending_lock_wait_seconds",
+                                      "Time spent waiting for the chain lock to add transactions")
+MINING_SECONDS = metrics.histogram("iot_mining_seconds", "Proof-of-work time per block",
+                                   buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120))
+MINING_HASHES = metrics.counter("iot_mining_hashes_total", "Nonces hashed by the proof-of-work search")
+CHAIN_DATA_SECONDS = metrics.histogram("iot_chain_data_seconds",
+                                       "Time to build the block dicts for one /api/chain page")
 
 class Block:
-    def __init__(self, index: int, transactions: List[Dict], timestamp: float, previous_hash: str):
+    __slots__ = ("index", "_transactions", "_loader", "timestamp", "previous_hash", "nonce",
+                 "merkle_tree", "merkle_root", "hash")
+
+    def __init__(self, index: int, transactions: List[Transaction], timestamp: float, previous_hash: str):
         self.index = index
-        self.transactions = transactions
+        self._transactions: Optional[List[Transaction]] = transactions
+        self._loader: Optional[Callable[[int], List[Transaction]]] = None
         self.timestamp = timestamp
         self.previous_hash = previous_hash
         self.nonce = 0
-        self.merkle_root = self._calculate_merkle_root()
+        self.merkle_tree: Optional[MerkleTree] = MerkleTree.from_transactions(transactions)
+        self.merkle_root = self.merkle_tree.root
         self.hash = self.calculate_hash()
 
-    def _calculate_merkle_root(self) -> str:
-        if not self.transactions:
-            return hashlib.sha256("empty".encode()).hexdigest()
-        
-        # Create leaf nodes from transactions
-        leaves = [hashlib.sha256(json.dumps(tx, sort_keys=True).encode()).hexdigest() 
-                 for tx in self.transactions]
-        
-        # Build Merkle tree
-        while len(leaves) > 1:
-            if len(leaves) % 2 == 1:
-                leaves.append(leaves[-1])  # Duplicate last element if odd number
-            
-            next_level = []
-            for i in range(0, len(leaves), 2):
-                combined = leaves[i] + leaves[i+1]
-                next_level.append(hashlib.sha256(combined.encode()).hexdigest())
-            leaves = next_level
-            
-        return leaves[0] if leaves else hashlib.sha256("empty".encode()).hexdigest()
+    @classmethod
+    def from_header(cls, index: int, block_hash: str, previous_hash: str, timestamp: float,
+                    nonce: int, merkle_root: str, loader: Callable[[int], List[Transaction]]) -> "Block":
+        """Rebuild a stored block without its transactions; they are read through loader on access"""
+        block = cls.__new__(cls)
+        block.index = index
+        block._transactions = None
+        block._loader = loader
+        block.timestamp = timestamp
+        block.previous_hash = previous_hash
+        block.nonce = nonce
+        block.merkle_root = merkle_root
+        block.merkle_tree = None
+        block.hash = block_hash
+        return block
 
-    def calculate_hash(self) -> str:
-        block_string = json.dumps({
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Block":
+        """Rebuild a block received as to_dict() JSON; its hash is recomputed, not copied"""
+        block = cls(data["index"], [Transaction.from_dict(tx) for tx in data["transactions"]],
+                    data["timestamp"], data["previous_hash"])
+        block.nonce = data["nonce"]
+        block.hash = block.calculate_hash()
+        return block
+
+    @property
+    def transactions(self) -> List[Transaction]:
+        if self._transactions is None:
+            return self._loader(self.index)
+        return self._transactions
+
+    def to_dict(self) -> Dict:
+        return {
             "index": self.index,
-            "transactions": self.transactions,
             "timestamp": self.timestamp,
+            "transactions": [dict(tx) for tx in self.transactions],
+            "hash": self.hash,
             "previous_hash": self.previous_hash,
-            "nonce": self.nonce,
-            "merkle_root": self.merkle_root
-        }, sort_keys=True).encode()
-        return hashlib.sha256(block_string).hexdigest()
+            "merkle_root": self.merkle_root,
+            "nonce": self.nonce
+        }
+
+    def to_json(self) -> bytes:
+        """JSON of to_dict(), with the transactions spliced in from their canonical encodings"""
+        header = json.dumps({
+            "index": self.index,
+            "timestamp": self.timestamp,
+            "hash": self.hash,
+            "previous_hash": self.previous_hash,
+            "merkle_root": self.merkle_root,
+            "nonce": self.nonce
+        })
+        return header[:-1].encode() + b', "transactions": ' + transactions_json(self.transactions) + b"}"
+
+    def release_transactions(self, loader: Callable[[int], List[Transaction]]) -> None:
+        """Drop the in-memory transactions once they can be read back through loader"""
+        self._loader = loader
+        self._transactions = None
+        self.merkle_tree = None
+
+    def get_merkle_tree(self) -> MerkleTree:
+        """The block's Merkle tree, rebuilt from storage for blocks whose transactions were released"""
+        if self.merkle_tree is not None:
+            return self.merkle_tree
+        return MerkleTree.from_transactions(self.transactions)
+
+    def _calculate_merkle_root(self) -> str:
+        return MerkleTree.from_transactions(self.transactions).root
+
+    def calculate_hash(self) -> str:
+        prefix, suffix = serialize_for_hashing(self.index, self.transactions, self.timestamp,
+                                               self.previous_hash, self.merkle_root)
+        return hashlib.sha256(prefix + str(self.nonce).encode() + suffix).hexdigest()
 
 class Blockchain:
-    def __init__(self, difficulty: int = 4):
+    def __init__(self, difficulty: int = 4, mining_workers: int = 1,
+                 store: Optional[BlockStore] = None, resident_blocks: int = 16,
+                 validation_workers: int = 1, shared_pending: bool = False,
+                 archive_dir: Optional[str] = None, segment_blocks: int = 1000):
         self.chain: List[Block] = []
         self.difficulty = difficulty
-        self.pending_transactions: List[Dict] = []
+        self.miner = MiningEngine(difficulty, workers=mining_workers)
+        self.store = store
+        self.resident_blocks = resident_blocks
+        self.pending_transactions: List[Transaction] = []
+        # With several server processes the pending pool lives in the store instead
+        self.shared_pending = shared_pending
+        # Called with the pool size after in-process additions (e.g. BlockScheduler.notify)
+        self.on_pending: Optional[Callable[[int], None]] = None
+        # Called with transactions accepted by this node (e.g. PeerReplicator.submit)
+        self.on_transactions: Optional[Callable[[List[Transaction]], None]] = None
         self.lock = threading.Lock()
+        self.mining_lock = threading.Lock()
+        # Pending transactions detached by create_block and not yet in a block
+        self._mining_transactions: List[Transaction] = []
+        # (tip hash, canonicals per recent block hash, their union) for add_replicated_transactions
+        self._recent_canonicals: Tuple[Optional[str], Dict[str, FrozenSet[bytes]], Set[bytes]] = (None, {}, set())
+        self.validator = ChainValidator(self, workers=validation_workers)
+        # Compacted blocks' transactions and the latest signed checkpoint (see compact())
+        self.archive: Optional[ChainArchive] = None
+        self.checkpoint: Optional[Dict] = None
+        self.segment_blocks = segment_blocks
+        self.compaction_lock = threading.Lock()
         
-        # Create genesis block
-        self.create_genesis_block()
+        if self.store is not None and len(self.store):
+            self.load_from_store()
+        else:
+            # Create genesis block
+            self.create_genesis_block()
+
+        self.archive_dir = archive_dir
+        if archive_dir is not None:
+            self._open_archive()
+            self.restore_checkpoint()
+
+    def _open_archive(self) -> None:
+        # Segments and checkpoints belong to one chain, identified by its genesis block
+        self.archive = ChainArchive(os.path.join(self.archive_dir, self.chain[0].hash[:16]),
+                                    key_path=os.path.join(self.archive_dir, "checkpoint_key.pem"))
 
     def create_genesis_block(self) -> None:
         genesis_block = Block(0, [], time.time(), "0")
         self.mine_block(genesis_block)
         self.chain.append(genesis_block)
+        self._persist(genesis_block)
+
+    def load_from_store(self) -> None:
+        """Rebuild the chain from stored headers; transactions stay on disk until read"""
+        self.chain = [
+            Block.from_header(index, block_hash, previous_hash, timestamp, nonce, merkle_root,
+                              self._load_transactions)
+            for index, block_hash, previous_hash, timestamp, nonce, merkle_root in self.store.load_headers()
+        ]
+
+    def refresh(self) -> List[Block]:
+        """Append blocks that another process (the miner) has stored since; returns them"""
+        with self.lock:
+            headers = self.store.load_headers(from_index=len(self.chain) - 1)
+            if not headers or headers[0][1] != self.chain[-1].hash:
+                # The miner switched to a peer's fork; reload the chain
+                self.load_from_store()
+                return self.chain[-1:]
+            new_blocks = [
+                Block.from_header(index, block_hash, previous_hash, timestamp, nonce, merkle_root,
+                                  self._load_transactions)
+                for index, block_hash, previous_hash, timestamp, nonce, merkle_root in headers[1:]
+            ]
+            self.chain.extend(new_blocks)
+        return new_blocks
+
+    def _persist(self, block: Block, consumed_pending: Optional[int] = None) -> None:
+        if self.store is None:
+            return
+        self.store.append(block, consumed_pending)
+        # Keep only the most recent blocks' transactions in memory
+        evict = len(self.chain) - 1 - self.resident_blocks
+        if evict >= 0:
+            self.chain[evict].release_transactions(self._load_transactions)
+
+    def _load_transactions(self, index: int) -> List[Transaction]:
+        if self.archive is not None and index < self.archive.next_index:
+            return self.archive.load_transactions(index)
+        transactions = self.store.load_transactions(index)
+        if self.archive is not None and transactions and transactions[0]["data"] is None:
+            # Compacted by another process since this one last looked at the archive
+            return self.archive.load_transactions(index)
+        return transactions
+
+    def restore_checkpoint(self) -> Optional[Dict]:
+        """Resume validation after the latest signed checkpoint that matches this chain"""
+        checkpoint = self.archive.latest_checkpoint()
+        if checkpoint is None:
+            return None
+        index = checkpoint["index"]
+        if index >= len(self.chain) or self.chain[index].hash != checkpoint["hash"]:
+            print(f"Ignoring checkpoint at block {index}: it does not match the stored chain")
+            return None
+        self.checkpoint = checkpoint
+        self.validator.set_checkpoint(index, checkpoint["hash"])
+        return checkpoint
+
+    def compact(self, keep_recent: int = 1000) -> Dict:
+        """Archive validated blocks older than the newest keep_recent and sign a checkpoint.
+
+        Their transactions move into compressed segments (and their payloads
+        out of the block store); the blocks stay in the chain as headers and
+        read their transactions back from the archive when asked. Validation
+        then starts after the checkpoint, here and after a restart. Mining
+        and reorgs wait while it runs, so the blocks it validated are the
+        blocks it archives.
+        """
+        if self.archive is None:
+            raise RuntimeError("Compaction needs an archive directory")
+        with self.compaction_lock, self.mining_lock:
+            started = time.perf_counter()
+            report = self.validator.validate()
+            first = self.archive.next_index
+            last = min(report["verified_upto"], len(self.chain) - 1 - keep_recent)
+            for start in range(first, last + 1, self.segment_blocks):
+                blocks = self.chain[start:min(last + 1, start + self.segment_blocks)]
+                self.archive.write_segment(start, [block.transactions for block in blocks])
+                if self.store is not None:
+                    self.store.archive_transactions(start, blocks[-1].index)
+                for block in blocks:
+                    block.release_transactions(self._load_transactions)
+            if last >= first:
+                self.checkpoint = self.archive.sign_checkpoint(self.chain[last], last)
+                self.validator.set_checkpoint(last, self.chain[last].hash)
+            return {
+                "valid": report["valid"],
+                "archived_blocks": max(0, last - first + 1),
+                "archived_upto": self.archive.next_index - 1,
+                "segments": len(self.archive.segments),
+                "archive_bytes": self.archive.size(),
+                "checkpoint": self.checkpoint,
+                "elapsed": time.perf_counter() - started
+            }
 
     def get_latest_block(self) -> Block:
         return self.chain[-1]
 
     def add_transaction(self, sender: str, recipient: str, data: Dict) -> bool:
-        with self.lock:
-            transaction = {
-                "sender": sender,
-                "recipient": recipient,
-                "timestamp": time.time(),
-                "data": data
+        self.add_transactions([(sender, recipient, data)])
+        return True
+
+    def add_transactions(self, transactions: List[Tuple[str, str, Dict]]) -> int:
+        """Add several (sender, recipient, data) transactions under one lock acquisition"""
+        timestamp = time.time()
+        pending = [Transaction(sender, recipient, timestamp, data) for sender, recipient, data in transactions]
+        self._add_pending(pending)
+        if self.on_transactions is not None:
+            self.on_transactions(pending)
+        return len(pending)
+
+    def _recent_block_canonicals(self) -> Set[bytes]:
+        """Canonical encodings of the transactions in the last resident_blocks blocks"""
+        tip, per_block, recent = self._recent_canonicals
+        window = self.chain[-self.resident_blocks:]
+        if window and window[-1].hash != tip:
+            # Only blocks new to the window have their transactions read
+            per_block = {
+                block.hash: per_block.get(block.hash) or frozenset(tx.canonical for tx in block.transactions)
+                for block in window
             }
-            self.pending_transactions.append(transaction)
-            return True
+            recent = set().union(*per_block.values())
+            self._recent_canonicals = (window[-1].hash, per_block, recent)
+        return recent
 
-    def mine_block(self, block: Block) -> bool:
-        target = "0" * self.difficulty
-        
-        while block.hash[:self.difficulty] != target:
-            block.nonce += 1
-            block.hash = block.calculate_hash()
-        return True
+    def add_replicated_transactions(self, transactions: List[Transaction]) -> List[Transaction]:
+        """Add transactions accepted by a peer node, keeping their timestamps.
+
+        Ones already pending, being mined or in a recent block (the peer's
+        block arrived before its transaction push) are skipped; returns the
+        ones added.
+        """
+        recent = self._recent_block_canonicals()
+        transactions = [tx for tx in transactions if tx.canonical not in recent]
+        if self.shared_pending:
+            # Rows being mined stay in the pool until their block is stored
+            return self.store.add_pending(transactions, skip_existing=True)
+        with self.lock:
+            known = {tx.canonical for tx in self.pending_transactions}
+            known.update(tx.canonical for tx in self._mining_transactions)
+            added = []
+            for tx in transactions:
+                if tx.canonical not in known:
+                    known.add(tx.canonical)
+                    added.append(tx)
+            self.pending_transactions.extend(added)
+            size = len(self.pending_transactions)
+        if added and self.on_pending is not None:
+            self.on_pending(size)
+        return added
 
-    def create_block(self) -> None:
+    def _add_pending(self, pending: List[Transaction]) -> None:
+        if self.shared_pending:
+            self.store.add_pending(pending)
+            return
+        waited = metrics.clock()
+        with self.lock:
+            LOCK_WAIT_SECONDS.observe_since(waited)
+            self.pending_transactions.extend(pending)
+            size = len(self.pending_transactions)
+        if self.on_pending is not None:
+            self.on_pending(size)
+
+    def pending_stats(self) -> Tuple[int, Optional[float]]:
+        """Number of pending transactions and the timestamp of the oldest one"""
+        if self.shared_pending:
+            return self.store.pending_stats()
         with self.lock:
             if not self.pending_transactions:
-                return None
-                
-            new_block = Block(
-                len(self.chain),
-                self.pending_transactions[:],
-                time.time(),
-                self.get_latest_block().hash
-            )
-            
-            self.pending_transactions = []
-            self.mine_block(new_block)
-            self.chain.append(new_block)
-            return new_block
-
-    def is_chain_valid(self) -> bool:
-        for i in range(1, len(self.chain)):
-            current_block = self.chain[i]
-            previous_block = self.chain[i-1]
-
-            if current_block.hash != current_block.calculate_hash():
-                return False
-
-            if current_block.previous_hash != previous_block.hash:
-                return False
-
-            if current_block.merkle_root != current_block._calculate_merkle_root():
-                return False
+                return 0, None
+            return len(self.pending_transactions), self.pending_transactions[0].timestamp
 
-        return True
+    def block_work(self) -> int:
+        """Expected hashes to mine one block at this chain's difficulty"""
+        return 16 ** self.difficulty
 
-    def get_chain_data(self) -> List[Dict]:
-        return [
-            {
-                "index": block.index,
-                "timestamp": block.timestamp,
-                "transactions": block.transactions,
-                "hash": block.hash,
-                "previous_hash": block.previous_hash,
-                "merkle_root": block.merkle_root
-            }
-            for block in self.chain
-        ] 
\ No newline at end of file
+    def cumulative_work(self) -> int:
+        return len(self.chain) * self.block_work()
+
+    def outweighs(self, blocks: List[Block]) -> bool:
+        """Whether the chain ending in blocks beats this one: more work, or equal work and a lower tip hash"""
+        work = (blocks[-1].index + 1) * self.block_work()
+        current = self.cumulative_work()
+        return work > current or (work == current and blocks[-1].hash < self.chain[-1].hash)
+
+    def check_received_block(self, block: Block, claimed: Dict) -> Optional[str]:
+        """Check a block rebuilt with Block.from_dict against what the sender claimed; returns a failure reason or None"""
+        if block.merkle_root != claimed["merkle_root"]:
+            return "merkle root does not match transactions"
+        if block.hash != claimed["hash"]:
+            return "block hash does not match contents"
+        target = difficulty_target(self.difficulty)
+        if target is not None and bytes.fromhex(block.hash) >= target:
+            return "block hash does not meet the difficulty"
+        return None
+
+    def adopt_blocks(self, blocks: List[Block]) -> List[Block]:
+        """Replace the chain from blocks[0].index onwards with already checked blocks from a peer.
+
+        blocks must be consecutive and attach to the block before the first
+        one (or start a new chain at index 0). Transactions of the blocks
+        that are dropped go back to the pending pool unless the new blocks
+        contain them, and pending transactions the new blocks contain are
+        removed. Archived blocks and blocks up to a signed checkpoint are
+        never replaced, and the chain is only switched if the result
+        outweighs it, so a caller must hold back a branch until it has all
+        of the blocks that make it heavier. Returns the dropped blocks.
+        """
+        first = blocks[0].index
+        for previous, block in zip(blocks, blocks[1:]):
+            if block.index != previous.index + 1 or block.previous_hash != previous.hash:
+                raise ValueError(f"Block {block.index} does not follow block {previous.index}")
+
+        with self.mining_lock:
+            with self.lock:
+                if first > len(self.chain):
+                    raise ValueError(f"Block {first} leaves a gap after block {len(self.chain) - 1}")
+                if first > 0 and blocks[0].previous_hash != self.chain[first - 1].hash:
+                    raise ValueError(f"Block {first} does not attach to block {first - 1}")
+                if first == 0 and blocks[0].previous_hash != "0":
+                    raise ValueError("Block 0 is not a genesis block")
+                if self.checkpoint is not None and first <= self.checkpoint["index"]:
+                    raise ValueError(f"Block {first} is before the signed checkpoint")
+                if self.archive is not None and first < self.archive.next_index:
+                    raise ValueError(f"Block {first} is already archived")
+                if not self.outweighs(blocks):
+                    raise ValueError(f"Blocks {first}-{blocks[-1].index} do not outweigh this chain")
+
+                dropped = self.chain[first:]
+                included = {tx.canonical for block in blocks for tx in block.transactions}
+                returned = [
+                    tx for block in dropped for tx in block.transactions if tx.canonical not in included
+                ]
+                self.chain[first:] = blocks
+                if not self.shared_pending:
+                    self.pending_transactions = returned + [
+                        tx for tx in self.pending_transactions if tx.canonical not in included
+                    ]
+                    size = len(self.pending_transactions)
+
+            if self.store is not None:
+                self.store.replace_from(first, blocks)
+                if self.shared_pending:
+                    self.store.remove_pending([tx for block in blocks for tx in block.transactions])
+                    self.store.add_pending(returned)
+                    size = self.store.pending_stats()[0]
+                # Keep only the most recent blocks' transactions in memory
+                for block in self.chain[first:len(self.chain) - 1 - self.resident_blocks]:
+                    block.release_transactions(self._load_transactions)
+            if first == 0 and self.archive is not None:
+                self._open_archive()
+            self.validator.rewind(first)
+        if self.on_pending is not None:
+            self.on_pending(size)
+        return dropped
+
+    def mine_block(self, block: Block) -> bool:
+        start_nonce = block.nonce
+        with MINING_SECONDS.time():
+            mined = self.miner.mine(block)
+        MINING_HASHES.inc(block.nonce - start_nonce + 1)
+        return mined
+
+    def create_block(self, max_transactions: Optional[int] = None) -> Optional[Block]:
+        """Mine the oldest pending transactions (at most max_transactions) into a new block"""
+        # Only one block is mined at a time; self.lock is held just long enough
+        # to detach the pending batch and, later, to append the mined block.
+        with self.mining_lock:
+            consumed_pending = None
+            if self.shared_pending:
+                # The pool rows are deleted in the same transaction that stores the block
+                transactions, consumed_pending = self.store.load_pending(
+                    -1 if max_transactions is None else max_transactions
+                )
+            with self.lock:
+                if not self.shared_pending:
+                    transactions = self.pending_transactions[:max_transactions]
+                    self.pending_transactions = self.pending_transactions[len(transactions):]
+                    self._mining_transactions = transactions
+                if not transactions:
+                    return None
+                index = len(self.chain)
+                previous_hash = self.get_latest_block().hash
+
+            while True:
+                new_block = Block(index, transactions, time.time(), previous_hash)
+                self.mine_block(new_block)
+
+                with self.lock:
+                    # The tip may have moved while mining; re-mine on top of it
+                    appended = self.get_latest_block().hash == previous_hash
+                    if appended:
+                        self.chain.append(new_block)
+                        self._mining_transactions = []
+                    else:
+                        index = len(self.chain)
+                        previous_hash = self.get_latest_block().hash
+
+                if appended:
+                    self._persist(new_block, consumed_pending)
+                    return new_block
+
+    def is_chain_valid(self, full: bool = False) -> bool:
+        """Check blocks added since the last successful validation, or every block if full"""
+        return self.validator.validate(full)["valid"]
+
+    def validate_chain(self, full: bool = False) -> Dict:
+        """Like is_chain_valid, but returns the failing block, reason and timing"""
+        return self.validator.validate(full)
+
+    def get_readings(self, sender: Optional[str] = None, since: Optional[float] = None,
+                     until: Optional[float] = None, after: Optional[ReadingKey] = None,
+                     limit: int = 100) -> Tuple[List[Dict], Optional[ReadingKey]]:
+        """Mined transactions with since <= timestamp < until in time order, one page at a time.
+
+        Pages are keyed rather than numbered: after is the (timestamp,
+        block_index, position) of the last reading already returned, and the
+        key to pass for the next page is returned with this one (None on the
+        last page). Stored chains seek through the database's indexes; chains
+        without a store (tests, benchmarks) scan their blocks.
+        """
+        if self.store is not None:
+            readings = self.store.query_transactions(sender, since, until, after, limit + 1)
+            for reading in readings[:limit]:
+                if reading["data"] is None:
+                    # Payload compacted into the archive
+                    reading["data"] = self.archive.load_transactions(reading["block_index"])[reading["position"]]["data"]
+        else:
+            readings = sorted(
+                ({"block_index": block.index, "position": position, **tx}
+                 for block in list(self.chain)
+                 for position, tx in enumerate(block.transactions)
+                 if (sender is None or tx["sender"] == sender)
+                 and (since is None or tx["timestamp"] >= since)
+                 and (until is None or tx["timestamp"] < until)
+                 and (after is None or (tx["timestamp"], block.index, position) > after)),
+                key=lambda reading: (reading["timestamp"], reading["block_index"], reading["position"])
+            )[:limit + 1]
+        if len(readings) <= limit:
+            return readings, None
+        last = readings[limit - 1]
+        return readings[:limit], (last["timestamp"], last["block_index"], last["position"])
+
+    def get_chain_data(self, from_index: int = 0, limit: Optional[int] = None) -> List[Dict]:
+        stop = None if limit is None else from_index + limit
+        with CHAIN_DATA_SECONDS.time():
+            return [block.to_dict() for block in self.chain[from_index:stop]]
+
+    def get_chain_json(self, from_index: int = 0, limit: Optional[int] = None) -> bytes:
+        """get_chain_data as a JSON array, built without decoding or re-encoding transactions"""
+        stop = None if limit is None else from_index + limit
+        with CHAIN_DATA_SECONDS.time():
+            return b"[" + b", ".join(block.to_json() for block in self.chain[from_index:stop]) + b"]" 
\ No newline at end of file
@@ -0,0 +1,119 @@
+import threading
+import time
+from collections import Counter, deque
+from typing import Deque, Dict, Set
+
+from instrumentation import metrics
+
+EMIT_SECONDS = metrics.histogram("iot_socketio_emit_seconds", "Time to emit one Socket.IO event")
+
+AGGREGATE_ROOM = "aggregate"
+
+def device_room(device_id: str) -> str:
+    return f"device:{device_id}"
+
+class Broadcaster:
+    """Coalesce accepted readings into one Socket.IO frame per room per tick.
+
+    The aggregate room gets the latest reading of every device that reported
+    during the tick plus how many readings each one sent. A device room gets
+    up to device_backlog of that device's most recent readings. Older readings
+    are merged away at the source, so outgoing traffic per client is bounded
+    by the tick rate no matter how fast readings arrive or how slowly a
+    dashboard drains its socket.
+    """
+
+    def __init__(self, socketio, tick: float = 0.25, device_backlog: int = 20,
+                 max_devices_per_frame: int = 500):
+        self.socketio = socketio
+        self.tick = tick
+        self.device_backlog = device_backlog
+        self.max_devices_per_frame = max_devices_per_frame
+        self._pending: Dict[str, Deque[Dict]] = {}
+        self._counts: Counter = Counter()
+        self._lock = threading.Lock()
+        # sid -> rooms, and room -> number of subscribers, so empty device rooms are skipped
+        self._subscriptions: Dict[str, Set[str]] = {}
+        self._subscribers: Counter = Counter()
+        self.frames_sent = 0
+        self.events_merged = 0
+
+    def start(self) -> None:
+        self.socketio.start_background_task(self._run)
+
+    def publish(self, device_id: str, data: Dict) -> None:
+        event = {'device_id': device_id, 'data': data, 'timestamp': time.time()}
+        with self._lock:
+            events = self._pending.get(device_id)
+            if events is None:
+                events = self._pending[device_id] = deque(maxlen=self.device_backlog)
+            elif len(events) == events.maxlen:
+                self.events_merged += 1
+            events.append(event)
+            self._counts[device_id] += 1
+
+    def subscribe(self, sid: str, room: str) -> None:
+        with self._lock:
+            rooms = self._subscriptions.setdefault(sid, set())
+            if room not in rooms:
+                rooms.add(room)
+                self._subscribers[room] += 1
+
+    def unsubscribe(self, sid: str, room: str) -> None:
+        with self._lock:
+            rooms = self._subscriptions.get(sid, set())
+            if room in rooms:
+                rooms.discard(room)
+                self._release(room)
+
+    def disconnect(self, sid: str) -> None:
+        with self._lock:
+            for room in self._subscriptions.pop(sid, ()):
+                self._release(room)
+
+    def _release(self, room: str) -> None:
+        # Caller holds self._lock
+        self._subscribers[room] -= 1
+        if self._subscribers[room] <= 0:
+            del self._subscribers[room]
+
+    def flush(self) -> None:
+        """Send one frame per room with the readings collected since the last flush"""
+        with self._lock:
+            if not self._pending:
+                return
+            pending, counts = self._pending, self._counts
+            self._pending, self._counts = {}, Counter()
+            device_rooms = [device_id for device_id in pending if device_room(device_id) in self._subscribers]
+            has_aggregate = AGGREGATE_ROOM in self._subscribers
+
+        now = time.time()
+        if has_aggregate:
+            latest = sorted((events[-1] for events in pending.values()),
+                            key=lambda event: event['timestamp'], reverse=True)
+            with EMIT_SECONDS.time():
+                self.socketio.emit('new_data_batch', {
+                    'events': latest[:self.max_devices_per_frame],
+                    'counts': dict(counts),
+                    'omitted_devices': max(0, len(latest) - self.max_devices_per_frame),
+                    'timestamp': now
+                }, to=AGGREGATE_ROOM)
+            self.frames_sent += 1
+
+        for device_id in device_rooms:
+            with EMIT_SECONDS.time():
+                self.socketio.emit('new_data_batch', {
+                    'events': list(pending[device_id]),
+                    'counts': {device_id: counts[device_id]},
+                    'omitted_devices': 0,
+                    'timestamp': now
+                }, to=device_room(device_id))
+            self.frames_sent += 1
+
+    def _run(self) -> None:
+        while True:
+            self.socketio.sleep(self.tick)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Broadcast flush failed: {e}")
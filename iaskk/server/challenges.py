@@ -0,0 +1,132 @@
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+import time
+import zlib
+from collections import OrderedDict
+from typing import List, Optional
+
+from storage import sqlite_path
+
+class ChallengeStore(ABC):
+    """Outstanding authentication challenges, one per device.
+
+    put() replaces any earlier challenge for the device; take() removes and
+    returns it, so each challenge can be answered at most once. Challenges
+    older than ttl are never returned, and at most max_entries are kept.
+    """
+
+    @abstractmethod
+    def put(self, device_id: str, challenge: str) -> None:
+        ...
+
+    @abstractmethod
+    def take(self, device_id: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def __len__(self) -> int:
+        ...
+
+class MemoryChallengeStore(ChallengeStore):
+    """In-process store striped over independently locked shards.
+
+    Each shard is an OrderedDict in expiry order (the TTL is fixed, so
+    insertion order is expiry order); expired entries are evicted from the
+    front on every put, and the oldest live ones when the shard is full.
+    """
+
+    def __init__(self, ttl: float = 60, max_entries: int = 100000, shards: int = 16):
+        self.ttl = ttl
+        self.shard_capacity = max(1, max_entries // shards)
+        self._shards: List["OrderedDict[str, tuple]"] = [OrderedDict() for _ in range(shards)]
+        self._locks = [threading.Lock() for _ in range(shards)]
+
+    def _shard(self, device_id: str) -> int:
+        return zlib.crc32(device_id.encode()) % len(self._shards)
+
+    def put(self, device_id: str, challenge: str) -> None:
+        i = self._shard(device_id)
+        shard = self._shards[i]
+        now = time.time()
+        with self._locks[i]:
+            shard.pop(device_id, None)
+            while shard and next(iter(shard.values()))[1] <= now:
+                shard.popitem(last=False)
+            while len(shard) >= self.shard_capacity:
+                shard.popitem(last=False)
+            shard[device_id] = (challenge, now + self.ttl)
+
+    def take(self, device_id: str) -> Optional[str]:
+        i = self._shard(device_id)
+        with self._locks[i]:
+            entry = self._shards[i].pop(device_id, None)
+        if entry is None or entry[1] <= time.time():
+            return None
+        return entry[0]
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self._shards)
+
+class SQLiteChallengeStore(ChallengeStore):
+    """Challenges in a SQLite table, shared by every process that opens the same file"""
+
+    def __init__(self, database_url: str, ttl: float = 60, max_entries: int = 100000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.conn = sqlite3.connect(sqlite_path(database_url), check_same_thread=False,
+                                    isolation_level=None, timeout=10)
+        self.lock = threading.Lock()
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS challenges ("
+                "device_id TEXT PRIMARY KEY, challenge TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_challenges_expiry ON challenges (expires_at)")
+
+    def put(self, device_id: str, challenge: str) -> None:
+        now = time.time()
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.conn.execute("DELETE FROM challenges WHERE expires_at <= ?", (now,))
+                self.conn.execute("INSERT OR REPLACE INTO challenges VALUES (?, ?, ?)",
+                                  (device_id, challenge, now + self.ttl))
+                self.conn.execute(
+                    "DELETE FROM challenges WHERE device_id IN ("
+                    "SELECT device_id FROM challenges ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                )
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    def take(self, device_id: str) -> Optional[str]:
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute(
+                    "SELECT challenge, expires_at FROM challenges WHERE device_id = ?", (device_id,)
+                ).fetchone()
+                if row is not None:
+                    self.conn.execute("DELETE FROM challenges WHERE device_id = ?", (device_id,))
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+        if row is None or row[1] <= time.time():
+            return None
+        return row[0]
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM challenges").fetchone()[0]
+
+def open_challenge_store(url: Optional[str], ttl: float, max_entries: int, shards: int) -> ChallengeStore:
+    """CHALLENGE_STORE_URL None or "memory" keeps challenges in-process; sqlite:/// URLs share them"""
+    if url is None or url == "memory":
+        return MemoryChallengeStore(ttl=ttl, max_entries=max_entries, shards=shards)
+    return SQLiteChallengeStore(url, ttl=ttl, max_entries=max_entries)
@@ -0,0 +1,106 @@
+import queue
+import threading
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+class IngestionQueue:
+    """Bounded queue between /api/submit-data and the ledger.
+
+    Request handlers only parse and enqueue; worker threads drain the queue in
+    batches, verify signatures, append accepted readings with one lock
+    acquisition per batch and hand them to on_accept (e.g. to broadcast).
+    submit() returns False instead of blocking when the queue is full.
+    Submissions already authenticated by a session MAC are enqueued with
+    signature=None and skip verification. With a replay_filter, verified
+    submissions enqueued with a replay_key are dropped as duplicates if the
+    key was recorded since the handler checked it.
+    """
+
+    def __init__(self, authenticator, blockchain, on_accept: Optional[Callable[[str, Dict], None]] = None,
+                 maxsize: int = 10000, workers: int = 2, batch_size: int = 64, replay_filter=None):
+        self.authenticator = authenticator
+        self.blockchain = blockchain
+        self.on_accept = on_accept
+        self.replay_filter = replay_filter
+        self.workers = workers
+        self.batch_size = batch_size
+        self.queue: "queue.Queue[Tuple[str, Dict, str, bytes, Optional[bytes]]]" = queue.Queue(maxsize=maxsize)
+        self.accepted = 0
+        self.rejected = 0
+        self.duplicates = 0
+        self.overflowed = 0
+        self._stats_lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> None:
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"ingestion-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, device_id: str, data: Dict, message: Union[str, bytes], signature: Optional[bytes],
+               replay_key: Optional[bytes] = None) -> bool:
+        try:
+            self.queue.put_nowait((device_id, data, message, signature, replay_key))
+            return True
+        except queue.Full:
+            with self._stats_lock:
+                self.overflowed += 1
+            return False
+
+    def _next_batch(self) -> List[Tuple[str, Dict, str, bytes, Optional[bytes]]]:
+        batch = [self.queue.get()]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            try:
+                self._process(batch)
+            except Exception as e:
+                print(f"Ingestion worker failed on a batch of {len(batch)}: {e}")
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def _process(self, batch: List[Tuple[str, Dict, str, bytes, Optional[bytes]]]) -> None:
+        signed = [(device_id, message, signature) for device_id, _, message, signature, _ in batch
+                  if signature is not None]
+        results = iter(self.authenticator.verify_batch(signed) if signed else [])
+        verified = [signature is None or next(results) for _, _, _, signature, _ in batch]
+        accepted = []
+        duplicates = 0
+        for (device_id, data, _, _, replay_key), ok in zip(batch, verified):
+            if not ok:
+                continue
+            if replay_key is not None and not self.replay_filter.add(replay_key):
+                duplicates += 1
+                continue
+            accepted.append((device_id, data))
+        if accepted:
+            self.blockchain.add_transactions([(device_id, "network", data) for device_id, data in accepted])
+        with self._stats_lock:
+            self.accepted += len(accepted)
+            self.duplicates += duplicates
+            self.rejected += len(batch) - len(accepted) - duplicates
+        if self.on_accept is not None:
+            for device_id, data in accepted:
+                self.on_accept(device_id, data)
+
+    def join(self) -> None:
+        """Block until everything enqueued so far has been processed"""
+        self.queue.join()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "depth": self.queue.qsize(),
+            "capacity": self.queue.maxsize,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "duplicates": self.duplicates,
+            "overflowed": self.overflowed
+        }
@@ -0,0 +1,191 @@
+import bisect
+import collections
+import os
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+# Latency bucket upper bounds in seconds, from 50us to 10s
+DEFAULT_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class _Timer:
+    __slots__ = ("histogram", "started")
+
+    def __init__(self, histogram: "Histogram"):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started)
+
+class _NoTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return None
+
+_NO_TIMER = _NoTimer()
+
+class Counter:
+    def __init__(self, registry: "Metrics", name: str, help_text: str):
+        self.registry = registry
+        self.name = name
+        self.help = help_text
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        if not self.registry.enabled:
+            return
+        with self._lock:
+            self.value += amount
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter",
+                f"{self.name} {self.value}"]
+
+class Gauge:
+    """A value read from a callback at scrape time, so it costs nothing in between"""
+
+    def __init__(self, name: str, help_text: str, read: Callable[[], float]):
+        self.name = name
+        self.help = help_text
+        self.read = read
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge",
+                f"{self.name} {self.read()}"]
+
+class Histogram:
+    def __init__(self, registry: "Metrics", name: str, help_text: str, buckets=DEFAULT_BUCKETS):
+        self.registry = registry
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        if not self.registry.enabled:
+            return
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    def observe_since(self, started: Optional[float]) -> None:
+        """Record the time since a Metrics.clock() reading; a no-op while metrics are disabled"""
+        if started is not None:
+            self.observe(time.perf_counter() - started)
+
+    def time(self):
+        """Context manager recording the duration of its block"""
+        return _Timer(self) if self.registry.enabled else _NO_TIMER
+
+    def render(self) -> List[str]:
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {cumulative}')
+        cumulative += counts[-1]
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {cumulative}')
+        lines.append(f"{self.name}_sum {total}")
+        lines.append(f"{self.name}_count {cumulative}")
+        return lines
+
+class Metrics:
+    """Process-wide metric registry rendered in the Prometheus text format.
+
+    While disabled, histograms and counters return before taking any lock
+    or reading the clock, so instrumented hot paths only pay an attribute
+    check. Gauges are computed at scrape time either way.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._metrics: Dict[str, object] = {}
+
+    def clock(self) -> Optional[float]:
+        return time.perf_counter() if self.enabled else None
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        return self._metrics.setdefault(name, Counter(self, name, help_text))
+
+    def histogram(self, name: str, help_text: str, buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._metrics.setdefault(name, Histogram(self, name, help_text, buckets))
+
+    def gauge(self, name: str, help_text: str, read: Callable[[], float]) -> Gauge:
+        self._metrics[name] = Gauge(name, help_text, read)
+        return self._metrics[name]
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
+
+class SamplingProfiler:
+    """Samples every thread's Python stack at a fixed interval.
+
+    collapsed() returns one "frame;frame;... count" line per distinct stack,
+    root first, which flamegraph.pl, speedscope and inferno read directly.
+    Nothing runs until start() is called.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples: collections.Counter = collections.Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self.samples.clear()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.samples[";".join(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
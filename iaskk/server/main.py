@@ -1,25 +1,123 @@
 from flask import Flask, render_template, request, jsonify
-from flask_socketio import SocketIO
+from flask_socketio import SocketIO, join_room, leave_room
+import argparse
+import hmac
 import json
+import multiprocessing
+import signal
+import socket
 import threading
 import time
-from blockchain import Blockchain
+from werkzeug.serving import make_server
+from blockchain import Blockchain, MINING_HASHES, MINING_SECONDS
+from storage import BlockStore, format_cursor, parse_cursor
+from ingestion import IngestionQueue
+from broadcast import Broadcaster, AGGREGATE_ROOM, EMIT_SECONDS, device_room
+from instrumentation import metrics, SamplingProfiler
+from rollups import RollupEngine
+from scheduler import BlockScheduler
+from wire import MSGPACK_CONTENT_TYPE, decode_json_submission, decode_msgpack_submission, msgpack
 from auth import DeviceAuthenticator, AuthenticationMessage
+from challenges import open_challenge_store
+from registry import FileDeviceRegistry, SQLiteDeviceRegistry, move_devices, valid_device_id
+from replay import ReplayFilter, SQLiteReplayFilter
+from sessions import SessionManager, SQLiteSessionStore, SESSION_INVALID, SESSION_SIGNATURE_REQUIRED
+from replication import PeerReplicator, TOKEN_HEADER
+from transactions import Transaction
 import os
 import sys
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from config import SERVER_HOST, SERVER_PORT, DIFFICULTY
+from config import (SERVER_HOST, SERVER_PORT, SERVER_DEBUG, SERVER_MODE, SERVER_WORKERS, CHAIN_POLL_INTERVAL, DIFFICULTY,
+                    PEERS, PEER_TOKEN, PEER_SYNC_INTERVAL, PEER_BATCH_BLOCKS, PEER_TIMEOUT, MINING_WORKERS, DATABASE_URL, RESIDENT_BLOCKS,
+                    CHAIN_PAGE_SIZE, MAX_CHAIN_PAGE_SIZE, KEY_CACHE_SIZE,
+                    VERIFY_WORKERS, MAX_BATCH_SIZE, INGESTION_QUEUE_SIZE, INGESTION_WORKERS,
+                    MAX_REGISTER_BATCH, REGISTRY_PATH, REGISTRY_COMPACT_AFTER,
+                    REPLAY_WINDOW, REPLAY_CAPACITY, REPLAY_ERROR_RATE,
+                    BROADCAST_TICK, BROADCAST_DEVICE_BACKLOG, BROADCAST_MAX_DEVICES,
+                    VALIDATION_WORKERS, READINGS_PAGE_SIZE, MAX_READINGS_PAGE_SIZE,
+                    ROLLUP_RETENTION, ROLLUP_MAX_FIELDS, ROLLUP_MAX_SERIES, SESSION_TTL, SESSION_SIGNATURE_INTERVAL,
+                    CHALLENGE_TTL, MAX_CHALLENGES, CHALLENGE_SHARDS, CHALLENGE_STORE_URL,
+                    BLOCK_SIZE, MAX_TRANSACTIONS_PER_BLOCK, BLOCK_MAX_LATENCY, BLOCK_MIN_INTERVAL,
+                    METRICS_ENABLED, PROFILER_ENABLED,
+                    ARCHIVE_DIR, ARCHIVE_KEEP_BLOCKS, ARCHIVE_SEGMENT_BLOCKS, COMPACTION_INTERVAL)
+
+metrics.enabled = METRICS_ENABLED
 
 app = Flask(__name__)
 socketio = SocketIO(app, cors_allowed_origins="*")  # Allow all origins for testing
-blockchain = Blockchain(difficulty=DIFFICULTY)
-authenticator = DeviceAuthenticator()
+blockchain = Blockchain(
+    difficulty=DIFFICULTY,
+    mining_workers=MINING_WORKERS,
+    store=BlockStore(DATABASE_URL),
+    resident_blocks=RESIDENT_BLOCKS,
+    validation_workers=VALIDATION_WORKERS,
+    archive_dir=ARCHIVE_DIR,
+    segment_blocks=ARCHIVE_SEGMENT_BLOCKS
+)
+# Registrations stay in memory until open_device_registry() or use_shared_state() picks a store
+authenticator = DeviceAuthenticator(
+    key_cache_size=KEY_CACHE_SIZE,
+    verify_workers=VERIFY_WORKERS
+)
+
+# Outstanding challenges; each expires after CHALLENGE_TTL and can be answered once
+active_challenges = open_challenge_store(
+    CHALLENGE_STORE_URL,
+    ttl=CHALLENGE_TTL,
+    max_entries=MAX_CHALLENGES,
+    shards=CHALLENGE_SHARDS
+)
+
+# Session keys issued by /api/verify; submissions in a session are checked with HMAC
+sessions = SessionManager(ttl=SESSION_TTL, signature_interval=SESSION_SIGNATURE_INTERVAL)
+
+# Readings accepted within the last REPLAY_WINDOW seconds; repeats are rejected before verification
+replay_filter = ReplayFilter(REPLAY_WINDOW, REPLAY_CAPACITY, REPLAY_ERROR_RATE) if REPLAY_WINDOW else None
+
+# Set in queued mode; /api/submit-data then only validates and enqueues
+ingestion_queue = None
+
+# Set when peers are configured; exchanges blocks, transactions and devices with them
+replicator = None
+
+# Readings reach dashboards in coalesced 'new_data_batch' frames
+broadcaster = Broadcaster(
+    socketio,
+    tick=BROADCAST_TICK,
+    device_backlog=BROADCAST_DEVICE_BACKLOG,
+    max_devices_per_frame=BROADCAST_MAX_DEVICES
+)
 
-# Store active challenges
-active_challenges = {}
+# Per-device and fleet-wide min/max/mean/count of every numeric reading field
+rollups = RollupEngine(ROLLUP_RETENTION, ROLLUP_MAX_FIELDS, ROLLUP_MAX_SERIES)
 
-print("Server starting up - Device registration state cleared")
+def reading_accepted(device_id: str, sensor_data: dict) -> None:
+    """Called once for every reading that passed verification"""
+    rollups.record(device_id, sensor_data)
+    broadcaster.publish(device_id, sensor_data)
+
+@socketio.on('connect')
+def handle_connect():
+    # Every dashboard follows the fleet-wide feed until it unsubscribes
+    join_room(AGGREGATE_ROOM)
+    broadcaster.subscribe(request.sid, AGGREGATE_ROOM)
+
+@socketio.on('subscribe')
+def handle_subscribe(data):
+    room = device_room(data['device_id']) if data and data.get('device_id') else AGGREGATE_ROOM
+    join_room(room)
+    broadcaster.subscribe(request.sid, room)
+
+@socketio.on('unsubscribe')
+def handle_unsubscribe(data):
+    room = device_room(data['device_id']) if data and data.get('device_id') else AGGREGATE_ROOM
+    leave_room(room)
+    broadcaster.unsubscribe(request.sid, room)
+
+@socketio.on('disconnect')
+def handle_disconnect():
+    broadcaster.disconnect(request.sid)
 
 @app.route('/')
 def index():
@@ -27,22 +125,73 @@ def index():
 
 @app.route('/api/register', methods=['POST'])
 def register_device():
-    data = request.get_json()
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Invalid data format'}), 400
     device_id = data.get('device_id')
     public_key = data.get('public_key')
     
     if not device_id or not public_key:
         return jsonify({'error': 'Missing device_id or public_key'}), 400
+    if not valid_device_id(device_id) or not isinstance(public_key, str):
+        return jsonify({'error': 'Invalid device format'}), 400
         
     try:
         public_key_bytes = bytes.fromhex(public_key)
         if authenticator.register_device(device_id, public_key_bytes):
+            if replicator is not None:
+                replicator.register_device(device_id, public_key_bytes)
             return jsonify({'status': 'success', 'message': 'Device registered successfully'})
         else:
             return jsonify({'error': 'Device already registered'}), 400
     except ValueError:
         return jsonify({'error': 'Invalid public key format'}), 400
 
+@app.route('/api/register-batch', methods=['POST'])
+def register_batch():
+    data = request.get_json(silent=True)
+    devices = data.get('devices') if isinstance(data, dict) else None
+
+    if not isinstance(devices, list) or not devices:
+        return jsonify({'error': 'Missing devices'}), 400
+    if len(devices) > MAX_REGISTER_BATCH:
+        return jsonify({'error': f'Batch exceeds {MAX_REGISTER_BATCH} devices'}), 413
+
+    results = [None] * len(devices)
+    candidates = []
+    for i, device in enumerate(devices):
+        try:
+            device_id = device['device_id']
+            public_key_bytes = bytes.fromhex(device['public_key'])
+        except (KeyError, TypeError, ValueError):
+            results[i] = {'status': 'error', 'error': 'Invalid device format'}
+            continue
+        if not valid_device_id(device_id):
+            results[i] = {'status': 'error', 'error': 'Invalid device format'}
+            continue
+        candidates.append((i, device_id, public_key_bytes))
+
+    registered = []
+    added = authenticator.register_devices([(device_id, key) for _, device_id, key in candidates])
+    for (i, device_id, public_key_bytes), was_added in zip(candidates, added):
+        if was_added:
+            registered.append((device_id, public_key_bytes))
+            results[i] = {'status': 'success'}
+        elif was_added is None:
+            results[i] = {'status': 'error', 'error': 'Invalid public key format'}
+        else:
+            results[i] = {'status': 'error', 'error': 'Device already registered'}
+
+    if registered and replicator is not None:
+        replicator.register_devices(registered)
+
+    return jsonify({
+        'status': 'success',
+        'registered': len(registered),
+        'rejected': len(devices) - len(registered),
+        'results': results
+    })
+
 @app.route('/api/authenticate', methods=['POST'])
 def authenticate():
     data = request.get_json()
@@ -55,7 +204,7 @@ def authenticate():
         return jsonify({'error': 'Device not registered'}), 401
         
     challenge = AuthenticationMessage.create_challenge()
-    active_challenges[device_id] = challenge
+    active_challenges.put(device_id, challenge)
     
     return jsonify({
         'status': 'success',
@@ -71,7 +220,7 @@ def verify_authentication():
     if not device_id or not signature:
         return jsonify({'error': 'Missing required fields'}), 400
         
-    challenge = active_challenges.get(device_id)
+    challenge = active_challenges.take(device_id)
     if not challenge:
         return jsonify({'error': 'No active challenge found'}), 400
         
@@ -80,61 +229,573 @@ def verify_authentication():
         if AuthenticationMessage.verify_challenge_response(
             authenticator, device_id, challenge, signature_bytes
         ):
-            del active_challenges[device_id]
-            return jsonify({'status': 'success', 'message': 'Authentication successful'})
+            session = sessions.establish(device_id, authenticator.get_public_key(device_id))
+            return jsonify({'status': 'success', 'message': 'Authentication successful', **session})
         else:
             return jsonify({'error': 'Invalid signature'}), 401
     except ValueError:
         return jsonify({'error': 'Invalid signature format'}), 400
 
-@app.route('/api/submit-data', methods=['POST'])
-def submit_data():
+def session_hints(session_id) -> dict:
+    """Tell a session client whether to sign its next submission"""
+    if session_id is None:
+        return {}
+    return {'signature_required_next': sessions.signature_due_next(session_id)}
+
+def duplicate_submission():
+    """Response for a reading that was already accepted; clients should not retry it"""
+    return jsonify({'error': 'Duplicate submission', 'duplicate': True}), 409
+
+@app.route('/api/session/revoke', methods=['POST'])
+def revoke_session():
     data = request.get_json()
     device_id = data.get('device_id')
-    sensor_data = data.get('data')
-    signature = data.get('signature')
-    
-    if not all([device_id, sensor_data, signature]):
+    session_id = data.get('session_id')
+    mac = data.get('mac')
+
+    if not device_id or not session_id or not mac:
         return jsonify({'error': 'Missing required fields'}), 400
-        
+
     try:
-        signature_bytes = bytes.fromhex(signature)
-        message = json.dumps(sensor_data, sort_keys=True)
-        
-        if authenticator.verify_signature(device_id, message, signature_bytes):
-            blockchain.add_transaction(device_id, "network", sensor_data)
-            socketio.emit('new_data', {
-                'device_id': device_id,
-                'data': sensor_data,
-                'timestamp': time.time()
-            })
-            return jsonify({'status': 'success', 'message': 'Data submitted successfully'})
-        else:
-            return jsonify({'error': 'Invalid signature'}), 401
+        mac_bytes = bytes.fromhex(mac)
     except ValueError:
         return jsonify({'error': 'Invalid data format'}), 400
+    if not sessions.revoke(session_id, device_id, mac_bytes):
+        return jsonify({'error': 'Invalid or expired session'}), 401
+    return jsonify({'status': 'success', 'message': 'Session revoked'})
+
+@app.route('/api/submit-data', methods=['POST'])
+def submit_data():
+    if request.mimetype == MSGPACK_CONTENT_TYPE:
+        # Binary submission: the signature covers the payload bytes as sent
+        if msgpack is None:
+            return jsonify({'error': 'Binary submissions not supported'}), 415
+        try:
+            submission = decode_msgpack_submission(request.get_data())
+        except ValueError:
+            return jsonify({'error': 'Invalid data format'}), 400
+    else:
+        try:
+            submission = decode_json_submission(request.get_json())
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+    device_id = submission['device_id']
+    sensor_data = submission['data']
+    message = submission['message']
+    signature_bytes = submission['signature']
+    session_id = submission['session_id']
+
+    replay_key = ReplayFilter.key(device_id, sensor_data, message) if replay_filter is not None else None
+    if replay_key is not None and replay_filter.seen(replay_key):
+        return duplicate_submission()
+
+    # A valid session MAC stands in for the ECDSA signature, except on the
+    # sampled submissions where the session also demands one
+    authenticated = False
+    if session_id is not None:
+        status = sessions.authenticate(session_id, device_id, message, submission['mac'])
+        if status == SESSION_INVALID:
+            return jsonify({'error': 'Invalid or expired session'}), 401
+        if status == SESSION_SIGNATURE_REQUIRED:
+            if signature_bytes is None:
+                return jsonify({'error': 'Signature required', 'signature_required': True}), 401
+            if not authenticator.verify_signature(device_id, message, signature_bytes):
+                return jsonify({'error': 'Invalid signature'}), 401
+            sessions.signature_verified(session_id)
+        authenticated = True
+
+    if ingestion_queue is not None:
+        # Queued mode: verification and ledger writes happen on the workers
+        if not ingestion_queue.submit(device_id, sensor_data, message, None if authenticated else signature_bytes,
+                                      replay_key):
+            response = jsonify({'error': 'Server busy, retry later'})
+            response.headers['Retry-After'] = '1'
+            return response, 429
+        return jsonify({'status': 'accepted', 'message': 'Data queued for processing',
+                        **session_hints(session_id)}), 202
+
+    if authenticated or authenticator.verify_signature(device_id, message, signature_bytes):
+        if replay_key is not None and not replay_filter.add(replay_key):
+            return duplicate_submission()
+        blockchain.add_transaction(device_id, "network", sensor_data)
+        reading_accepted(device_id, sensor_data)
+        return jsonify({'status': 'success', 'message': 'Data submitted successfully',
+                        **session_hints(session_id)})
+    else:
+        return jsonify({'error': 'Invalid signature'}), 401
+
+@app.route('/api/submit-batch', methods=['POST'])
+def submit_batch():
+    data = request.get_json()
+    readings = data.get('readings') if isinstance(data, dict) else None
+
+    if not isinstance(readings, list) or not readings:
+        return jsonify({'error': 'Missing readings'}), 400
+    if len(readings) > MAX_BATCH_SIZE:
+        return jsonify({'error': f'Batch exceeds {MAX_BATCH_SIZE} readings'}), 413
+
+    results = [None] * len(readings)
+    candidates = []
+    for i, reading in enumerate(readings):
+        if not isinstance(reading, dict):
+            results[i] = {'status': 'error', 'error': 'Invalid data format'}
+            continue
+        device_id = reading.get('device_id')
+        sensor_data = reading.get('data')
+        signature = reading.get('signature')
+        if not all([device_id, sensor_data, signature]):
+            results[i] = {'status': 'error', 'error': 'Missing required fields'}
+            continue
+        if not isinstance(device_id, str) or not isinstance(sensor_data, dict):
+            results[i] = {'status': 'error', 'error': 'Invalid data format'}
+            continue
+        try:
+            signature_bytes = bytes.fromhex(signature)
+            message = json.dumps(sensor_data, sort_keys=True)
+        except (TypeError, ValueError):
+            results[i] = {'status': 'error', 'error': 'Invalid data format'}
+            continue
+        replay_key = ReplayFilter.key(device_id, sensor_data, message) if replay_filter is not None else None
+        if replay_key is not None and replay_filter.seen(replay_key):
+            results[i] = {'status': 'duplicate'}
+            continue
+        candidates.append((i, device_id, sensor_data, message, signature_bytes, replay_key))
+
+    verified = authenticator.verify_batch(
+        [(device_id, message, signature) for _, device_id, _, message, signature, _ in candidates]
+    )
+
+    accepted = []
+    for (i, device_id, sensor_data, _, _, replay_key), ok in zip(candidates, verified):
+        if not ok:
+            results[i] = {'status': 'error', 'error': 'Invalid signature'}
+        elif replay_key is not None and not replay_filter.add(replay_key):
+            results[i] = {'status': 'duplicate'}
+        else:
+            accepted.append((device_id, "network", sensor_data))
+            results[i] = {'status': 'success'}
+
+    if accepted:
+        blockchain.add_transactions(accepted)
+        for device_id, _, sensor_data in accepted:
+            reading_accepted(device_id, sensor_data)
+
+    return jsonify({
+        'status': 'success',
+        'accepted': len(accepted),
+        'rejected': len(readings) - len(accepted),
+        'duplicates': sum(1 for result in results if result['status'] == 'duplicate'),
+        'results': results
+    })
 
 @app.route('/api/chain')
 def get_chain():
+    length = len(blockchain.chain)
+    # Length plus tip hash identify the chain, including after a reorg replaces its tail
+    etag = f"{length}-{blockchain.get_latest_block().hash}"
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+
+    from_index = max(0, request.args.get('from_index', 0, type=int))
+    limit = min(max(1, request.args.get('limit', CHAIN_PAGE_SIZE, type=int)), MAX_CHAIN_PAGE_SIZE)
+    next_index = min(length, from_index + limit)
+    # Blocks are spliced in as pre-encoded JSON rather than built as dicts and re-serialized
+    page = json.dumps({
+        'length': length,
+        'from_index': from_index,
+        'next_from_index': next_index if next_index < length else None
+    })
+    body = page[:-1].encode() + b', "chain": ' + blockchain.get_chain_json(from_index, limit) + b'}'
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    return response
+
+@app.route('/api/devices/<device_id>/readings')
+def get_device_readings(device_id):
+    # since/until are Unix timestamps; cursor is the next_cursor of the previous page
+    since = request.args.get('since', type=float)
+    until = request.args.get('until', type=float)
+    limit = min(max(1, request.args.get('limit', READINGS_PAGE_SIZE, type=int)), MAX_READINGS_PAGE_SIZE)
+    cursor = request.args.get('cursor')
+    try:
+        after = parse_cursor(cursor) if cursor else None
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+
+    readings, next_key = blockchain.get_readings(device_id, since, until, after, limit)
     return jsonify({
-        'chain': blockchain.get_chain_data(),
-        'length': len(blockchain.chain)
+        'device_id': device_id,
+        'readings': readings,
+        'next_cursor': format_cursor(next_key) if next_key is not None else None
     })
 
-def block_mining_thread():
-    while True:
-        blockchain.create_block()
+@app.route('/api/metrics')
+def get_metrics():
+    # Without ?device= the fleet-wide aggregates are returned
+    device_id = request.args.get('device')
+    field = request.args.get('field')
+    resolution = request.args.get('resolution', '1m')
+    since = request.args.get('since', type=float)
+    until = request.args.get('until', type=float)
+
+    try:
+        series = rollups.query(device_id, field, resolution, since, until)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({
+        'scope': device_id or 'fleet',
+        'resolution': resolution,
+        'fields': series,
+        'dropped_fields': rollups.dropped_fields(device_id)
+    })
+
+@app.route('/api/chain/validate')
+def validate_chain():
+    # ?full=1 re-checks every block instead of only those added since the last check
+    full = request.args.get('full', '0').lower() in ('1', 'true', 'yes')
+    report = blockchain.validate_chain(full=full)
+    return jsonify(report), 200 if report['valid'] else 409
+
+@app.route('/api/peer/status')
+def peer_status():
+    status = {
+        'length': len(blockchain.chain),
+        'tip': blockchain.get_latest_block().hash,
+        'work': blockchain.cumulative_work(),
+        'difficulty': blockchain.difficulty,
+        'genesis': blockchain.chain[0].hash
+    }
+    if replicator is not None:
+        status['replication'] = replicator.stats()
+    return jsonify(status)
+
+@app.route('/api/peer/headers')
+def peer_headers():
+    from_index = max(0, request.args.get('from_index', 0, type=int))
+    limit = min(max(1, request.args.get('limit', MAX_CHAIN_PAGE_SIZE, type=int)), MAX_CHAIN_PAGE_SIZE)
+    return jsonify({
+        'from_index': from_index,
+        'hashes': [block.hash for block in blockchain.chain[from_index:from_index + limit]]
+    })
+
+def refuse_peer_request():
+    """Error response for a peer push this node must not accept, or None"""
+    if replicator is None:
+        return jsonify({'error': 'Replication is not enabled'}), 404
+    if not hmac.compare_digest(request.headers.get(TOKEN_HEADER, ''), replicator.token):
+        return jsonify({'error': 'Invalid peer token'}), 403
+    return None
+
+@app.route('/api/peer/transactions', methods=['POST'])
+def receive_peer_transactions():
+    refused = refuse_peer_request()
+    if refused is not None:
+        return refused
+    data = request.get_json(silent=True) or {}
+    try:
+        transactions = [Transaction.from_dict(tx) for tx in data.get('transactions', [])]
+    except (KeyError, TypeError):
+        return jsonify({'error': 'Invalid transactions'}), 400
+    added = blockchain.add_replicated_transactions(transactions)
+    for tx in added:
+        reading_accepted(tx.sender, tx.data)
+    return jsonify({'accepted': len(added)})
+
+@app.route('/api/peer/devices', methods=['POST'])
+def receive_peer_devices():
+    refused = refuse_peer_request()
+    if refused is not None:
+        return refused
+    devices = []
+    for device in (request.get_json(silent=True) or {}).get('devices', []):
+        try:
+            device_id = device['device_id']
+            public_key_bytes = bytes.fromhex(device['public_key'])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if valid_device_id(device_id):
+            devices.append((device_id, public_key_bytes))
+    return jsonify({'registered': authenticator.register_devices(devices).count(True)})
+
+@app.route('/api/peer/announce', methods=['POST'])
+def receive_peer_announce():
+    refused = refuse_peer_request()
+    if refused is not None:
+        return refused
+    replicator.wake()
+    return jsonify({'status': 'ok'})
+
+@app.route('/api/chain/checkpoint')
+def get_checkpoint():
+    if blockchain.checkpoint is None:
+        return jsonify({'error': 'No checkpoint yet'}), 404
+    return jsonify({**blockchain.checkpoint, 'public_key': blockchain.archive.public_key_hex()})
+
+@app.route('/metrics')
+def prometheus_metrics():
+    return app.response_class(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/debug/profile')
+def profile():
+    # Samples every thread for ?seconds= and returns collapsed stacks for flamegraph.pl or speedscope
+    if not PROFILER_ENABLED:
+        return jsonify({'error': 'Profiler disabled'}), 404
+    seconds = min(max(0.1, request.args.get('seconds', 10, type=float)), 300)
+    profiler = SamplingProfiler(interval=request.args.get('interval', 0.005, type=float))
+    profiler.start()
+    time.sleep(seconds)
+    profiler.stop()
+    return app.response_class(profiler.collapsed(), mimetype='text/plain')
+
+@app.route('/api/scheduler')
+def get_scheduler_stats():
+    # Block sealing decisions: pool size, arrival rate, why and how big recent blocks were.
+    # With --workers the sealing counters live in the mining process; workers report the pool.
+    return jsonify(scheduler.stats())
+
+@app.route('/api/replay')
+def get_replay_stats():
+    # Keys remembered to reject retries and replays; with --workers they are shared through DATABASE_URL
+    if replay_filter is None:
+        return jsonify({'error': 'Replay filter disabled'}), 404
+    return jsonify(replay_filter.stats())
+
+@app.route('/api/proof/<int:block_index>/<int:tx_index>')
+def get_inclusion_proof(block_index, tx_index):
+    if not 0 <= block_index < len(blockchain.chain):
+        return jsonify({'error': 'Block not found'}), 404
+    block = blockchain.chain[block_index]
+    transactions = block.transactions
+    if not 0 <= tx_index < len(transactions):
+        return jsonify({'error': 'Transaction not found'}), 404
+
+    return jsonify({
+        'block_index': block_index,
+        'tx_index': tx_index,
+        'transaction': dict(transactions[tx_index]),
+        'proof': block.get_merkle_tree().proof(tx_index),
+        'merkle_root': block.merkle_root,
+        'block_hash': block.hash
+    })
+
+def emit_block(new_block) -> None:
+    with EMIT_SECONDS.time():
         socketio.emit('new_block', {
-            'chain': blockchain.get_chain_data(),
-            'length': len(blockchain.chain)
+            'block': new_block.to_dict(),
+            'length': new_block.index + 1
         })
-        time.sleep(10)  # Create a new block every 10 seconds if there are transactions
+
+def block_sealed(new_block) -> None:
+    emit_block(new_block)
+    if replicator is not None:
+        replicator.announce(new_block)
+
+# Seals a block once BLOCK_SIZE transactions are pending or the oldest has
+# waited BLOCK_MAX_LATENCY seconds; only the mining process runs it
+scheduler = BlockScheduler(
+    blockchain,
+    block_size=BLOCK_SIZE,
+    max_transactions=MAX_TRANSACTIONS_PER_BLOCK,
+    max_latency=BLOCK_MAX_LATENCY,
+    min_interval=BLOCK_MIN_INTERVAL,
+    on_block=block_sealed
+)
+blockchain.on_pending = scheduler.notify
+
+# Computed when /metrics is scraped
+metrics.gauge("iot_pending_transactions", "Transactions waiting to be mined",
+              lambda: blockchain.pending_stats()[0])
+metrics.gauge("iot_chain_length", "Blocks in the chain", lambda: len(blockchain.chain))
+metrics.gauge("iot_ingestion_queue_depth", "Submissions queued for the ingestion workers",
+              lambda: ingestion_queue.queue.qsize() if ingestion_queue is not None else 0)
+metrics.gauge("iot_mining_hash_rate", "Average proof-of-work hashes per second while mining",
+              lambda: MINING_HASHES.value / (MINING_SECONDS.sum or 1))
+metrics.gauge("iot_archived_blocks", "Blocks compacted into archive segments",
+              lambda: blockchain.archive.next_index if blockchain.archive is not None else 0)
+
+def chain_follower_thread():
+    """In an API worker: pick up blocks stored by the miner process and announce them"""
+    while True:
+        for new_block in blockchain.refresh():
+            emit_block(new_block)
+        time.sleep(CHAIN_POLL_INTERVAL)
+
+def compaction_thread():
+    """In the mining process: archive old blocks every COMPACTION_INTERVAL seconds"""
+    while True:
+        time.sleep(COMPACTION_INTERVAL)
+        try:
+            report = blockchain.compact(keep_recent=ARCHIVE_KEEP_BLOCKS)
+        except OSError as e:
+            print(f"Compaction failed: {e}")
+            continue
+        if report['archived_blocks']:
+            print(f"Archived {report['archived_blocks']} blocks up to #{report['archived_upto']} "
+                  f"in {report['elapsed']:.2f}s")
+
+def start_replication(peers, token: str, sync: bool = True) -> None:
+    global replicator
+    replicator = PeerReplicator(
+        blockchain, peers, token,
+        sync_interval=PEER_SYNC_INTERVAL,
+        batch_blocks=PEER_BATCH_BLOCKS,
+        timeout=PEER_TIMEOUT,
+        on_block=emit_block
+    )
+    blockchain.on_transactions = replicator.submit
+    replicator.start(sync=sync)
+
+def start_ingestion_queue() -> None:
+    global ingestion_queue
+    ingestion_queue = IngestionQueue(
+        authenticator, blockchain,
+        on_accept=reading_accepted,
+        maxsize=INGESTION_QUEUE_SIZE,
+        workers=INGESTION_WORKERS,
+        replay_filter=replay_filter
+    )
+    ingestion_queue.start()
+
+def open_device_registry() -> None:
+    """Keep registrations of a single-process server in REGISTRY_PATH.
+
+    Devices registered while the node last ran as a cluster are moved over
+    from DATABASE_URL first. Only one process may open the file, so cluster
+    processes never call this.
+    """
+    if not REGISTRY_PATH:
+        print("Server starting up - Device registration state cleared")
+        return
+    registry = FileDeviceRegistry(REGISTRY_PATH, compact_after=REGISTRY_COMPACT_AFTER)
+    moved = move_devices(SQLiteDeviceRegistry(DATABASE_URL), registry)
+    authenticator.registered_devices = registry
+    print(f"Server starting up - {len(registry)} registered devices loaded from {REGISTRY_PATH}"
+          + (f" ({moved} moved from {DATABASE_URL})" if moved else ""))
+
+def use_shared_state() -> None:
+    """Move devices, challenges, sessions, replay keys and pending readings into DATABASE_URL.
+
+    Every process of a multi-worker deployment calls this, so they all see
+    the same registrations and transaction pool, and a retry is rejected
+    whichever worker it reaches.
+    """
+    global active_challenges, replay_filter
+    blockchain.shared_pending = True
+    if replay_filter is not None:
+        replay_filter = SQLiteReplayFilter(DATABASE_URL, REPLAY_WINDOW)
+    authenticator.registered_devices = SQLiteDeviceRegistry(DATABASE_URL)
+    sessions.store = SQLiteSessionStore(DATABASE_URL)
+    active_challenges = open_challenge_store(
+        DATABASE_URL if CHALLENGE_STORE_URL == "memory" else CHALLENGE_STORE_URL,
+        ttl=CHALLENGE_TTL,
+        max_entries=MAX_CHALLENGES,
+        shards=CHALLENGE_SHARDS
+    )
+
+def serve_worker(host: str, port: int, mode: str, peers, peer_token) -> None:
+    """Entry point of one API worker process"""
+    use_shared_state()
+    if peers:
+        # Workers only push what they accept; the mining process syncs blocks
+        start_replication(peers, peer_token, sync=False)
+    if mode == 'queued':
+        start_ingestion_queue()
+    broadcaster.start()
+    threading.Thread(target=chain_follower_thread, daemon=True).start()
+
+    # Every worker binds the same port; the kernel spreads connections between them
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(128)
+    make_server(host, port, app, threaded=True, fd=sock.fileno()).serve_forever()
+
+def run_cluster(host: str, port: int, mode: str, workers: int, peers, peer_token) -> None:
+    """Serve the API from several worker processes while this process mines.
+
+    Needs SO_REUSEPORT (Linux, BSD). Live dashboard events only cover
+    readings accepted by the worker a dashboard is connected to, and
+    Socket.IO long-polling needs sticky connections; websocket clients are
+    unaffected. With peers, workers push the readings and devices they
+    accept, and this process syncs blocks; block announcements that reach a
+    worker are left to the next PEER_SYNC_INTERVAL poll.
+    """
+    use_shared_state()
+    if REGISTRY_PATH and (os.path.exists(REGISTRY_PATH) or os.path.exists(f"{REGISTRY_PATH}.log")):
+        # Take over devices registered while the node ran as a single process
+        moved = move_devices(FileDeviceRegistry(REGISTRY_PATH, compact_after=REGISTRY_COMPACT_AFTER),
+                             authenticator.registered_devices)
+        print(f"Moved {moved} registered devices from {REGISTRY_PATH} to {DATABASE_URL}")
+    if peers:
+        start_replication(peers, peer_token)
+    context = multiprocessing.get_context('spawn')
+    processes = [
+        context.Process(target=serve_worker, args=(host, port, mode, peers, peer_token),
+                        name=f"api-worker-{i}", daemon=True)
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    print(f"Serving on {host}:{port} with {workers} API workers; this process mines")
+    # Take the workers down with this process on SIGTERM as well as Ctrl+C
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit())
+    if blockchain.archive is not None:
+        threading.Thread(target=compaction_thread, daemon=True).start()
+    try:
+        scheduler.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            process.terminate()
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="IoT Security Framework server")
+    parser.add_argument('--mode', choices=['development', 'queued'], default=SERVER_MODE,
+                        help="queued hands submissions to background workers and disables debug; "
+                             "both modes serve from the Werkzeug server, so put a reverse proxy in front")
+    parser.add_argument('--workers', type=int, default=SERVER_WORKERS,
+                        help="serve the API from this many processes while this one only mines")
+    parser.add_argument('--host', default=SERVER_HOST)
+    parser.add_argument('--port', type=int, default=SERVER_PORT)
+    parser.add_argument('--peer', action='append', dest='peers',
+                        help="base URL of another node to replicate with (repeatable; overrides PEERS)")
+    parser.add_argument('--peer-token', default=PEER_TOKEN,
+                        help="shared secret of the peer endpoints (overrides PEER_TOKEN)")
+    args = parser.parse_args()
+    peers = args.peers if args.peers is not None else PEERS
+    if peers and not args.peer_token:
+        # Peer pushes skip signature checks, so they must never be open to anyone
+        parser.error("replicating with peers needs PEER_TOKEN or --peer-token")
+
+    if args.workers > 0:
+        run_cluster(args.host, args.port, args.mode, args.workers, peers, args.peer_token)
+        sys.exit()
+
+    open_device_registry()
+
+    if peers:
+        start_replication(peers, args.peer_token)
+
+    if args.mode == 'queued':
+        start_ingestion_queue()
+
+    broadcaster.start()
+
     # Start the block mining thread
-    mining_thread = threading.Thread(target=block_mining_thread)
+    mining_thread = threading.Thread(target=scheduler.run)
     mining_thread.daemon = True
     mining_thread.start()
+    if blockchain.archive is not None:
+        threading.Thread(target=compaction_thread, daemon=True).start()
     
     # Start the Flask application
-    socketio.run(app, host=SERVER_HOST, port=SERVER_PORT, debug=True) 
\ No newline at end of file
+    if args.mode == 'queued':
+        # Still the Werkzeug development server, only without the debugger and reloader
+        socketio.run(app, host=args.host, port=args.port, debug=False, allow_unsafe_werkzeug=True)
+    else:
+        socketio.run(app, host=args.host, port=args.port, debug=SERVER_DEBUG) 
\ No newline at end of file
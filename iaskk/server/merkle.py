@@ -0,0 +1,76 @@
+import hashlib
+from typing import Dict, List
+
+from transactions import canonical_json
+
+EMPTY_ROOT = hashlib.sha256("empty".encode()).hexdigest()
+DIGEST_SIZE = 32
+
+def leaf_digest(transaction: Dict) -> bytes:
+    return hashlib.sha256(canonical_json(transaction)).digest()
+
+def parent_digest(left: bytes, right: bytes) -> bytes:
+    # Parents hash the concatenated hex of their children, as the original
+    # string-based tree did, so roots of existing blocks are unchanged
+    return hashlib.sha256((left.hex() + right.hex()).encode()).digest()
+
+class MerkleTree:
+    """Merkle tree kept as one packed bytes object of raw 32-byte digests per level.
+
+    levels[0] holds the leaves and levels[-1] the root. An odd node at the end
+    of a level is paired with itself, matching Block._calculate_merkle_root.
+    """
+
+    def __init__(self, leaves: List[bytes]):
+        self.levels: List[bytes] = []
+        level = leaves
+        while level:
+            self.levels.append(b"".join(level))
+            if len(level) == 1:
+                break
+            if len(level) % 2 == 1:
+                level = level + [level[-1]]
+            level = [parent_digest(level[i], level[i + 1]) for i in range(0, len(level), 2)]
+
+    @classmethod
+    def from_transactions(cls, transactions: List[Dict]) -> "MerkleTree":
+        return cls([leaf_digest(tx) for tx in transactions])
+
+    def __len__(self) -> int:
+        return len(self.levels[0]) // DIGEST_SIZE if self.levels else 0
+
+    def node(self, level: int, index: int) -> bytes:
+        offset = index * DIGEST_SIZE
+        return self.levels[level][offset:offset + DIGEST_SIZE]
+
+    @property
+    def root(self) -> str:
+        return self.levels[-1].hex() if self.levels else EMPTY_ROOT
+
+    def proof(self, index: int) -> List[Dict[str, str]]:
+        """Sibling hashes from leaf to root; position says which side the sibling is on"""
+        if not 0 <= index < len(self):
+            raise IndexError(f"Leaf {index} out of range")
+        path = []
+        for level in range(len(self.levels) - 1):
+            count = len(self.levels[level]) // DIGEST_SIZE
+            sibling = index ^ 1
+            if sibling >= count:
+                sibling = index
+            path.append({
+                "hash": self.node(level, sibling).hex(),
+                "position": "left" if sibling < index else "right"
+            })
+            index //= 2
+        return path
+
+def verify_proof(transaction: Dict, proof: List[Dict[str, str]], merkle_root: str) -> bool:
+    """Check that a transaction is included under merkle_root"""
+    digest = leaf_digest(transaction)
+    for step in proof:
+        sibling = bytes.fromhex(step["hash"])
+        if step["position"] == "left":
+            digest = parent_digest(sibling, digest)
+        else:
+            digest = parent_digest(digest, sibling)
+    return digest.hex() == merkle_root
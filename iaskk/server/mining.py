@@ -0,0 +1,103 @@
+import hashlib
+import json
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+
+from transactions import transactions_json
+
+def serialize_for_hashing(index: int, transactions, timestamp: float,
+                          previous_hash: str, merkle_root: str) -> Tuple[bytes, bytes]:
+    """Split the canonical block encoding into the bytes before and after the nonce.
+
+    Block.calculate_hash dumps the header with sort_keys=True, which orders the
+    fields as index, merkle_root, nonce, previous_hash, timestamp, transactions.
+    Joining prefix + str(nonce) + suffix therefore reproduces it byte for byte.
+    The transactions are spliced in from their cached canonical encodings.
+    """
+    head = json.dumps({"index": index, "merkle_root": merkle_root}, sort_keys=True)
+    prefix = (head[:-1] + ', "nonce": ').encode()
+    suffix = (
+        f', "previous_hash": {json.dumps(previous_hash)}, "timestamp": {json.dumps(timestamp)}, '
+        f'"transactions": '
+    ).encode() + transactions_json(transactions) + b"}"
+    return prefix, suffix
+
+def difficulty_target(difficulty: int) -> Optional[bytes]:
+    """Largest digest (exclusive) with `difficulty` leading hex zeros, or None if any digest qualifies"""
+    if difficulty <= 0:
+        return None
+    return (16 ** (64 - difficulty)).to_bytes(32, "big") if difficulty < 64 else bytes(32)
+
+def search_nonce_range(prefix: bytes, suffix: bytes, difficulty: int,
+                       start: int, stop: int) -> Optional[Tuple[int, str]]:
+    """Return the first (nonce, hash) in [start, stop) that meets the difficulty"""
+    target = difficulty_target(difficulty)
+    base = hashlib.sha256(prefix)
+    for nonce in range(start, stop):
+        h = base.copy()
+        h.update(str(nonce).encode())
+        h.update(suffix)
+        digest = h.digest()
+        if target is None or digest < target:
+            return nonce, digest.hex()
+    return None
+
+class MiningEngine:
+    """Proof-of-work search that serializes a block once and only hashes the changing nonce.
+
+    With workers > 1 the nonce space is split into chunks that are searched on a
+    process pool; chunks are handed out in order and the lowest winning nonce is
+    kept, so the result matches the single-process search.
+    """
+
+    def __init__(self, difficulty: int = 4, workers: int = 1, chunk_size: int = 50000):
+        self.difficulty = difficulty
+        self.workers = max(1, workers)
+        self.chunk_size = chunk_size
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def mine(self, block) -> bool:
+        """Find a nonce for the block, starting from its current nonce, and update its hash"""
+        prefix, suffix = serialize_for_hashing(
+            block.index, block.transactions, block.timestamp,
+            block.previous_hash, block.merkle_root
+        )
+        start = block.nonce
+
+        if self.workers == 1:
+            result = None
+            while result is None:
+                result = search_nonce_range(prefix, suffix, self.difficulty,
+                                            start, start + self.chunk_size)
+                start += self.chunk_size
+        else:
+            result = self._search_parallel(prefix, suffix, start)
+
+        block.nonce, block.hash = result
+        return True
+
+    def _search_parallel(self, prefix: bytes, suffix: bytes, start: int) -> Tuple[int, str]:
+        executor = self._get_executor()
+        while True:
+            futures = [
+                executor.submit(search_nonce_range, prefix, suffix, self.difficulty,
+                                start + i * self.chunk_size, start + (i + 1) * self.chunk_size)
+                for i in range(self.workers)
+            ]
+            for future in futures:
+                result = future.result()
+                if result is not None:
+                    for pending in futures:
+                        pending.cancel()
+                    return result
+            start += self.workers * self.chunk_size
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,349 @@
+import bisect
+import mmap
+import os
+import sqlite3
+import struct
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from storage import sqlite_path
+
+# Longest device id, in UTF-8 bytes, that a registry record can hold
+MAX_DEVICE_ID_BYTES = 0xFFFF
+
+def valid_device_id(device_id) -> bool:
+    """Whether device_id is a non-empty string every registry can store"""
+    if not isinstance(device_id, str) or not device_id:
+        return False
+    try:
+        return len(device_id.encode()) <= MAX_DEVICE_ID_BYTES
+    except UnicodeEncodeError:
+        return False
+
+def _check_devices(devices: Iterable[Tuple[str, bytes]]) -> List[Tuple[str, bytes]]:
+    devices = list(devices)
+    for device_id, _ in devices:
+        if not valid_device_id(device_id):
+            raise ValueError(f"Invalid device id {device_id!r}")
+    return devices
+
+def move_devices(source, destination, batch: int = 10000) -> int:
+    """Register every device of source in destination, then empty source; returns how many were added.
+
+    Used when a node switches between the single-process file registry and
+    the shared SQLite one, so devices registered in either mode stay
+    registered. Devices already in destination keep the key they have there.
+    """
+    devices = list(source.items())
+    added = 0
+    for start in range(0, len(devices), batch):
+        added += sum(destination.add_many(devices[start:start + batch]))
+    source.clear()
+    return added
+
+class DeviceRegistry(dict):
+    """In-process device_id -> raw public key registry"""
+
+    def add(self, device_id: str, public_key_bytes: bytes) -> bool:
+        """Register a device unless it already exists; returns whether it was added"""
+        return self.add_many([(device_id, public_key_bytes)])[0]
+
+    def add_many(self, devices: Iterable[Tuple[str, bytes]]) -> List[bool]:
+        """Register several devices; returns whether each was added"""
+        return [self.setdefault(device_id, public_key_bytes) is public_key_bytes
+                for device_id, public_key_bytes in _check_devices(devices)]
+
+class SQLiteDeviceRegistry:
+    """Device registry in a SQLite table, shared by every process that opens the same file.
+
+    Registrations never change once made, so keys that have been read are
+    kept in a local dict and only unknown devices reach the database.
+    """
+
+    def __init__(self, database_url: str):
+        self.conn = sqlite3.connect(sqlite_path(database_url), check_same_thread=False,
+                                    isolation_level=None, timeout=30)
+        self.lock = threading.Lock()
+        self._known: Dict[str, bytes] = {}
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS devices (device_id TEXT PRIMARY KEY, public_key BLOB NOT NULL)"
+            )
+
+    def add(self, device_id: str, public_key_bytes: bytes) -> bool:
+        if not valid_device_id(device_id):
+            raise ValueError(f"Invalid device id {device_id!r}")
+        with self.lock:
+            added = self.conn.execute(
+                "INSERT OR IGNORE INTO devices VALUES (?, ?)", (device_id, public_key_bytes)
+            ).rowcount == 1
+        if added:
+            self._known[device_id] = public_key_bytes
+        return added
+
+    def add_many(self, devices: Iterable[Tuple[str, bytes]]) -> List[bool]:
+        """Register several devices in one transaction; returns whether each was added"""
+        devices = _check_devices(devices)
+        added = []
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                for device_id, public_key_bytes in devices:
+                    added.append(self.conn.execute(
+                        "INSERT OR IGNORE INTO devices VALUES (?, ?)", (device_id, public_key_bytes)
+                    ).rowcount == 1)
+                    if added[-1]:
+                        self._known[device_id] = public_key_bytes
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        return added
+
+    def get(self, device_id: str, default: Optional[bytes] = None) -> Optional[bytes]:
+        public_key_bytes = self._known.get(device_id)
+        if public_key_bytes is not None:
+            return public_key_bytes
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT public_key FROM devices WHERE device_id = ?", (device_id,)
+            ).fetchone()
+        if row is None:
+            return default
+        self._known[device_id] = row[0]
+        return row[0]
+
+    def __getitem__(self, device_id: str) -> bytes:
+        public_key_bytes = self.get(device_id)
+        if public_key_bytes is None:
+            raise KeyError(device_id)
+        return public_key_bytes
+
+    def __contains__(self, device_id: str) -> bool:
+        return self.get(device_id) is not None
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM devices").fetchone()[0]
+
+    def items(self) -> List[Tuple[str, bytes]]:
+        """Every (device_id, public_key) pair, in device id order"""
+        with self.lock:
+            return self.conn.execute("SELECT device_id, public_key FROM devices ORDER BY device_id").fetchall()
+
+    def clear(self) -> None:
+        with self.lock:
+            self.conn.execute("DELETE FROM devices")
+            self._known = {}
+
+REGISTRY_MAGIC = b"IOTREG1\0"
+# Per device, in device id order: offset of its record
+REGISTRY_ENTRY = struct.Struct("<Q")
+# Last bytes of a snapshot: device count, magic
+REGISTRY_TRAILER = struct.Struct("<Q8s")
+# Start of every snapshot and journal record: device id length, public key length
+RECORD_HEADER = struct.Struct("<HB")
+# Every this many snapshot entries, a device id is kept in memory to narrow the binary search
+FENCE_STRIDE = 64
+
+def _pack_record(device_id: bytes, public_key_bytes: bytes) -> bytes:
+    return RECORD_HEADER.pack(len(device_id), len(public_key_bytes)) + device_id + public_key_bytes
+
+def _record_id(data, offset: int) -> bytes:
+    id_length, _ = RECORD_HEADER.unpack_from(data, offset)
+    return bytes(data[offset + RECORD_HEADER.size:offset + RECORD_HEADER.size + id_length])
+
+def _unpack_record(data, offset: int) -> Tuple[bytes, bytes, int]:
+    """The (device_id, public_key, next offset) of the record at offset"""
+    id_length, key_length = RECORD_HEADER.unpack_from(data, offset)
+    start = offset + RECORD_HEADER.size
+    return (bytes(data[start:start + id_length]), bytes(data[start + id_length:start + id_length + key_length]),
+            start + id_length + key_length)
+
+class FileDeviceRegistry:
+    """Device registry in a memory-mapped snapshot file plus an append-only <path>.log journal.
+
+    Only one process should open a given file; with read_only the files are never written.
+    """
+
+    def __init__(self, path: str, compact_after: int = 10000, read_only: bool = False):
+        self.path = path
+        self.read_only = read_only
+        self.journal_path = f"{path}.log"
+        self.compact_after = compact_after
+        self.lock = threading.Lock()
+        self._snapshot: Optional[mmap.mmap] = None
+        self._count = 0
+        self._entries_at = 0
+        self._fences: List[bytes] = []
+        self._recent: Dict[str, bytes] = {}
+        self._journal = None
+        self._open_snapshot()
+        self._replay_journal()
+        if len(self._recent) >= compact_after and not read_only:
+            self.compact()
+
+    def _open_snapshot(self) -> None:
+        try:
+            with open(self.path, "rb") as f:
+                self._snapshot = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            return
+        self._count, magic = REGISTRY_TRAILER.unpack_from(self._snapshot, len(self._snapshot) - REGISTRY_TRAILER.size)
+        if magic != REGISTRY_MAGIC or self._snapshot[:len(REGISTRY_MAGIC)] != REGISTRY_MAGIC:
+            raise ValueError(f"{self.path} is not a device registry file")
+        self._entries_at = len(self._snapshot) - REGISTRY_TRAILER.size - self._count * REGISTRY_ENTRY.size
+        self._fences = [_record_id(self._snapshot, self._offset(i)) for i in range(0, self._count, FENCE_STRIDE)]
+
+    def _offset(self, i: int) -> int:
+        return REGISTRY_ENTRY.unpack_from(self._snapshot, self._entries_at + i * REGISTRY_ENTRY.size)[0]
+
+    def _replay_journal(self) -> None:
+        try:
+            with open(self.journal_path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return
+        offset = 0
+        while offset + RECORD_HEADER.size <= len(data):
+            id_length, key_length = RECORD_HEADER.unpack_from(data, offset)
+            if offset + RECORD_HEADER.size + id_length + key_length > len(data):
+                break
+            device_id, public_key_bytes, offset = _unpack_record(data, offset)
+            self._recent[device_id.decode()] = public_key_bytes
+        if offset < len(data) and not self.read_only:
+            # A record cut short by a crash; drop it so new records follow a whole one
+            with open(self.journal_path, "r+b") as f:
+                f.truncate(offset)
+
+    def _snapshot_get(self, device_id: bytes) -> Optional[bytes]:
+        fence = bisect.bisect_right(self._fences, device_id) - 1
+        if fence < 0:
+            return None
+        low, high = fence * FENCE_STRIDE, min(self._count, (fence + 1) * FENCE_STRIDE)
+        while low < high:
+            middle = (low + high) // 2
+            offset = self._offset(middle)
+            found = _record_id(self._snapshot, offset)
+            if found == device_id:
+                return _unpack_record(self._snapshot, offset)[1]
+            if found < device_id:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def _get(self, device_id: str) -> Optional[bytes]:
+        public_key_bytes = self._recent.get(device_id)
+        if public_key_bytes is None and self._snapshot is not None:
+            public_key_bytes = self._snapshot_get(device_id.encode())
+        return public_key_bytes
+
+    def add(self, device_id: str, public_key_bytes: bytes) -> bool:
+        return self.add_many([(device_id, public_key_bytes)])[0]
+
+    def add_many(self, devices: Iterable[Tuple[str, bytes]]) -> List[bool]:
+        """Register several devices with one journal write; returns whether each was added"""
+        if self.read_only:
+            raise ValueError(f"{self.path} is open read-only")
+        devices = _check_devices(devices)
+        added = []
+        records = []
+        with self.lock:
+            for device_id, public_key_bytes in devices:
+                added.append(self._get(device_id) is None)
+                if added[-1]:
+                    self._recent[device_id] = public_key_bytes
+                    records.append(_pack_record(device_id.encode(), public_key_bytes))
+            if records:
+                if self._journal is None:
+                    self._journal = open(self.journal_path, "ab")
+                self._journal.write(b"".join(records))
+                self._journal.flush()
+                os.fsync(self._journal.fileno())
+            compact = len(self._recent) >= self.compact_after
+        if compact:
+            self.compact()
+        return added
+
+    def items(self) -> List[Tuple[str, bytes]]:
+        """Every (device_id, public_key) pair, snapshot first, then newer registrations"""
+        with self.lock:
+            return list(self._items_locked())
+
+    def compact(self) -> None:
+        """Fold the journal into a new snapshot"""
+        with self.lock:
+            records = {device_id.encode(): public_key_bytes for device_id, public_key_bytes in self._items_locked()}
+            tmp = f"{self.path}.tmp"
+            entries = []
+            with open(tmp, "wb") as f:
+                f.write(REGISTRY_MAGIC)
+                offset = len(REGISTRY_MAGIC)
+                for device_id in sorted(records):
+                    record = _pack_record(device_id, records[device_id])
+                    f.write(record)
+                    entries.append(REGISTRY_ENTRY.pack(offset))
+                    offset += len(record)
+                f.write(b"".join(entries))
+                f.write(REGISTRY_TRAILER.pack(len(entries), REGISTRY_MAGIC))
+                f.flush()
+                os.fsync(f.fileno())
+            if self._snapshot is not None:
+                self._snapshot.close()
+            os.replace(tmp, self.path)
+            self._open_snapshot()
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            open(self.journal_path, "wb").close()
+            self._recent = {}
+
+    def _items_locked(self) -> Iterator[Tuple[str, bytes]]:
+        if self._snapshot is not None:
+            offset = len(REGISTRY_MAGIC)
+            while offset < self._entries_at:
+                device_id, public_key_bytes, offset = _unpack_record(self._snapshot, offset)
+                yield device_id.decode(), public_key_bytes
+        yield from self._recent.items()
+
+    def get(self, device_id: str, default: Optional[bytes] = None) -> Optional[bytes]:
+        with self.lock:
+            public_key_bytes = self._get(device_id)
+        return default if public_key_bytes is None else public_key_bytes
+
+    def __getitem__(self, device_id: str) -> bytes:
+        public_key_bytes = self.get(device_id)
+        if public_key_bytes is None:
+            raise KeyError(device_id)
+        return public_key_bytes
+
+    def __contains__(self, device_id: str) -> bool:
+        return self.get(device_id) is not None
+
+    def __len__(self) -> int:
+        return self._count + len(self._recent)
+
+    def clear(self) -> None:
+        """Forget every device and delete the registry files"""
+        self.close()
+        with self.lock:
+            self._recent = {}
+            for path in (self.path, self.journal_path):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def close(self) -> None:
+        with self.lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            if self._snapshot is not None:
+                self._snapshot.close()
+                self._snapshot = None
+                self._count = 0
+                self._fences = []
@@ -0,0 +1,157 @@
+import hashlib
+import math
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Union
+
+from instrumentation import metrics
+from storage import sqlite_path
+
+DUPLICATES = metrics.counter("iot_duplicate_submissions_total", "Submissions rejected as retries or replays")
+
+class ReplayStore(ABC):
+    """Submissions accepted recently, checked with seen() before verification and recorded with add() after"""
+
+    @staticmethod
+    def key(device_id: str, data: Dict, message: Union[str, bytes]) -> bytes:
+        """Identify a submission by device and sequence number, or by the digest of the signed message"""
+        sequence = data.get("sequence")
+        if isinstance(sequence, int) and not isinstance(sequence, bool):
+            return f"{device_id}\0#{sequence}".encode()
+        message = message if isinstance(message, bytes) else message.encode()
+        return device_id.encode() + b"\0" + message
+
+    @abstractmethod
+    def seen(self, key: bytes) -> bool:
+        """Whether key was added recently"""
+
+    @abstractmethod
+    def add(self, key: bytes) -> bool:
+        """Record key; returns False if it was already there"""
+
+    @abstractmethod
+    def stats(self) -> Dict:
+        ...
+
+class ReplayFilter(ReplayStore):
+    """Submissions accepted in the last window seconds, kept in two rotating Bloom filters.
+
+    Call seen() before verifying a signature and add() (an atomic test-and-set) once it has verified.
+    """
+
+    def __init__(self, window: float = 600, capacity: int = 1000000, error_rate: float = 1e-6):
+        self.window = window
+        self.capacity = capacity
+        self.bits = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.bits / capacity * math.log(2)))
+        self._filters = [bytearray((self.bits + 7) // 8) for _ in range(2)]
+        self._inserted = 0
+        self._rotated_at = time.time()
+        self._lock = threading.Lock()
+
+    def _positions(self, key: bytes):
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        # Odd, so the probe sequence cannot collapse onto a few bits
+        step = int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * step) % self.bits for i in range(self.hashes)]
+
+    @staticmethod
+    def _contains(bloom: bytearray, positions) -> bool:
+        return all(bloom[position >> 3] & (1 << (position & 7)) for position in positions)
+
+    def _rotate_if_due(self) -> None:
+        if self._inserted >= self.capacity or time.time() - self._rotated_at >= self.window:
+            self._filters = [bytearray(len(self._filters[0])), self._filters[0]]
+            self._inserted = 0
+            self._rotated_at = time.time()
+
+    def seen(self, key: bytes) -> bool:
+        """Whether key was added recently"""
+        positions = self._positions(key)
+        with self._lock:
+            self._rotate_if_due()
+            found = any(self._contains(bloom, positions) for bloom in self._filters)
+        if found:
+            DUPLICATES.inc()
+        return found
+
+    def add(self, key: bytes) -> bool:
+        """Record key; returns False if it was already there"""
+        positions = self._positions(key)
+        with self._lock:
+            self._rotate_if_due()
+            if any(self._contains(bloom, positions) for bloom in self._filters):
+                added = False
+            else:
+                current = self._filters[0]
+                for position in positions:
+                    current[position >> 3] |= 1 << (position & 7)
+                self._inserted += 1
+                added = True
+        if not added:
+            DUPLICATES.inc()
+        return added
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "store": "memory",
+                "window": self.window,
+                "capacity": self.capacity,
+                "recent_keys": self._inserted,
+                "memory_bytes": sum(len(bloom) for bloom in self._filters)
+            }
+
+class SQLiteReplayFilter(ReplayStore):
+    """ReplayFilter shared by every server process through a SQLite table; keys are exact."""
+
+    def __init__(self, database_url: str, window: float = 600):
+        self.window = window
+        self.conn = sqlite3.connect(sqlite_path(database_url), check_same_thread=False,
+                                    isolation_level=None, timeout=30)
+        self.lock = threading.Lock()
+        self._pruned_at = 0.0
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS replay_keys (key BLOB PRIMARY KEY, added_at REAL NOT NULL) WITHOUT ROWID"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_replay_keys_added ON replay_keys (added_at)")
+
+    def seen(self, key: bytes) -> bool:
+        """Whether key was added recently"""
+        with self.lock:
+            found = self.conn.execute(
+                "SELECT 1 FROM replay_keys WHERE key = ? AND added_at > ?", (key, time.time() - self.window)
+            ).fetchone() is not None
+        if found:
+            DUPLICATES.inc()
+        return found
+
+    def add(self, key: bytes) -> bool:
+        """Record key; returns False if it was already there"""
+        now = time.time()
+        with self.lock:
+            if now - self._pruned_at >= self.window / 2:
+                self.conn.execute("DELETE FROM replay_keys WHERE added_at <= ?", (now - self.window,))
+                self._pruned_at = now
+            # An expired row is taken over; a live one leaves the statement without effect
+            added = self.conn.execute(
+                "INSERT INTO replay_keys VALUES (?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET added_at = excluded.added_at WHERE added_at <= ?",
+                (key, now, now - self.window)
+            ).rowcount == 1
+        if not added:
+            DUPLICATES.inc()
+        return added
+
+    def stats(self) -> Dict:
+        with self.lock:
+            live = self.conn.execute(
+                "SELECT COUNT(*) FROM replay_keys WHERE added_at > ?", (time.time() - self.window,)
+            ).fetchone()[0]
+        return {"store": "sqlite", "window": self.window, "recent_keys": live}
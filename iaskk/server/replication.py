@@ -0,0 +1,203 @@
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import requests
+
+from blockchain import Block
+from transactions import Transaction
+
+# Header carrying PEER_TOKEN on peer-to-peer requests
+TOKEN_HEADER = "X-Peer-Token"
+
+class PeerReplicator:
+    """Keeps this node's ledger in step with other gateway nodes over HTTP.
+
+    Every node should list all the others as peers; pushed items are not forwarded again.
+    """
+
+    def __init__(self, blockchain, peers: List[str], token: str,
+                 sync_interval: float = 5, batch_blocks: int = 100, timeout: float = 5,
+                 max_outgoing: int = 10000, on_block: Optional[Callable[[Block], None]] = None):
+        if not token:
+            raise ValueError("Replication needs a peer token")
+        self.blockchain = blockchain
+        self.peers = [peer.rstrip("/") for peer in peers]
+        self.token = token
+        self.sync_interval = sync_interval
+        self.batch_blocks = batch_blocks
+        self.timeout = timeout
+        self.on_block = on_block
+        self.session = requests.Session()
+        self.session.headers[TOKEN_HEADER] = token
+        self.outgoing: "queue.Queue[tuple]" = queue.Queue(maxsize=max_outgoing)
+        self._wake = threading.Event()
+        self.sent_transactions = 0
+        self.dropped = 0
+        self.synced_blocks = 0
+        self.reorgs = 0
+        self.orphaned_blocks = 0
+        self.rejected_blocks = 0
+        self.peer_errors = 0
+        self.last_sync: Optional[float] = None
+
+    def start(self, sync: bool = True) -> None:
+        threading.Thread(target=self._send_loop, name="peer-sender", daemon=True).start()
+        if sync:
+            threading.Thread(target=self._sync_loop, name="peer-sync", daemon=True).start()
+
+    def _enqueue(self, item: tuple) -> None:
+        try:
+            self.outgoing.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+
+    def submit(self, transactions: List[Transaction]) -> None:
+        """Forward transactions accepted by this node"""
+        self._enqueue(("transactions", transactions))
+
+    def register_device(self, device_id: str, public_key_bytes: bytes) -> None:
+        self.register_devices([(device_id, public_key_bytes)])
+
+    def register_devices(self, devices: List[Tuple[str, bytes]]) -> None:
+        self._enqueue(("devices", [{"device_id": device_id, "public_key": public_key_bytes.hex()}
+                                   for device_id, public_key_bytes in devices]))
+
+    def announce(self, block: Block) -> None:
+        """Tell peers this node mined a block so they sync without waiting for their next poll"""
+        self._enqueue(("announce", {"length": block.index + 1, "tip": block.hash}))
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def _send_loop(self) -> None:
+        while True:
+            kind, payload = self.outgoing.get()
+            batch = {"transactions": [], "devices": [], "announce": None}
+            self._add_to_batch(batch, kind, payload)
+            # Coalesce whatever else is queued into one request per kind
+            while True:
+                try:
+                    kind, payload = self.outgoing.get_nowait()
+                except queue.Empty:
+                    break
+                self._add_to_batch(batch, kind, payload)
+
+            if batch["devices"]:
+                self._post_all("/api/peer/devices", {"devices": batch["devices"]})
+            if batch["transactions"]:
+                self._post_all("/api/peer/transactions",
+                               {"transactions": [dict(tx) for tx in batch["transactions"]]})
+                self.sent_transactions += len(batch["transactions"])
+            if batch["announce"] is not None:
+                self._post_all("/api/peer/announce", batch["announce"])
+
+    @staticmethod
+    def _add_to_batch(batch: Dict, kind: str, payload) -> None:
+        if kind == "announce":
+            batch["announce"] = payload
+        else:
+            batch[kind].extend(payload)
+
+    def _post_all(self, path: str, payload: Dict) -> None:
+        for peer in self.peers:
+            try:
+                self.session.post(f"{peer}{path}", json=payload, timeout=self.timeout).raise_for_status()
+            except requests.RequestException as e:
+                self.peer_errors += 1
+                print(f"Replication to {peer}{path} failed: {e}")
+
+    def _get(self, peer: str, path: str, **params) -> Dict:
+        response = self.session.get(f"{peer}{path}", params=params, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def _sync_loop(self) -> None:
+        while True:
+            self.sync_once()
+            self._wake.wait(self.sync_interval)
+            self._wake.clear()
+
+    def sync_once(self) -> int:
+        """Catch up with every peer that is ahead; returns the number of blocks adopted"""
+        adopted = 0
+        for peer in self.peers:
+            try:
+                status = self._get(peer, "/api/peer/status")
+                if self._is_ahead(status):
+                    adopted += self._catch_up(peer, status["length"])
+            except Exception as e:
+                # Whatever a peer sends, the other peers keep being synced
+                self.peer_errors += 1
+                print(f"Sync with {peer} failed: {type(e).__name__}: {e}")
+        self.last_sync = time.time()
+        return adopted
+
+    def _is_ahead(self, status: Dict) -> bool:
+        if status["difficulty"] != self.blockchain.difficulty:
+            raise ValueError(f"peer mines at difficulty {status['difficulty']}, "
+                             f"this node at {self.blockchain.difficulty}")
+        work = self.blockchain.cumulative_work()
+        tip = self.blockchain.get_latest_block().hash
+        return status["work"] > work or (status["work"] == work and status["tip"] < tip)
+
+    def _fork_point(self, peer: str, peer_length: int) -> int:
+        """Index of the first block where this chain and the peer's differ"""
+        chain = self.blockchain.chain
+        top = min(len(chain), peer_length) - 1
+        while top >= 0:
+            start = max(0, top - self.batch_blocks + 1)
+            hashes = self._get(peer, "/api/peer/headers", from_index=start, limit=top - start + 1)["hashes"]
+            for i in range(top, start - 1, -1):
+                if i - start < len(hashes) and chain[i].hash == hashes[i - start]:
+                    return i + 1
+            top = start - 1
+        return 0
+
+    def _catch_up(self, peer: str, peer_length: int) -> int:
+        start = self._fork_point(peer, peer_length)
+        adopted = 0
+        # Verified blocks not adopted yet: the peer's branch from the fork point
+        branch: List[Block] = []
+        while start < peer_length:
+            page = self._get(peer, "/api/chain", from_index=start, limit=self.batch_blocks)["chain"]
+            if not page:
+                break
+            for claimed in page:
+                block = Block.from_dict(claimed)
+                reason = self.blockchain.check_received_block(block, claimed)
+                if reason is not None:
+                    self.rejected_blocks += 1
+                    raise ValueError(f"block {claimed['index']} rejected: {reason}")
+                if branch and (block.index != branch[-1].index + 1 or block.previous_hash != branch[-1].hash):
+                    raise ValueError(f"block {block.index} does not follow block {branch[-1].index}")
+                branch.append(block)
+            start = branch[-1].index + 1
+            if not self.blockchain.outweighs(branch):
+                continue
+            dropped = self.blockchain.adopt_blocks(branch)
+            if dropped:
+                self.reorgs += 1
+                self.orphaned_blocks += len(dropped)
+            adopted += len(branch)
+            self.synced_blocks += len(branch)
+            if self.on_block is not None:
+                for block in branch:
+                    self.on_block(block)
+            branch = []
+        return adopted
+
+    def stats(self) -> Dict:
+        return {
+            "peers": self.peers,
+            "outgoing": self.outgoing.qsize(),
+            "sent_transactions": self.sent_transactions,
+            "dropped": self.dropped,
+            "synced_blocks": self.synced_blocks,
+            "reorgs": self.reorgs,
+            "orphaned_blocks": self.orphaned_blocks,
+            "rejected_blocks": self.rejected_blocks,
+            "peer_errors": self.peer_errors,
+            "last_sync": self.last_sync
+        }
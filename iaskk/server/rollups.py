@@ -0,0 +1,159 @@
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from instrumentation import metrics
+
+# Bucket width in seconds for each resolution
+RESOLUTIONS = {"1m": 60, "1h": 3600, "1d": 86400}
+# Numeric keys that identify a reading rather than measure anything
+NON_METRIC_FIELDS = frozenset({"timestamp", "sequence"})
+
+DROPPED_FIELDS = metrics.counter("iot_rollup_fields_dropped_total", "Reading fields not rolled up because a series cap was reached")
+
+def numeric_fields(data: Dict, prefix: str = "") -> Iterator[Tuple[str, float]]:
+    """Yield (dotted.path, value) for every numeric leaf of a possibly nested reading"""
+    for key, value in data.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield from numeric_fields(value, f"{path}.")
+        elif isinstance(value, (int, float)) and not isinstance(value, bool) and key not in NON_METRIC_FIELDS:
+            yield path, float(value)
+
+class RollupSeries:
+    """count/min/max/sum per time bucket in fixed-size NumPy ring buffers.
+
+    Bucket b lives in slot b % slots; a slot is reset when a newer bucket
+    claims it, so memory is fixed and old buckets age out on their own.
+    """
+
+    def __init__(self, width: int, slots: int):
+        self.width = width
+        self.slots = slots
+        self.bucket = np.full(slots, -1, dtype=np.int64)
+        self.count = np.zeros(slots, dtype=np.int64)
+        self.min = np.zeros(slots)
+        self.max = np.zeros(slots)
+        self.sum = np.zeros(slots)
+
+    def add(self, timestamp: float, value: float) -> None:
+        bucket = int(timestamp // self.width)
+        slot = bucket % self.slots
+        current = self.bucket[slot]
+        if current == bucket:
+            self.count[slot] += 1
+            self.sum[slot] += value
+            if value < self.min[slot]:
+                self.min[slot] = value
+            if value > self.max[slot]:
+                self.max[slot] = value
+        elif current < bucket:
+            self.bucket[slot] = bucket
+            self.count[slot] = 1
+            self.min[slot] = self.max[slot] = self.sum[slot] = value
+        # else: older than the retained window, dropped
+
+    def read(self, since: Optional[float] = None, until: Optional[float] = None) -> List[Dict]:
+        mask = self.bucket >= 0
+        if since is not None:
+            mask &= self.bucket >= int(since // self.width)
+        if until is not None:
+            mask &= self.bucket * self.width < until
+        slots = np.flatnonzero(mask)
+        slots = slots[np.argsort(self.bucket[slots])]
+        means = self.sum[slots] / self.count[slots]
+        return [
+            {
+                "start": int(self.bucket[slot]) * self.width,
+                "count": int(self.count[slot]),
+                "min": float(self.min[slot]),
+                "max": float(self.max[slot]),
+                "mean": float(mean)
+            }
+            for slot, mean in zip(slots, means)
+        ]
+
+class RollupEngine:
+    """Streaming per-device and fleet-wide aggregates of numeric reading fields.
+
+    Nested readings are flattened to dotted paths, e.g. the temperature in
+    generate_realistic_data() is reported as "sensor_data.temperature".
+    retention gives the number of buckets kept per resolution.
+
+    Devices choose their own field names, so the series are capped: a
+    device gets at most max_fields fields and the engine at most max_series
+    (device or fleet, field) pairs. The fleet has no field cap of its own,
+    so one device cannot crowd it out; it rolls up the fields some device
+    is rolling up. Fields beyond a cap are counted in dropped_fields() and
+    not rolled up; the readings themselves are still stored.
+    """
+
+    def __init__(self, retention: Dict[str, int], max_fields: int = 32, max_series: int = 10000):
+        self.retention = {resolution: retention[resolution] for resolution in RESOLUTIONS}
+        self.max_fields = max_fields
+        self.max_series = max_series
+        # (device_id or None for the fleet, field) -> resolution -> series
+        self._series: Dict[Tuple[Optional[str], str], Dict[str, RollupSeries]] = {}
+        # device_id -> fields with series
+        self._field_counts: Dict[str, int] = {}
+        # device_id or None for the fleet -> field values not rolled up
+        self._dropped: Dict[Optional[str], int] = {}
+        self.lock = threading.Lock()
+
+    def _get_series(self, scope: Optional[str], field: str) -> Optional[Dict[str, RollupSeries]]:
+        """The series for scope and field, created if the caps allow; None otherwise"""
+        series = self._series.get((scope, field))
+        if series is None:
+            count = self._field_counts.get(scope, 0)
+            if (scope is not None and count >= self.max_fields) or len(self._series) >= self.max_series:
+                dropped = self._dropped.get(scope, 0)
+                if dropped == 0:
+                    print(f"Rollups for {scope or 'the fleet'} are full; field {field} and later new fields are not rolled up")
+                self._dropped[scope] = dropped + 1
+                DROPPED_FIELDS.inc()
+                return None
+            if scope is not None:
+                self._field_counts[scope] = count + 1
+            series = self._series[(scope, field)] = {
+                resolution: RollupSeries(width, self.retention[resolution])
+                for resolution, width in RESOLUTIONS.items()
+            }
+        return series
+
+    def record(self, device_id: str, data: Dict, timestamp: Optional[float] = None) -> None:
+        timestamp = time.time() if timestamp is None else timestamp
+        fields = list(numeric_fields(data))
+        with self.lock:
+            for field, value in fields:
+                # The fleet only takes fields a device was allowed to roll up
+                for scope in (device_id, None):
+                    series = self._get_series(scope, field)
+                    if series is None:
+                        break
+                    for resolution in series.values():
+                        resolution.add(timestamp, value)
+
+    def dropped_fields(self, device_id: Optional[str] = None) -> int:
+        """Field values from device_id (or for the fleet) not rolled up because a cap was reached"""
+        with self.lock:
+            return self._dropped.get(device_id, 0)
+
+    def fields(self, device_id: Optional[str] = None) -> List[str]:
+        with self.lock:
+            return sorted(field for scope, field in self._series if scope == device_id)
+
+    def query(self, device_id: Optional[str] = None, field: Optional[str] = None,
+              resolution: str = "1m", since: Optional[float] = None,
+              until: Optional[float] = None) -> Dict[str, List[Dict]]:
+        """Buckets per field for one device (or the fleet when device_id is None)"""
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"Unknown resolution {resolution}")
+        fields = [field] if field is not None else self.fields(device_id)
+        with self.lock:
+            return {
+                name: self._series[(device_id, name)][resolution].read(since, until)
+                for name in fields
+                if (device_id, name) in self._series
+            }
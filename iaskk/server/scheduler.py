@@ -0,0 +1,127 @@
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+# Weight of the newest sample in the arrival-rate moving average
+RATE_SMOOTHING = 0.3
+
+class BlockScheduler:
+    """Decides when the pending pool is sealed into blocks.
+
+    A block is sealed as soon as block_size transactions are pending, or
+    once the oldest pending transaction has waited max_latency seconds,
+    whichever comes first. A backlog is split into blocks of at most
+    max_transactions. Between checks the scheduler sleeps until the
+    earlier of the oldest transaction's deadline and the time the smoothed
+    arrival rate predicts block_size will be reached (never less than
+    min_interval). In-process submissions also wake it directly through
+    notify().
+    """
+
+    def __init__(self, blockchain, block_size: int = 10, max_transactions: int = 500,
+                 max_latency: float = 10, min_interval: float = 0.5,
+                 on_block: Optional[Callable] = None):
+        self.blockchain = blockchain
+        self.block_size = block_size
+        self.max_transactions = max(block_size, max_transactions)
+        self.max_latency = max_latency
+        self.min_interval = min_interval
+        self.on_block = on_block
+        self._wake = threading.Event()
+        self._last_pending = 0
+        self._last_observed = time.time()
+        self.arrival_rate = 0.0
+        self.next_wait = max_latency
+        self.blocks = 0
+        self.transactions = 0
+        self.sealed_by_size = 0
+        self.sealed_by_deadline = 0
+        self.last_block_transactions = 0
+        self.last_block_latency = 0.0
+        self.last_mining_seconds = 0.0
+        self.last_seal_reason: Optional[str] = None
+
+    def notify(self, pending: int) -> None:
+        """Called with the pool size after transactions are added"""
+        if pending >= self.block_size:
+            self._wake.set()
+
+    def _observe(self, pending: int, now: float) -> None:
+        elapsed = now - self._last_observed
+        if elapsed > 0:
+            arrived = max(0, pending - self._last_pending)
+            self.arrival_rate += RATE_SMOOTHING * (arrived / elapsed - self.arrival_rate)
+        self._last_pending = pending
+        self._last_observed = now
+
+    def _wait_time(self, pending: int, oldest: Optional[float], now: float) -> float:
+        wait = self.max_latency
+        if oldest is not None:
+            wait = min(wait, oldest + self.max_latency - now)
+        if self.arrival_rate > 0:
+            wait = min(wait, max(0, self.block_size - pending) / self.arrival_rate)
+        return min(self.max_latency, max(self.min_interval, wait))
+
+    def seal_ready(self) -> int:
+        """Seal every block that is due now; returns how many were sealed"""
+        sealed = 0
+        while True:
+            now = time.time()
+            pending, oldest = self.blockchain.pending_stats()
+            self._observe(pending, now)
+            if pending >= self.block_size:
+                reason = "size"
+            elif pending and now - oldest >= self.max_latency:
+                reason = "deadline"
+            else:
+                self.next_wait = self._wait_time(pending, oldest, now)
+                return sealed
+
+            started = time.perf_counter()
+            block = self.blockchain.create_block(max_transactions=self.max_transactions)
+            if block is None:
+                # Nothing left to seal (the pool changed under us); wait for the next arrival
+                pending, oldest = self.blockchain.pending_stats()
+                self.next_wait = self._wait_time(pending, oldest, time.time())
+                return sealed
+            count = len(block.transactions)
+            self._last_pending = max(0, self._last_pending - count)
+            self.blocks += 1
+            self.transactions += count
+            if reason == "size":
+                self.sealed_by_size += 1
+            else:
+                self.sealed_by_deadline += 1
+            self.last_seal_reason = reason
+            self.last_block_transactions = count
+            self.last_block_latency = now - oldest
+            self.last_mining_seconds = time.perf_counter() - started
+            sealed += 1
+            if self.on_block is not None:
+                self.on_block(block)
+
+    def run(self) -> None:
+        while True:
+            self.seal_ready()
+            self._wake.wait(self.next_wait)
+            self._wake.clear()
+
+    def stats(self) -> Dict:
+        pending, oldest = self.blockchain.pending_stats()
+        return {
+            "pending": pending,
+            "oldest_pending_age": time.time() - oldest if oldest is not None else None,
+            "arrival_rate": self.arrival_rate,
+            "next_wait": self.next_wait,
+            "block_size": self.block_size,
+            "max_transactions": self.max_transactions,
+            "max_latency": self.max_latency,
+            "blocks": self.blocks,
+            "transactions": self.transactions,
+            "sealed_by_size": self.sealed_by_size,
+            "sealed_by_deadline": self.sealed_by_deadline,
+            "last_seal_reason": self.last_seal_reason,
+            "last_block_transactions": self.last_block_transactions,
+            "last_block_latency": self.last_block_latency,
+            "last_mining_seconds": self.last_mining_seconds
+        }
@@ -0,0 +1,224 @@
+import hashlib
+import heapq
+import hmac
+import secrets
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple, Union
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
+
+from storage import sqlite_path
+
+SESSION_OK = "ok"
+SESSION_SIGNATURE_REQUIRED = "signature_required"
+SESSION_INVALID = "invalid"
+
+REVOKE_MESSAGE = b"revoke"
+
+def derive_session_key(shared_secret: bytes, session_id: str) -> bytes:
+    return HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=None,
+        info=f"iot-session:{session_id}".encode()
+    ).derive(shared_secret)
+
+class Session:
+    __slots__ = ("session_id", "device_id", "key", "expires_at", "count", "signature_due", "checked_at")
+
+    def __init__(self, session_id: str, device_id: str, key: bytes, expires_at: float):
+        self.session_id = session_id
+        self.device_id = device_id
+        self.key = key
+        self.expires_at = expires_at
+        self.count = 0
+        self.signature_due = False
+        self.checked_at = time.time()
+
+class SQLiteSessionStore:
+    """Session keys in a SQLite table so that every server process can check them"""
+
+    def __init__(self, database_url: str):
+        self.conn = sqlite3.connect(sqlite_path(database_url), check_same_thread=False,
+                                    isolation_level=None, timeout=30)
+        self.lock = threading.Lock()
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, "
+                "device_id TEXT NOT NULL, key BLOB NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_device ON sessions (device_id)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires_at)")
+
+    def save(self, session: Session) -> None:
+        """Store a new session, replacing the device's previous one"""
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.conn.execute("DELETE FROM sessions WHERE device_id = ? OR expires_at <= ?",
+                                  (session.device_id, time.time()))
+                self.conn.execute("INSERT INTO sessions VALUES (?, ?, ?, ?)",
+                                  (session.session_id, session.device_id, session.key, session.expires_at))
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    def load(self, session_id: str) -> Optional[Session]:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT device_id, key, expires_at FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return Session(session_id, *row) if row is not None else None
+
+    def delete(self, session_id: str) -> None:
+        with self.lock:
+            self.conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+class SessionManager:
+    """Short-lived session keys issued after a successful challenge-response.
+
+    The key is agreed with ECDH between the device key and a per-session
+    server key, so it never crosses the wire. Submissions in a session are
+    authenticated with HMAC-SHA256; every signature_interval-th submission
+    (and every one after it until one arrives) must also carry a full ECDSA
+    signature. A device has at most one live session.
+
+    With a store, sessions are shared between server processes: one that
+    misses locally is loaded from the store, and a cached one is re-checked
+    against it every recheck_interval seconds so revocations propagate.
+    Submission counts (and so the signature sampling) stay per process.
+    """
+
+    def __init__(self, ttl: float = 900, signature_interval: int = 100,
+                 store: Optional[SQLiteSessionStore] = None, recheck_interval: float = 5):
+        self.ttl = ttl
+        self.signature_interval = signature_interval
+        self.store = store
+        self.recheck_interval = recheck_interval
+        self._sessions: Dict[str, Session] = {}
+        self._by_device: Dict[str, str] = {}
+        # (expires_at, session_id) heap, so a sweep only touches expired sessions;
+        # entries of sessions already removed are skipped when they surface
+        self._expiries: List[Tuple[float, str]] = []
+        # session_id -> expiry it has on the heap, so reloading a session does not queue it twice
+        self._queued: Dict[str, float] = {}
+        self.lock = threading.Lock()
+
+    def establish(self, device_id: str, device_public_key: ec.EllipticCurvePublicKey) -> Dict:
+        """Start a session for an authenticated device and return what it needs to derive the key"""
+        server_key = ec.generate_private_key(ec.SECP256K1())
+        session_id = secrets.token_hex(16)
+        key = derive_session_key(server_key.exchange(ec.ECDH(), device_public_key), session_id)
+        session = Session(session_id, device_id, key, time.time() + self.ttl)
+
+        with self.lock:
+            self._sweep()
+            previous = self._by_device.get(device_id)
+            if previous is not None:
+                self._sessions.pop(previous, None)
+            self._add(session)
+            if self.store is not None:
+                self.store.save(session)
+
+        return {
+            'session_id': session_id,
+            'server_public_key': server_key.public_key().public_bytes(
+                encoding=Encoding.X962,
+                format=PublicFormat.UncompressedPoint
+            ).hex(),
+            'expires_in': self.ttl,
+            'signature_interval': self.signature_interval
+        }
+
+    def _get(self, session_id: str, device_id: str) -> Optional[Session]:
+        now = time.time()
+        session = self._sessions.get(session_id)
+        if self.store is not None:
+            if session is None:
+                session = self.store.load(session_id)
+                if session is not None:
+                    self._add(session)
+            elif now - session.checked_at >= self.recheck_interval:
+                if self.store.load(session_id) is None:
+                    self._remove(session, shared=False)
+                    return None
+                session.checked_at = now
+        if session is None or session.device_id != device_id:
+            return None
+        if session.expires_at <= now:
+            self._remove(session)
+            return None
+        return session
+
+    def _add(self, session: Session) -> None:
+        self._sessions[session.session_id] = session
+        self._by_device[session.device_id] = session.session_id
+        if self._queued.get(session.session_id) != session.expires_at:
+            self._queued[session.session_id] = session.expires_at
+            heapq.heappush(self._expiries, (session.expires_at, session.session_id))
+
+    def _remove(self, session: Session, shared: bool = True) -> None:
+        self._sessions.pop(session.session_id, None)
+        if self._by_device.get(session.device_id) == session.session_id:
+            del self._by_device[session.device_id]
+        if shared and self.store is not None:
+            self.store.delete(session.session_id)
+
+    def _sweep(self) -> None:
+        now = time.time()
+        while self._expiries and self._expiries[0][0] <= now:
+            expires_at, session_id = heapq.heappop(self._expiries)
+            if self._queued.get(session_id) == expires_at:
+                del self._queued[session_id]
+            session = self._sessions.get(session_id)
+            if session is not None and session.expires_at <= now:
+                self._remove(session, shared=False)
+
+    @staticmethod
+    def _mac_valid(session: Session, message: Union[str, bytes], mac: bytes) -> bool:
+        if isinstance(message, str):
+            message = message.encode()
+        expected = hmac.new(session.key, message, hashlib.sha256).digest()
+        return hmac.compare_digest(expected, mac)
+
+    def authenticate(self, session_id: str, device_id: str, message: Union[str, bytes], mac: bytes) -> str:
+        """Check a submission's MAC; says whether a full signature must accompany it"""
+        with self.lock:
+            session = self._get(session_id, device_id)
+            if session is None or not self._mac_valid(session, message, mac):
+                return SESSION_INVALID
+            session.count += 1
+            if session.count % self.signature_interval == 0:
+                session.signature_due = True
+            return SESSION_SIGNATURE_REQUIRED if session.signature_due else SESSION_OK
+
+    def signature_verified(self, session_id: str) -> None:
+        with self.lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.signature_due = False
+
+    def signature_due_next(self, session_id: str) -> bool:
+        """Whether the next submission in this session must be signed"""
+        with self.lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return True
+            return session.signature_due or (session.count + 1) % self.signature_interval == 0
+
+    def revoke(self, session_id: str, device_id: str, mac: bytes) -> bool:
+        """End a session on the device's request; the MAC covers REVOKE_MESSAGE"""
+        with self.lock:
+            session = self._get(session_id, device_id)
+            if session is None or not self._mac_valid(session, REVOKE_MESSAGE, mac):
+                return False
+            self._remove(session)
+            return True
@@ -112,10 +112,12 @@ function updateSensorData(data) {
     lastUpdateEl.textContent = new Date().toLocaleTimeString();
 }
 
-function renderBlockchain(chain) {
-    totalBlocksEl.textContent = chain.length;
-    
-    blockchainBlocksEl.innerHTML = chain.map(block => `
+// Hashes of the blocks already rendered, in chain order
+let chainHashes = [];
+let chainSyncing = false;
+
+function renderBlock(block) {
+    return `
         <div class="block-item">
             <div style="display: flex; justify-content: space-between; margin-bottom: 1rem;">
                 <strong>Block #${block.index}</strong>
@@ -128,7 +130,55 @@ function renderBlockchain(chain) {
                 Transactions: ${block.transactions.length}
             </div>
         </div>
-    `).join('');
+    `;
+}
+
+// blocks are consecutive and start at or below the rendered tip
+function appendBlocks(blocks) {
+    const fresh = blocks.filter(block => chainHashes[block.index] !== block.hash);
+    if (fresh.length === 0) {
+        return;
+    }
+    const forkIndex = fresh[0].index;
+    if (forkIndex < chainHashes.length) {
+        // The node switched to another branch: re-render from the fork point
+        const rendered = blockchainBlocksEl.querySelectorAll('.block-item');
+        for (let i = forkIndex; i < rendered.length; i++) {
+            rendered[i].remove();
+        }
+        chainHashes.length = forkIndex;
+        addActivityLog(`Chain reorganised from block #${forkIndex}`);
+    }
+    blockchainBlocksEl.insertAdjacentHTML('beforeend', fresh.map(renderBlock).join(''));
+    fresh.forEach(block => { chainHashes[block.index] = block.hash; });
+    totalBlocksEl.textContent = chainHashes.length;
+}
+
+// Fetch every block after the ones already shown, one page at a time. The
+// rendered tip is fetched again; if it changed the chain was reorganised
+// while we were away, so start over from genesis and keep the shared blocks
+function syncBlockchain() {
+    if (chainSyncing) {
+        return;
+    }
+    chainSyncing = true;
+
+    const fetchPage = (fromIndex) => fetch(`/api/chain?from_index=${fromIndex}`)
+        .then(response => response.json())
+        .then(data => {
+            const first = data.chain[0];
+            if (fromIndex > 0 && first && chainHashes[fromIndex] !== undefined && first.hash !== chainHashes[fromIndex]) {
+                return fetchPage(0);
+            }
+            appendBlocks(data.chain);
+            if (data.next_from_index !== null) {
+                return fetchPage(data.next_from_index);
+            }
+        });
+
+    fetchPage(Math.max(0, chainHashes.length - 1))
+        .catch(error => console.error('Error fetching blockchain:', error))
+        .finally(() => { chainSyncing = false; });
 }
 
 // Socket event handlers
@@ -136,11 +186,8 @@ socket.on('connect', () => {
     connectionStatusEl.textContent = 'Connected';
     addActivityLog('Connected to server');
     
-    // Get initial blockchain data
-    fetch('/api/chain')
-        .then(response => response.json())
-        .then(data => renderBlockchain(data.chain))
-        .catch(error => console.error('Error fetching blockchain:', error));
+    // Get blocks mined since the last sync
+    syncBlockchain();
 });
 
 socket.on('disconnect', () => {
@@ -148,14 +195,48 @@ socket.on('disconnect', () => {
     addActivityLog('Disconnected from server');
 });
 
-socket.on('new_data', (data) => {
-    updateDeviceStatus(data.device_id, data);
-    updateSensorData(data.data);
-    addActivityLog(`Received new data from Device ${data.device_id}`);
+// Readings arrive coalesced: the latest event per device plus per-device counts
+socket.on('new_data_batch', (frame) => {
+    frame.events.forEach(event => {
+        connectedDevices.set(event.device_id, {
+            lastSeen: new Date(),
+            ...event
+        });
+    });
+    renderDevices();
+    updateActiveDevicesCount();
+
+    if (frame.events.length > 0) {
+        updateSensorData(frame.events[0].data);
+    }
+
+    Object.entries(frame.counts).forEach(([deviceId, count]) => {
+        addActivityLog(count > 1
+            ? `Received ${count} readings from Device ${deviceId}`
+            : `Received new data from Device ${deviceId}`);
+    });
+    if (frame.omitted_devices > 0) {
+        addActivityLog(`${frame.omitted_devices} more devices reported`);
+    }
 });
 
+// Follow a single device's feed (or the fleet-wide one with no argument)
+function subscribeToDevice(deviceId) {
+    socket.emit('subscribe', deviceId ? { device_id: deviceId } : {});
+}
+
+function unsubscribeFromDevice(deviceId) {
+    socket.emit('unsubscribe', deviceId ? { device_id: deviceId } : {});
+}
+
 socket.on('new_block', (data) => {
-    renderBlockchain(data.chain);
+    if (data.block.index <= chainHashes.length) {
+        // The next block, or the first block of a branch the node switched to
+        appendBlocks([data.block]);
+    } else {
+        // Missed one or more blocks (e.g. while disconnected)
+        syncBlockchain();
+    }
     addActivityLog('New block added to the chain');
 });
 
@@ -0,0 +1,256 @@
+import json
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from transactions import Transaction, data_json
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blocks (
+    idx INTEGER PRIMARY KEY,
+    hash TEXT NOT NULL UNIQUE,
+    previous_hash TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    nonce INTEGER NOT NULL,
+    merkle_root TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS transactions (
+    block_idx INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    sender TEXT NOT NULL,
+    recipient TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (block_idx, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_transactions_sender ON transactions (sender, timestamp);
+CREATE INDEX IF NOT EXISTS idx_transactions_timestamp ON transactions (timestamp);
+CREATE TABLE IF NOT EXISTS pending (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    sender TEXT NOT NULL,
+    recipient TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_pending_sender ON pending (sender, timestamp);
+"""
+
+# (timestamp, block index, position): the order readings are queried in
+ReadingKey = Tuple[float, int, int]
+
+def format_cursor(key: ReadingKey) -> str:
+    """Encode a ReadingKey as the opaque cursor string clients send back"""
+    return f"{key[0]!r}:{key[1]}:{key[2]}"
+
+def parse_cursor(cursor: str) -> ReadingKey:
+    """Decode a cursor from format_cursor(); raises ValueError if it is malformed"""
+    timestamp, block_index, position = cursor.split(":")
+    return float(timestamp), int(block_index), int(position)
+
+def sqlite_path(database_url: str) -> str:
+    """Turn a sqlite:/// URL (as used in config.DATABASE_URL) into a sqlite3 path"""
+    if database_url in ("sqlite://", "sqlite:///:memory:"):
+        return ":memory:"
+    if not database_url.startswith("sqlite:///"):
+        raise ValueError(f"Unsupported database URL: {database_url}")
+    return database_url[len("sqlite:///"):]
+
+class BlockStore:
+    """Append-only SQLite ledger storage.
+
+    Each block and all of its transactions are written in a single transaction
+    on a WAL-mode database. Blocks are indexed by index and hash, transactions
+    by (block, position) and by sender.
+
+    The pending table is the transaction pool when several server processes
+    share one database: API workers add to it and the miner consumes it in
+    the same transaction that stores the block.
+    """
+
+    def __init__(self, database_url: str):
+        self.path = sqlite_path(database_url)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+        self.lock = threading.Lock()
+        with self.lock:
+            if self.path != ":memory:":
+                self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.executescript(SCHEMA)
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM blocks").fetchone()[0]
+
+    @staticmethod
+    def _rows(blocks) -> Tuple[List[tuple], List[tuple]]:
+        block_rows = [
+            (b.index, b.hash, b.previous_hash, b.timestamp, b.nonce, b.merkle_root)
+            for b in blocks
+        ]
+        tx_rows = [
+            (b.index, position, tx["sender"], tx["recipient"], tx["timestamp"], data_json(tx))
+            for b in blocks
+            for position, tx in enumerate(b.transactions)
+        ]
+        return block_rows, tx_rows
+
+    def append(self, block, consumed_pending: Optional[int] = None) -> None:
+        """Persist a newly mined block in one transaction, removing pending rows up to consumed_pending"""
+        block_rows, tx_rows = self._rows([block])
+        with self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                self.conn.executemany("INSERT INTO blocks VALUES (?, ?, ?, ?, ?, ?)", block_rows)
+                self.conn.executemany("INSERT INTO transactions VALUES (?, ?, ?, ?, ?, ?)", tx_rows)
+                if consumed_pending is not None:
+                    self.conn.execute("DELETE FROM pending WHERE id <= ?", (consumed_pending,))
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    def replace_from(self, first: int, blocks) -> None:
+        """Delete every block from index first onwards and store blocks in their place, atomically"""
+        block_rows, tx_rows = self._rows(blocks)
+        with self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                self.conn.execute("DELETE FROM transactions WHERE block_idx >= ?", (first,))
+                self.conn.execute("DELETE FROM blocks WHERE idx >= ?", (first,))
+                self.conn.executemany("INSERT INTO blocks VALUES (?, ?, ?, ?, ?, ?)", block_rows)
+                self.conn.executemany("INSERT INTO transactions VALUES (?, ?, ?, ?, ?, ?)", tx_rows)
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    def load_headers(self, from_index: int = 0) -> List[Tuple[int, str, str, float, int, str]]:
+        """Return (index, hash, previous_hash, timestamp, nonce, merkle_root) for every block from from_index"""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT idx, hash, previous_hash, timestamp, nonce, merkle_root FROM blocks "
+                "WHERE idx >= ? ORDER BY idx",
+                (from_index,)
+            ).fetchall()
+
+    def add_pending(self, transactions: List[Transaction], skip_existing: bool = False) -> List[Transaction]:
+        """Queue transactions for the miner; returns the ones queued.
+
+        With skip_existing, transactions already in the pool are left out.
+        """
+        rows = [
+            (tx["sender"], tx["recipient"], tx["timestamp"], data_json(tx))
+            for tx in transactions
+        ]
+        with self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                if not skip_existing:
+                    self.conn.executemany(
+                        "INSERT INTO pending (sender, recipient, timestamp, data) VALUES (?, ?, ?, ?)", rows
+                    )
+                    added = list(transactions)
+                else:
+                    added = [
+                        tx for tx, row in zip(transactions, rows)
+                        if self.conn.execute(
+                            "INSERT INTO pending (sender, recipient, timestamp, data) SELECT ?, ?, ?, ? "
+                            "WHERE NOT EXISTS (SELECT 1 FROM pending WHERE sender = ? AND timestamp = ? AND data = ?)",
+                            row + (row[0], row[2], row[3])
+                        ).rowcount == 1
+                    ]
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+        return added
+
+    def remove_pending(self, transactions: List[Transaction]) -> None:
+        """Drop pending transactions that were mined elsewhere"""
+        rows = [(tx["sender"], tx["timestamp"], data_json(tx)) for tx in transactions]
+        with self.lock:
+            self.conn.executemany("DELETE FROM pending WHERE sender = ? AND timestamp = ? AND data = ?", rows)
+
+    def pending_stats(self) -> Tuple[int, Optional[float]]:
+        """Number of pending transactions and the timestamp of the oldest one"""
+        with self.lock:
+            return tuple(self.conn.execute("SELECT COUNT(*), MIN(timestamp) FROM pending").fetchone())
+
+    def load_pending(self, limit: int = -1) -> Tuple[List[Transaction], Optional[int]]:
+        """Oldest pending transactions and the id of the last one (None if there are none)"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT id, sender, recipient, timestamp, data FROM pending ORDER BY id LIMIT ?", (limit,)
+            ).fetchall()
+        transactions = [
+            Transaction.from_data_json(sender, recipient, timestamp, data)
+            for _, sender, recipient, timestamp, data in rows
+        ]
+        return transactions, rows[-1][0] if rows else None
+
+    def load_transactions(self, index: int) -> List[Transaction]:
+        """Read the transactions of one block back in their original order; archived payloads read as None"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT sender, recipient, timestamp, data FROM transactions "
+                "WHERE block_idx = ? ORDER BY position",
+                (index,)
+            ).fetchall()
+        return [
+            Transaction.from_data_json(sender, recipient, timestamp, data or "null")
+            for sender, recipient, timestamp, data in rows
+        ]
+
+    def archive_transactions(self, first: int, last: int) -> None:
+        """Drop the payloads of blocks first..last once they are archived elsewhere.
+
+        Sender, recipient and timestamp stay so the indexes keep answering
+        queries; the payload comes back as None and is read from the archive.
+        """
+        with self.lock:
+            self.conn.execute("UPDATE transactions SET data = '' WHERE block_idx BETWEEN ? AND ?", (first, last))
+
+    def query_transactions(self, sender: Optional[str], since: Optional[float] = None,
+                           until: Optional[float] = None, after: Optional[ReadingKey] = None,
+                           limit: int = 100) -> List[Dict]:
+        """Up to limit transactions in time order (optionally for one sender) that follow the key after.
+
+        Both indexes end in the (block_idx, position) primary key, so the
+        row-value comparison seeks straight to the page instead of skipping
+        an offset.
+        """
+        clauses, params = [], []
+        if sender is not None:
+            clauses.append("sender = ?")
+            params.append(sender)
+        if since is not None:
+            clauses.append("timestamp >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("timestamp < ?")
+            params.append(until)
+        if after is not None:
+            clauses.append("(timestamp, block_idx, position) > (?, ?, ?)")
+            params.extend(after)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT block_idx, position, sender, recipient, timestamp, data FROM transactions "
+                f"{where} ORDER BY timestamp, block_idx, position LIMIT ?",
+                params + [limit]
+            ).fetchall()
+        return [
+            {"block_index": block_index, "position": position, "sender": sender,
+             "recipient": recipient, "timestamp": timestamp, "data": json.loads(data) if data else None}
+            for block_index, position, sender, recipient, timestamp, data in rows
+        ]
+
+    def get_block_index(self, block_hash: str) -> Optional[int]:
+        with self.lock:
+            row = self.conn.execute("SELECT idx FROM blocks WHERE hash = ?", (block_hash,)).fetchone()
+        return row[0] if row else None
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
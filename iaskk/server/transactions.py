@@ -0,0 +1,79 @@
+import json
+import sys
+from collections.abc import Mapping
+from typing import Dict, Iterable, Union
+
+FIELDS = ("sender", "recipient", "timestamp", "data")
+# Byte pattern ending the data field; data is the first key in sorted order
+_RECIPIENT_KEY = b', "recipient": '
+
+class Transaction(Mapping):
+    """A mined or pending reading, held as its canonical JSON (the Merkle leaf and hashed bytes).
+
+    A read-only Mapping of sender, recipient, timestamp and data; dict(tx) gives the plain dict.
+    """
+
+    __slots__ = ("sender", "recipient", "timestamp", "canonical")
+
+    def __init__(self, sender: str, recipient: str, timestamp: float, data: Dict):
+        self._set(sender, recipient, timestamp, json.dumps(data, sort_keys=True))
+
+    @classmethod
+    def from_data_json(cls, sender: str, recipient: str, timestamp: float, data_json: str) -> "Transaction":
+        """Build from an already canonical (sort_keys=True) JSON encoding of the data"""
+        transaction = cls.__new__(cls)
+        transaction._set(sender, recipient, timestamp, data_json)
+        return transaction
+
+    @classmethod
+    def from_dict(cls, transaction: Dict) -> "Transaction":
+        return cls(transaction["sender"], transaction["recipient"], transaction["timestamp"], transaction["data"])
+
+    def _set(self, sender: str, recipient: str, timestamp: float, data_json: str) -> None:
+        self.sender = sys.intern(sender)
+        self.recipient = sys.intern(recipient)
+        self.timestamp = timestamp
+        self.canonical = (
+            f'{{"data": {data_json}, "recipient": {json.dumps(recipient)}, '
+            f'"sender": {json.dumps(sender)}, "timestamp": {json.dumps(timestamp)}}}'
+        ).encode()
+
+    @property
+    def data_json(self) -> bytes:
+        return self.canonical[9:self.canonical.rindex(_RECIPIENT_KEY)]
+
+    @property
+    def data(self):
+        return json.loads(self.data_json)
+
+    def __getitem__(self, key: str):
+        if key == "data":
+            return self.data
+        if key in ("sender", "recipient", "timestamp"):
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(FIELDS)
+
+    def __len__(self) -> int:
+        return len(FIELDS)
+
+    def __repr__(self) -> str:
+        return f"Transaction({self.canonical.decode()})"
+
+def canonical_json(transaction: Union[Transaction, Dict]) -> bytes:
+    """The transaction's Merkle leaf encoding; plain dicts are accepted too"""
+    if isinstance(transaction, Transaction):
+        return transaction.canonical
+    return json.dumps(transaction, sort_keys=True).encode()
+
+def data_json(transaction: Union[Transaction, Dict]) -> str:
+    """The canonical JSON of the transaction's data, as the block store keeps it"""
+    if isinstance(transaction, Transaction):
+        return transaction.data_json.decode()
+    return json.dumps(transaction["data"], sort_keys=True)
+
+def transactions_json(transactions: Iterable[Union[Transaction, Dict]]) -> bytes:
+    """json.dumps(transactions, sort_keys=True) of the dict forms, built from the cached encodings"""
+    return b"[" + b", ".join(canonical_json(tx) for tx in transactions) + b"]"
@@ -0,0 +1,140 @@
+import hashlib
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from merkle import MerkleTree
+from mining import serialize_for_hashing
+
+# Blocks sent to the process pool per round in a full audit, bounding how
+# many transaction lists are held in memory at once
+AUDIT_WINDOW = 256
+
+BlockPayload = Tuple[int, List[Dict], float, str, int, str, str]
+
+def check_block(payload: BlockPayload) -> Optional[str]:
+    """Check a block's Merkle root and hash against its contents; returns a failure reason or None"""
+    index, transactions, timestamp, previous_hash, nonce, merkle_root, block_hash = payload
+    if MerkleTree.from_transactions(transactions).root != merkle_root:
+        return "merkle root does not match transactions"
+    prefix, suffix = serialize_for_hashing(index, transactions, timestamp, previous_hash, merkle_root)
+    if hashlib.sha256(prefix + str(nonce).encode() + suffix).hexdigest() != block_hash:
+        return "block hash does not match contents"
+    return None
+
+def block_payload(block) -> BlockPayload:
+    return (block.index, block.transactions, block.timestamp, block.previous_hash,
+            block.nonce, block.merkle_root, block.hash)
+
+class ChainValidator:
+    """Validates a Blockchain incrementally from a verified-up-to checkpoint.
+
+    validate() only checks blocks appended since the last successful run. With
+    full=True every block is checked again, on a process pool when workers > 1;
+    each block's contents are independent, so only the previous_hash links are
+    checked sequentially.
+
+    Blocks up to a signed compaction checkpoint (set_checkpoint) are trusted:
+    both modes only confirm that the checkpointed block's hash is unchanged
+    and check the blocks after it.
+    """
+
+    def __init__(self, blockchain, workers: int = 1):
+        self.blockchain = blockchain
+        self.workers = max(1, workers)
+        self.verified_upto = 0
+        self.verified_hash: Optional[str] = None
+        self.checkpoint_index = 0
+        self.checkpoint_hash: Optional[str] = None
+        self.lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def validate(self, full: bool = False) -> Dict:
+        with self.lock:
+            started = time.perf_counter()
+            chain = list(self.blockchain.chain)
+
+            first, failed_index, reason = 1, None, None
+            if self.checkpoint_hash is not None:
+                first = self.checkpoint_index + 1
+                if chain[self.checkpoint_index].hash != self.checkpoint_hash:
+                    failed_index, reason = self.checkpoint_index, "block does not match the signed checkpoint"
+            if not full and self.verified_hash is not None and self.verified_upto < len(chain) \
+                    and chain[self.verified_upto].hash == self.verified_hash:
+                first = max(first, self.verified_upto + 1)
+
+            if failed_index is None:
+                failed_index, reason = self._check_links(chain, first)
+            stop = failed_index if failed_index is not None else len(chain)
+            if full and self.workers > 1:
+                content_failure = self._check_parallel(chain, first, stop)
+            else:
+                content_failure = self._check_sequential(chain, first, stop)
+            if content_failure is not None:
+                failed_index, reason = content_failure
+
+            valid = failed_index is None
+            if valid:
+                self.verified_upto = len(chain) - 1
+            else:
+                # Don't trust anything from the failed block onwards on the next incremental run
+                self.verified_upto = min(self.verified_upto, failed_index - 1)
+            self.verified_hash = chain[self.verified_upto].hash
+            return {
+                "valid": valid,
+                "mode": "full" if full else "incremental",
+                "checked_from": first,
+                "checked_blocks": (stop if valid else failed_index + 1) - first,
+                "failed_index": failed_index,
+                "reason": reason,
+                "verified_upto": self.verified_upto,
+                "checkpoint": self.checkpoint_index if self.checkpoint_hash is not None else None,
+                "elapsed": time.perf_counter() - started
+            }
+
+    def set_checkpoint(self, index: int, block_hash: str) -> None:
+        """Trust blocks up to index, whose hash a signed checkpoint vouches for"""
+        with self.lock:
+            self.checkpoint_index = index
+            self.checkpoint_hash = block_hash
+            if index >= self.verified_upto:
+                self.verified_upto = index
+                self.verified_hash = block_hash
+
+    def rewind(self, index: int) -> None:
+        """Forget that blocks from index onwards were verified, after they were replaced"""
+        with self.lock:
+            if self.verified_upto >= index:
+                self.verified_upto = max(0, index - 1)
+                self.verified_hash = self.blockchain.chain[self.verified_upto].hash if index > 0 else None
+
+    @staticmethod
+    def _check_links(chain, first: int) -> Tuple[Optional[int], Optional[str]]:
+        for i in range(first, len(chain)):
+            if chain[i].previous_hash != chain[i - 1].hash:
+                return i, "previous_hash does not match the preceding block"
+        return None, None
+
+    @staticmethod
+    def _check_sequential(chain, first: int, stop: int) -> Optional[Tuple[int, str]]:
+        for i in range(first, stop):
+            reason = check_block(block_payload(chain[i]))
+            if reason is not None:
+                return i, reason
+        return None
+
+    def _check_parallel(self, chain, first: int, stop: int) -> Optional[Tuple[int, str]]:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        for window in range(first, stop, AUDIT_WINDOW):
+            indices = range(window, min(stop, window + AUDIT_WINDOW))
+            reasons = self._executor.map(
+                check_block,
+                [block_payload(chain[i]) for i in indices],
+                chunksize=max(1, len(indices) // (self.workers * 4))
+            )
+            for i, reason in zip(indices, reasons):
+                if reason is not None:
+                    return i, reason
+        return None
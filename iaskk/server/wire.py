@@ -0,0 +1,93 @@
+import json
+from typing import Dict, Optional
+
+from auth import raw_signature_to_der
+
+try:
+    import msgpack
+except ImportError:  # The binary wire format is optional; JSON always works
+    msgpack = None
+
+MSGPACK_CONTENT_TYPE = "application/msgpack"
+
+def decode_msgpack_submission(body: bytes) -> Dict:
+    """Decode a binary /api/submit-data body.
+
+    The body is a MessagePack map {"device_id": str, "payload": bytes,
+    "signature": bytes}. payload is the MessagePack-encoded reading and the
+    64-byte raw r||s signature covers exactly those bytes, so nothing is
+    re-serialized before verification. Inside a session the map also
+    carries "session_id" and a 32-byte HMAC "mac" over payload, and
+    "signature" may be omitted.
+
+    Returns a submission dict as decode_json_submission() does; raises
+    ValueError if the body is malformed.
+    """
+    try:
+        envelope = msgpack.unpackb(body, raw=False)
+        device_id = envelope.get("device_id")
+        payload = envelope.get("payload")
+        signature = envelope.get("signature")
+        session_id = envelope.get("session_id")
+        mac = envelope.get("mac")
+        if not isinstance(device_id, str) or not isinstance(payload, bytes):
+            raise ValueError("Missing required fields")
+        if session_id is not None and (not isinstance(session_id, str) or not isinstance(mac, bytes)):
+            raise ValueError("Invalid session fields")
+        if signature is None and session_id is None:
+            raise ValueError("Missing required fields")
+        if signature is not None and not isinstance(signature, bytes):
+            raise ValueError("Invalid signature format")
+        data = msgpack.unpackb(payload, raw=False)
+        # Readings end up in JSON-encoded blocks, so they must be representable as JSON
+        json.dumps(data)
+    except (AttributeError, TypeError) as e:
+        raise ValueError(str(e))
+    if not device_id or not isinstance(data, dict) or not data:
+        raise ValueError("Missing required fields")
+    return {
+        "device_id": device_id,
+        "data": data,
+        "message": payload,
+        "signature": raw_signature_to_der(signature) if signature is not None else None,
+        "session_id": session_id,
+        "mac": mac
+    }
+
+def decode_json_submission(body: Optional[Dict]) -> Dict:
+    """Validate a JSON /api/submit-data body.
+
+    The body is {"device_id", "data", "signature"} with a hex DER signature
+    over json.dumps(data, sort_keys=True). Inside a session it also carries
+    "session_id" and a hex HMAC "mac" over the same string, and "signature"
+    may be omitted.
+
+    Returns {"device_id", "data", "message", "signature", "session_id",
+    "mac"} with signature and mac as bytes (or None); raises ValueError if
+    the body is malformed.
+    """
+    if not isinstance(body, dict):
+        raise ValueError("Invalid data format")
+    device_id = body.get("device_id")
+    data = body.get("data")
+    signature = body.get("signature")
+    session_id = body.get("session_id")
+    mac = body.get("mac")
+    if not device_id or not data or not (signature or session_id):
+        raise ValueError("Missing required fields")
+    if session_id and not mac:
+        raise ValueError("Missing required fields")
+    # Readings are keyed and rolled up by field, so they must be JSON objects
+    if not isinstance(device_id, str) or not isinstance(data, dict) or not isinstance(session_id or "", str):
+        raise ValueError("Invalid data format")
+    try:
+        return {
+            "device_id": device_id,
+            "data": data,
+            "message": json.dumps(data, sort_keys=True),
+            "signature": bytes.fromhex(signature) if signature else None,
+            "session_id": session_id or None,
+            "mac": bytes.fromhex(mac) if session_id else None
+        }
+    except (TypeError, ValueError):
+        raise ValueError("Invalid data format")
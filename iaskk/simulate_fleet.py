@@ -0,0 +1,187 @@
+"""
+Asyncio fleet simulator for load-testing the server.
+
+Each simulated device registers, completes the challenge-response handshake
+and then submits signed readings at the configured rate. Keys are generated
+up front on a process pool and signing reuses IoTDevice, so requests look
+exactly like those from client/main.py.
+
+    python simulate_fleet.py --devices 10000 --rate 0.2 --duration 60
+"""
+import argparse
+import asyncio
+import bisect
+import json
+import os
+import random
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import aiohttp
+
+from client.main import IoTDevice
+from config import SERVER_URL
+from test_devices import generate_realistic_data
+
+# Upper bounds of the latency histogram buckets, in milliseconds
+BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000]
+
+class EndpointStats:
+    def __init__(self):
+        self.latencies = []
+        self.statuses = Counter()
+        self.errors = 0
+
+    def record(self, latency: float, status: int) -> None:
+        self.latencies.append(latency)
+        self.statuses[status] += 1
+        if status >= 400:
+            self.errors += 1
+
+    def percentile(self, pct: float) -> float:
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+    def histogram(self) -> list:
+        counts = [0] * (len(BUCKETS_MS) + 1)
+        for latency in self.latencies:
+            counts[bisect.bisect_left(BUCKETS_MS, latency * 1000)] += 1
+        return counts
+
+class FleetSimulator:
+    def __init__(self, devices, server_url: str, rate: float, duration: float,
+                 profile: str, concurrency: int):
+        self.devices = devices
+        self.server_url = server_url
+        self.rate = rate
+        self.duration = duration
+        self.profile = profile
+        self.concurrency = concurrency
+        self.stats = defaultdict(EndpointStats)
+        self.connection_errors = Counter()
+
+    def make_payload(self, device: IoTDevice) -> dict:
+        if self.profile == "minimal":
+            return device.generate_sensor_data()
+        data = generate_realistic_data(device.device_id)
+        if self.profile == "large":
+            data["history"] = [device.generate_sensor_data() for _ in range(20)]
+        return data
+
+    async def post(self, session: aiohttp.ClientSession, endpoint: str, payload: dict):
+        start = time.perf_counter()
+        try:
+            async with session.post(f"{self.server_url}{endpoint}", json=payload) as response:
+                body = await response.json(content_type=None)
+                self.stats[endpoint].record(time.perf_counter() - start, response.status)
+                return response.status, body
+        except (aiohttp.ClientError, asyncio.TimeoutError, json.JSONDecodeError) as e:
+            self.connection_errors[(endpoint, type(e).__name__)] += 1
+            return None, None
+
+    async def handshake(self, session: aiohttp.ClientSession, device: IoTDevice) -> bool:
+        status, _ = await self.post(session, "/api/register", {
+            "device_id": device.device_id,
+            "public_key": device.get_public_key_bytes().hex()
+        })
+        if status is None:
+            return False
+
+        status, body = await self.post(session, "/api/authenticate", {"device_id": device.device_id})
+        if status != 200:
+            return False
+
+        status, _ = await self.post(session, "/api/verify", {
+            "device_id": device.device_id,
+            "signature": device.sign_message(body["challenge"]).hex()
+        })
+        device.is_authenticated = status == 200
+        return device.is_authenticated
+
+    async def run_device(self, session: aiohttp.ClientSession, device: IoTDevice, deadline: float):
+        # Spread the fleet's start-up and reporting phase over one interval
+        interval = 1 / self.rate
+        await asyncio.sleep(random.uniform(0, interval))
+        if not await self.handshake(session, device):
+            return
+
+        while time.monotonic() < deadline:
+            data = self.make_payload(device)
+            signature = device.sign_message(json.dumps(data, sort_keys=True))
+            await self.post(session, "/api/submit-data", {
+                "device_id": device.device_id,
+                "data": data,
+                "signature": signature.hex()
+            })
+            await asyncio.sleep(interval * random.uniform(0.9, 1.1))
+
+    async def run(self) -> float:
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        timeout = aiohttp.ClientTimeout(total=30)
+        started = time.monotonic()
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            deadline = started + self.duration
+            await asyncio.gather(*(self.run_device(session, d, deadline) for d in self.devices))
+        return time.monotonic() - started
+
+    def report(self, elapsed: float) -> None:
+        print(f"\n=== Fleet simulation: {len(self.devices)} devices, {elapsed:.1f}s ===")
+        for endpoint, stats in sorted(self.stats.items()):
+            total = len(stats.latencies)
+            print(f"\n{endpoint}")
+            print(f"  requests   : {total} ({total / elapsed:.1f}/s)")
+            print(f"  errors     : {stats.errors} ({100 * stats.errors / total:.2f}%) "
+                  f"statuses {dict(stats.statuses)}")
+            print(f"  latency ms : p50 {stats.percentile(50) * 1000:.1f}  "
+                  f"p95 {stats.percentile(95) * 1000:.1f}  "
+                  f"p99 {stats.percentile(99) * 1000:.1f}  "
+                  f"max {max(stats.latencies) * 1000:.1f}")
+            lower = 0
+            for upper, count in zip(BUCKETS_MS + [float("inf")], stats.histogram()):
+                if count:
+                    print(f"    {lower:>6}-{upper:<6} ms {count:8d} {'#' * max(1, 50 * count // total)}")
+                lower = upper
+        if self.connection_errors:
+            print("\nConnection errors:")
+            for (endpoint, error), count in self.connection_errors.most_common():
+                print(f"  {endpoint} {error}: {count}")
+
+def generate_keys(num_devices: int, workers: int) -> list:
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_generate_key, range(num_devices),
+                                 chunksize=max(1, num_devices // (workers * 4))))
+
+def _generate_key(_) -> bytes:
+    return IoTDevice.generate_private_key_bytes()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--server", default=SERVER_URL)
+    parser.add_argument("--devices", type=int, default=100)
+    parser.add_argument("--rate", type=float, default=1 / 3, help="Readings per second per device")
+    parser.add_argument("--duration", type=float, default=60, help="Seconds to keep reporting")
+    parser.add_argument("--profile", choices=["minimal", "realistic", "large"], default="realistic")
+    parser.add_argument("--concurrency", type=int, default=500, help="Max open connections")
+    parser.add_argument("--key-workers", type=int, default=None, help="Processes for key generation")
+    parser.add_argument("--prefix", default="sim_sensor", help="Device id prefix")
+    args = parser.parse_args()
+
+    print(f"Generating {args.devices} device keys...")
+    started = time.perf_counter()
+    keys = generate_keys(args.devices, args.key_workers or os.cpu_count() or 1)
+    print(f"Generated keys in {time.perf_counter() - started:.1f}s")
+
+    devices = [
+        IoTDevice.from_private_key_bytes(f"{args.prefix}_{i + 1}", key, server_url=args.server, verbose=False)
+        for i, key in enumerate(keys)
+    ]
+
+    simulator = FleetSimulator(devices, args.server, args.rate, args.duration, args.profile, args.concurrency)
+    print(f"Simulating {args.devices} devices against {args.server} "
+          f"at {args.rate:.2f} readings/s each for {args.duration:.0f}s...")
+    elapsed = asyncio.run(simulator.run())
+    simulator.report(elapsed)
+
+if __name__ == "__main__":
+    main()
@@ -10,7 +10,7 @@ from config import SERVER_URL
 def check_server_availability():
     """Check if the server is available"""
     try:
-        response = requests.get(f"{SERVER_URL}/api/chain")
+        response = requests.get(f"{SERVER_URL}/api/chain", params={"limit": 1})
         return response.status_code == 200
     except requests.RequestException:
         return False